@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+""" Benchmark: per-object vs bulk serialization of SqlAlchemy entities
+
+    Compares encoding a list of JsonSerializableBase entities with DynamicJSONEncoder.default(),
+    called for every object, against the bulk path: DynamicJSONEncoder.default_many().
+
+    Usage: python benchmarks/bulk_serialize.py [rows ...]
+"""
+from __future__ import print_function
+
+import sys
+from timeit import default_timer
+
+from sqlalchemy import create_engine, Column, Integer, String, Boolean
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.declarative import declarative_base
+
+from flask_jsontools import DynamicJSONEncoder, JsonSerializableBase, get_json_backend
+
+
+Base = declarative_base(cls=(JsonSerializableBase,))
+
+
+class User(Base):
+    __tablename__ = 'users'
+    id = Column(Integer, primary_key=True)
+    login = Column(String)
+    name = Column(String)
+    email = Column(String)
+    age = Column(Integer)
+    active = Column(Boolean)
+    password = Column(String)
+
+    _json_exclude = ['password']
+
+
+def load_users(n):
+    """ Create `n` users in an in-memory database, and load them """
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    db.bulk_insert_mappings(User, [
+        dict(id=i, login='user{}'.format(i), name='User #{}'.format(i), email='user{}@example.com'.format(i),
+             age=i % 100, active=bool(i % 2), password='secret')
+        for i in range(n)
+    ])
+    return db.query(User).all()
+
+
+def best_of(f, repeat=3):
+    """ Best time of `repeat` runs, seconds """
+    times = []
+    for i in range(repeat):
+        t = default_timer()
+        f()
+        times.append(default_timer() - t)
+    return min(times)
+
+
+def main(sizes):
+    encoder = DynamicJSONEncoder()
+    backend = get_json_backend()
+
+    print('backend: {}'.format(backend.name))
+    print('{:>8} {:>14} {:>14} {:>8}'.format('rows', 'per-object/s', 'bulk/s', 'speedup'))
+    for n in sizes:
+        users = load_users(n)
+
+        per_object = best_of(lambda: backend.dumps(users, default=encoder.default))
+        bulk = best_of(lambda: backend.dumps(encoder.default_many(users), default=encoder.default))
+        assert backend.dumps(users, default=encoder.default) == backend.dumps(encoder.default_many(users), default=encoder.default)
+
+        print('{:>8} {:>14.0f} {:>14.0f} {:>7.2f}x'.format(n, n / per_object, n / bulk, per_object / bulk))
+
+
+if __name__ == '__main__':
+    main([int(n) for n in sys.argv[1:]] or [1000, 10000, 100000])
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+""" Benchmark: memory held by responses under load
+
+    A server under load holds many responses at once: they are built, but not sent yet to slow clients.
+    This measures, with `tracemalloc`, the memory held by N such responses, and the peak memory of a request,
+    with and without `JSONTOOLS_KEEP_RESPONSE_DATA`: whether `JsonResponse` keeps the data object after encoding.
+
+        $ PYTHONPATH=. python benchmarks/memory.py
+        $ PYTHONPATH=. python benchmarks/memory.py --responses 1000 --json memory.json
+
+    Usage: python benchmarks/memory.py [--responses N] [--users N] [--json FILE]
+"""
+from __future__ import print_function, division
+
+import gc
+import sys
+import json
+import argparse
+import tracemalloc
+from collections import OrderedDict
+
+from flask import Flask
+
+from flask_jsontools import jsonapi, DynamicJSONEncoder
+from flask_jsontools.views import _MethodViewInfo
+
+sys.path.insert(0, __file__.rsplit('/', 1)[0])
+from request_path import User, make_db
+
+
+def make_app(db, users):
+    """ An app with a view that lists SqlAlchemy entities, and one that returns plain dicts
+    :rtype: Flask
+    """
+    app = Flask(__name__)
+    app.json_encoder = DynamicJSONEncoder
+
+    payload = [{'id': i, 'name': 'User #{}'.format(i), 'tags': ['a', 'b', 'c'], 'score': i / 7} for i in range(users)]
+
+    @app.route('/users')
+    @jsonapi
+    def list_users():
+        return db.query(User).limit(users).all()
+
+    @app.route('/payload')
+    @jsonapi
+    def get_payload():
+        return [dict(item) for item in payload]
+
+    return app
+
+
+def held(app, endpoint, url, n):
+    """ Memory held by `n` responses that are alive at once, bytes per response
+    :rtype: float
+    """
+    view = app.view_functions[endpoint]
+    with app.test_request_context(url):
+        view()  # warm up: imports, compiled queries, caches
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        responses = [view() for i in range(n)]
+        gc.collect()
+        after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del responses
+    return (after - before) / n
+
+
+def peak(app, url):
+    """ Peak memory of a request, bytes
+    :rtype: int
+    """
+    with app.test_client() as c:
+        c.get(url)  # warm up
+        gc.collect()
+        tracemalloc.start()
+        c.get(url).close()
+        size = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return size
+
+
+def methodview_info_size():
+    """ Memory of a _MethodViewInfo, bytes """
+    info = _MethodViewInfo('GET', ifset='id')
+    return sys.getsizeof(info) + (sys.getsizeof(info.__dict__) if hasattr(info, '__dict__') else 0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark memory held by responses')
+    parser.add_argument('--responses', type=int, default=200, help='Number of responses held at once')
+    parser.add_argument('--users', type=int, default=100, help='Number of entities in a response')
+    parser.add_argument('--json', metavar='FILE', help='Save results as JSON')
+    args = parser.parse_args(argv)
+
+    db = make_db(users=args.users)
+    app = make_app(db, args.users)
+
+    results = OrderedDict()
+    for endpoint, url in (('list_users', '/users'), ('get_payload', '/payload')):
+        for keep in (True, False):
+            app.config['JSONTOOLS_KEEP_RESPONSE_DATA'] = keep
+            db.expunge_all()
+            results['held{}.keep={}'.format(url, keep)] = held(app, endpoint, url, args.responses)
+            results['peak{}.keep={}'.format(url, keep)] = peak(app, url)
+    results['methodview.info'] = methodview_info_size()
+
+    print('{:<28} {:>14}'.format('case', 'bytes'))
+    for name, size in results.items():
+        print('{:<28} {:>14,.0f}'.format(name, size))
+    for url in ('/users', '/payload'):
+        keep, drop = results['held{}.keep=True'.format(url)], results['held{}.keep=False'.format(url)]
+        print('held{}: {:.1f}x less memory per response without the data'.format(url, keep / drop))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,414 @@
+#!/usr/bin/env python
+""" Benchmark: the full @jsonapi / MethodView request path
+
+    Every case is a request made in-process with the Flask test client:
+    routing, dispatch, the view, make_json_response(), encoding, and the response.
+    SqlAlchemy cases use an in-memory SQLite database.
+
+    Results are printed as a table, and can be saved as JSON to be compared across versions:
+
+        $ PYTHONPATH=. python benchmarks/request_path.py --json before.json
+        $ git checkout ...
+        $ PYTHONPATH=. python benchmarks/request_path.py --compare before.json
+
+    Usage: python benchmarks/request_path.py [--json FILE] [--compare FILE] [--repeat N] [--time SECONDS] [case ...]
+"""
+from __future__ import print_function, division
+
+import sys
+import json
+import platform
+import argparse
+import itertools
+from collections import OrderedDict
+from timeit import default_timer
+
+import flask
+import sqlalchemy
+from flask import Flask
+from sqlalchemy import create_engine, Column, Integer, String, Boolean, ForeignKey
+from sqlalchemy.orm import sessionmaker, relationship, joinedload
+from sqlalchemy.ext.declarative import declarative_base
+
+from flask_jsontools import jsonapi, DynamicJSONEncoder, JsonSerializableBase, MethodView, RestfulView, methodview
+from flask_jsontools.encoding import app_json_backend
+
+
+#region Models
+
+Base = declarative_base(cls=(JsonSerializableBase,))
+
+
+class User(Base):
+    __tablename__ = 'users'
+    id = Column(Integer, primary_key=True)
+    login = Column(String)
+    name = Column(String)
+    email = Column(String)
+    age = Column(Integer)
+    active = Column(Boolean)
+    password = Column(String)
+
+    articles = relationship('Article', back_populates='author')
+
+    _json_exclude = ['password']
+
+
+class Article(Base):
+    __tablename__ = 'articles'
+    id = Column(Integer, primary_key=True)
+    title = Column(String)
+    body = Column(String)
+    author_id = Column(ForeignKey(User.id))
+
+    author = relationship(User, back_populates='articles')
+
+
+class SchemaUser(Base):
+    """ The same table as User, serialized with a compiled schema """
+    __table__ = User.__table__
+
+    articles = relationship('SchemaArticle', viewonly=True)
+
+    _json_schema = {'id': int, 'login': str, 'name': str, 'email': str, 'age': int, 'active': bool,
+                    'articles': ['SchemaArticle']}
+
+
+class SchemaArticle(Base):
+    __table__ = Article.__table__
+
+    _json_schema = {'id': int, 'title': str, 'body': str, 'author_id': int}
+
+
+SchemaUser._json_schema['articles'] = [SchemaArticle]
+
+
+def make_db(users=100, articles=5):
+    """ Create an in-memory database with `users`, every one with `articles`
+    :rtype: sqlalchemy.orm.Session
+    """
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    db.bulk_insert_mappings(User, [
+        dict(id=i, login='user{}'.format(i), name='User #{}'.format(i), email='user{}@example.com'.format(i),
+             age=i % 100, active=bool(i % 2), password='secret')
+        for i in range(users)
+    ])
+    db.bulk_insert_mappings(Article, [
+        dict(id=i * articles + j, title='Article #{}'.format(j), body='Lorem ipsum ' * 10, author_id=i)
+        for i in range(users) for j in range(articles)
+    ])
+    db.commit()
+    return db
+
+#endregion
+
+#region Cases
+
+#: Registered cases: { name: Callable(app) -> path }
+cases = OrderedDict()
+
+
+def case(name):
+    """ Register a benchmark case
+
+    The decorated function gets a Flask app, adds a route, and returns the path to request.
+    """
+    def decorator(f):
+        cases[name] = f
+        return f
+    return decorator
+
+
+@case('payload.small')
+def small_payload(app):
+    @app.route('/small')
+    @jsonapi
+    def small():
+        return {'id': 1, 'name': 'kolypto', 'active': True, 'tags': ['a', 'b']}
+    return '/small'
+
+
+@case('payload.large')
+def large_payload(app):
+    data = [{'id': i, 'name': 'User #{}'.format(i), 'email': 'user{}@example.com'.format(i), 'score': i / 7}
+            for i in range(10000)]
+
+    @app.route('/large')
+    @jsonapi
+    def large():
+        return data
+    return '/large'
+
+
+@case('payload.nested')
+def nested_payload(app):
+    data = {'leaf': list(range(10))}
+    for i in range(100):
+        data = {'level': i, 'child': data, 'siblings': [{'id': i}]}
+
+    @app.route('/nested')
+    @jsonapi
+    def nested():
+        return data
+    return '/nested'
+
+
+@case('payload.stream')
+def stream_payload(app):
+    @app.route('/stream')
+    @jsonapi
+    def stream():
+        return ({'id': i, 'name': 'User #{}'.format(i)} for i in range(10000))
+    return '/stream'
+
+
+@case('sqlalchemy.loaded')
+def sqlalchemy_loaded(app):
+    db = make_db()
+    users = db.query(User).all()
+
+    @app.route('/users/loaded')
+    @jsonapi
+    def loaded():
+        return users
+    return '/users/loaded'
+
+
+@case('sqlalchemy.expired')
+def sqlalchemy_expired(app):
+    db = make_db()
+    users = db.query(User).all()
+
+    @app.route('/users/expired')
+    @jsonapi
+    def expired():
+        db.expire_all()
+        return users
+    return '/users/expired'
+
+
+@case('sqlalchemy.expired.bulk')
+def sqlalchemy_expired_bulk(app):
+    app.config['JSONTOOLS_REFRESH_EXPIRED'] = True
+    return sqlalchemy_expired(app)
+
+
+@case('sqlalchemy.transient')
+def sqlalchemy_transient(app):
+    users = [User(id=i, login='user{}'.format(i), name='User #{}'.format(i), age=i % 100, active=True)
+             for i in range(100)]
+
+    @app.route('/users/transient')
+    @jsonapi
+    def transient():
+        return users
+    return '/users/transient'
+
+
+@case('sqlalchemy.detached')
+def sqlalchemy_detached(app):
+    db = make_db()
+    users = db.query(User).all()
+    db.expunge_all()
+
+    @app.route('/users/detached')
+    @jsonapi
+    def detached():
+        return users
+    return '/users/detached'
+
+
+@case('sqlalchemy.query')
+def sqlalchemy_query(app):
+    db = make_db()
+
+    @app.route('/users/query')
+    @jsonapi
+    def query():
+        users = db.query(User).all()
+        db.expunge_all()
+        return users
+    return '/users/query'
+
+
+@case('sqlalchemy.joinedload')
+def sqlalchemy_joinedload(app):
+    db = make_db()
+
+    @app.route('/users/joinedload')
+    @jsonapi
+    def joined():
+        users = db.query(User).options(joinedload(User.articles)).all()
+        db.expunge_all()
+        return users
+    return '/users/joinedload'
+
+
+@case('sqlalchemy.nested')
+def sqlalchemy_nested(app, model=User):
+    """ Loaded users with their articles """
+    db = make_db()
+    users = db.query(model).options(joinedload(model.articles)).all()
+
+    @app.route('/users/nested/' + model.__name__)
+    @jsonapi
+    def nested():
+        return users
+    return '/users/nested/' + model.__name__
+
+
+@case('sqlalchemy.nested.schema')
+def sqlalchemy_nested_schema(app):
+    """ sqlalchemy.nested, with compiled schemas """
+    return sqlalchemy_nested(app, SchemaUser)
+
+
+@case('methodview.restful')
+def methodview_restful(app):
+    class UserView(RestfulView):
+        decorators = (jsonapi,)
+        primary_key = ('id',)
+
+        def list(self):
+            return []
+
+        def get(self, id):
+            return {'id': id}
+
+        def create(self):
+            return {}
+
+        def update(self, id):
+            return {'id': id}
+
+        def delete(self, id):
+            return {'id': id}
+
+    UserView.route_as_view(app, 'restful', ('/restful/', '/restful/<int:id>'))
+    return '/restful/1'
+
+
+@case('methodview.conditional')
+def methodview_conditional(app):
+    """ A view with a method for every combination of 5 route params: 32 conditional methods """
+    params = ('a', 'b', 'c', 'd', 'e')
+    combinations = [c for n in range(len(params) + 1) for c in itertools.combinations(params, n)]
+
+    def make_view(combination):
+        @methodview('GET', ifset=combination or None, ifnset=tuple(set(params) - set(combination)) or None)
+        def view(self, **kwargs):
+            return kwargs
+        return view
+
+    attrs = {'decorators': (jsonapi,)}
+    for combination in combinations:
+        attrs['get_' + '_'.join(combination or ('none',))] = make_view(combination)
+    View = type('ConditionalView', (MethodView,), attrs)
+
+    View.route_as_view(app, 'conditional', ['/cond' + ''.join('/{0}/<{0}>'.format(p) for p in c) + '/'
+                                            for c in combinations])
+    return '/cond/a/1/c/3/e/5/'
+
+#endregion
+
+#region Runner
+
+
+def make_app():
+    app = Flask(__name__)
+    app.json_encoder = DynamicJSONEncoder
+    return app
+
+
+def measure(client, path, repeat, min_time):
+    """ Measure a request
+
+    The number of requests per round is chosen so that a round takes at least `min_time`.
+
+    :return: (number, [seconds per request, for every round])
+    :rtype: tuple(int, list[float])
+    """
+    def run(number):
+        t = default_timer()
+        for i in range(number):
+            client.get(path).get_data()
+        return (default_timer() - t) / number
+
+    number = 1
+    while run(number) * number < min_time:
+        number *= 2
+    return number, [run(number) for i in range(repeat)]
+
+
+def environment():
+    """ Describe the environment: to know what results are comparable
+    :rtype: dict
+    """
+    app = make_app()
+    with app.app_context():
+        backend = app_json_backend().name
+    return OrderedDict([
+        ('python', platform.python_version()),
+        ('implementation', platform.python_implementation()),
+        ('platform', platform.platform()),
+        ('flask', flask.__version__),
+        ('sqlalchemy', sqlalchemy.__version__),
+        ('json_backend', backend),
+    ])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the @jsonapi / MethodView request path')
+    parser.add_argument('cases', nargs='*', help='Case names, or their prefixes. Default: all of them. '
+                                                 'Known: {}'.format(', '.join(cases)))
+    parser.add_argument('--json', metavar='FILE', help='Save results as JSON')
+    parser.add_argument('--compare', metavar='FILE', help='Compare with results saved earlier')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of rounds; the best one is reported')
+    parser.add_argument('--time', type=float, default=0.2, help='Minimum time of a round, seconds')
+    args = parser.parse_args(argv)
+
+    selected = [name for name in cases if not args.cases or any(name.startswith(c) for c in args.cases)]
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {r['name']: r for r in json.load(f)['results']}
+
+    env = environment()
+    print(', '.join('{}: {}'.format(k, v) for k, v in env.items()))
+    print('{:<24} {:>10} {:>12} {:>12} {:>10}'.format('case', 'requests', 'best, us', 'median, us', 'vs. base'))
+
+    results = []
+    for name in selected:
+        app = make_app()
+        path = cases[name](app)
+        with app.test_client() as client:
+            rv = client.get(path)
+            assert rv.status_code == 200, (name, rv.status_code, rv.get_data())
+            number, times = measure(client, path, args.repeat, args.time)
+
+        times.sort()
+        result = OrderedDict([
+            ('name', name),
+            ('number', number),
+            ('best', times[0]),
+            ('median', times[len(times) // 2]),
+            ('times', times),
+        ])
+        results.append(result)
+
+        base = baseline.get(name)
+        print('{:<24} {:>10} {:>12.1f} {:>12.1f} {:>10}'.format(
+            name, number, result['best'] * 1e6, result['median'] * 1e6,
+            '{:.2f}x'.format(base['best'] / result['best']) if base else '-'))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(OrderedDict([('environment', env), ('results', results)]), f, indent=2)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
+
+#endregion
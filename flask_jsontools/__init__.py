@@ -1,7 +1,12 @@
 from __future__ import absolute_import
 
-from .response import JsonResponse, make_json_response
+from .response import JsonResponse, JsonStream, make_json_response
 from .decorators import jsonapi
 from .testing import FlaskJsonClient
-from .formatting import DynamicJSONEncoder, JsonSerializableBase
+from .formatting import DynamicJSONEncoder, JsonSerializableBase, json_load_options, register_json_schema, JsonGraph
 from .views import MethodView, RestfulView, methodview
+from .encoding import JsonBackend, get_json_backend, RawJSON
+from .cache import ResponseCache, CacheBackend, MemoryCacheBackend, MmapCacheBackend
+from .profiling import RequestProfile, json_request_profiled
+from .parsing import get_json_body, iter_json_body
+from .extension import JsonTools
@@ -0,0 +1,66 @@
+from __future__ import absolute_import
+
+import inspect
+
+try:
+    import asyncio
+except ImportError:  # Python 2
+    asyncio = None
+
+#: inspect.isawaitable(), or None before Python 3.5: no `async def` there
+_isawaitable = getattr(inspect, 'isawaitable', None)
+
+
+def isawaitable(rv):
+    """ Test whether a view return value is a coroutine, or another awaitable
+    :rtype: bool
+    """
+    return _isawaitable is not None and _isawaitable(rv)
+
+
+def is_async_iterable(rv):
+    """ Test whether a view return value is an async generator, or another async iterable
+    :rtype: bool
+    """
+    return hasattr(rv, '__aiter__')
+
+
+def run_coroutine(coro):
+    """ Run a coroutine to completion in a new event loop
+
+    This is how views declared with `async def` are called: Flask is a WSGI application,
+    so the request is still served by a worker thread, but the view can await several I/O calls concurrently,
+    e.g. with `asyncio.gather()`.
+
+    :type coro: Awaitable
+    :return: The coroutine result
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        if hasattr(loop, 'shutdown_asyncgens'):  # Python 3.6+: async generators
+            loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.close()
+
+
+def iter_async(aiterable):
+    """ Iterate an async iterable synchronously, in a new event loop
+
+    The loop lives as long as the iteration; it's closed when the iterable is exhausted, or the iterator is closed.
+
+    :type aiterable: AsyncIterable
+    :rtype: Iterator
+    """
+    loop = asyncio.new_event_loop()
+    aiterator = aiterable.__aiter__()
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(aiterator.__anext__())
+            except StopAsyncIteration:
+                break
+    finally:
+        if hasattr(aiterator, 'aclose'):
+            loop.run_until_complete(aiterator.aclose())
+        loop.close()
@@ -0,0 +1,820 @@
+from __future__ import absolute_import
+from builtins import object
+
+import os
+import json
+import uuid
+import mmap
+import time
+import atexit
+import struct
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from timeit import default_timer
+
+from flask import current_app, request
+
+from .response import JsonResponse, _client_accepts_ndjson
+from .compression import get_codec
+from .extension import app_settings
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+class CacheBackend(object):
+    """ Storage for :cls:ResponseCache
+
+        Keys are strings, values are bytes.
+        Implement this interface to store cached responses elsewhere.
+    """
+
+    def get(self, key):
+        """ Get a value
+        :type key: str
+        :return: The value, or None if missing or expired
+        :rtype: bytes|None
+        """
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=None):
+        """ Store a value
+        :type key: str
+        :type value: bytes
+        :param ttl: Time to live, seconds. None: until evicted
+        :type ttl: float|None
+        """
+        raise NotImplementedError
+
+    def delete(self, key):
+        """ Remove a value
+        :type key: str
+        """
+        raise NotImplementedError
+
+    def clear(self):
+        """ Remove all values """
+        raise NotImplementedError
+
+
+class MemoryCacheBackend(CacheBackend):
+    """ In-process cache with LRU and TTL eviction
+
+        Thread-safe. Every worker process has its own copy.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None, timer=default_timer):
+        """ Init the cache
+        :param maxsize: The maximum number of values. The least recently used ones are evicted.
+        :type maxsize: int
+        :param ttl: Default time to live, seconds. None: until evicted
+        :type ttl: float|None
+        :param timer: Clock function
+        :type timer: Callable
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.timer = timer
+        self._data = OrderedDict()  # { key: (expires, value) }
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                expires, value = self._data.pop(key)
+            except KeyError:
+                return None
+            if expires is not None and expires <= self.timer():
+                return None
+            self._data[key] = (expires, value)  # recently used: to the end (no move_to_end() in Python 2)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = ttl if ttl is not None else self.ttl
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (self.timer() + ttl if ttl is not None else None, value)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class MmapCacheBackend(CacheBackend):
+    """ Cache shared by all processes on a host: a memory-mapped file with an LRU index
+
+        Pre-fork servers (gunicorn, uWSGI) run many workers, and an in-process cache is duplicated in every one of them,
+        with poor hit rates. This one is shared: create it before the workers are forked, or give all of them the same `path`.
+        Put the file on a tmpfs (`/dev/shm`), so that it's never written to the disk.
+
+        The file has:
+
+        * A hash table index with `maxsize * 2` slots: linear probing, with backward shift deletion
+        * `maxsize` entries, linked into an LRU list
+        * A data region of `size` bytes, split into blocks of `block_size` bytes.
+          Every value takes a chain of blocks; free blocks are linked into a free list
+
+        Every operation takes constant time, plus one step per block of the value: nothing scans the whole table.
+        When the entries or the blocks run out, the least recently used values are evicted.
+        Expired values are dropped when they're read, or evicted in the LRU order.
+
+        Every access takes an exclusive lock: `flock()` between processes, and a mutex between threads.
+        Values are copied out of the mapping while the lock is held, because other processes may overwrite it right after:
+        get() returns bytes.
+
+        POSIX only.
+    """
+
+    _magic = b'JTCACHE2'
+
+    #: File header: magic, then counters (see `_fields`)
+    _header = struct.Struct('<8s11Q')
+    _fields = ('maxsize', 'nslots', 'block_size', 'nblocks', 'count',
+               'lru_head', 'lru_tail', 'free_entry', 'entry_top', 'free_block', 'block_top')
+
+    #: Index slot: key hash (0: empty), entry id
+    _slot = struct.Struct('<QI')
+
+    #: Entry: key hash, expiration time (0: never), LRU prev, LRU next, key length, value length, first block.
+    #: Ids of entries and blocks start with 1; 0 is none.
+    _entry = struct.Struct('<QdIIIII')
+    _prev_offset = 16
+    _next_offset = 20
+
+    _u64 = struct.Struct('<Q')
+    _u32 = struct.Struct('<I')
+
+    def __init__(self, path=None, maxsize=1024, size=64 << 20, block_size=1024, ttl=None, timer=time.time):
+        """ Init the cache
+        :param path: The file. Default: a temporary file, removed at exit by the process that created it
+        :type path: str|None
+        :param maxsize: The maximum number of values
+        :type maxsize: int
+        :param size: The size of the data region, bytes. Larger values are not stored.
+        :type size: int
+        :param block_size: The size of a data block, bytes. Every value takes at least one block.
+        :type block_size: int
+        :param ttl: Default time to live, seconds. None: until evicted
+        :type ttl: float|None
+        :param timer: Clock function. It has to be the same in all processes
+        :type timer: Callable
+        """
+        if fcntl is None:
+            raise NotImplementedError('MmapCacheBackend requires fcntl: POSIX only')
+        if path is None:
+            fd, path = tempfile.mkstemp(prefix='flask-jsontools-', suffix='.cache',
+                                        dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+            os.close(fd)
+            atexit.register(_unlink_owned, os.getpid(), path)
+
+        self.path = path
+        self.maxsize = maxsize
+        self.block_size = block_size
+        self.ttl = ttl
+        self.timer = timer
+
+        self.nslots = maxsize * 2
+        self.nblocks = size // block_size
+        self.size = self.nblocks * block_size
+
+        # Layout
+        self._index_start = self._header.size
+        self._entries_start = self._index_start + self.nslots * self._slot.size
+        self._links_start = self._entries_start + maxsize * self._entry.size
+        self._data_start = self._links_start + self.nblocks * self._u32.size
+        self._field_offsets = { name: 8 + 8 * i  for i, name in enumerate(self._fields) }
+
+        # Per-process state: the file is opened again in every process, because flock() locks are shared by forks
+        self._pid = None
+        self._fd = None
+        self._mm = None
+        self._locks = {}  # { pid: threading.Lock }
+
+    #region Storage
+
+    def _open(self):
+        """ Open the file in this process, create it if empty """
+        self.close()
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                file_size = self._data_start + self.size
+                existing = os.fstat(fd).st_size
+                if existing == 0:
+                    os.ftruncate(fd, file_size)
+                elif existing != file_size:
+                    raise ValueError('{}: the cache was created with other parameters'.format(self.path))
+                mm = mmap.mmap(fd, file_size)
+                header = self._header.unpack_from(mm, 0)
+                if header[0] != self._magic:
+                    self._reset(mm)
+                elif header[1:5] != (self.maxsize, self.nslots, self.block_size, self.nblocks):
+                    mm.close()
+                    raise ValueError('{}: the cache was created with other parameters'.format(self.path))
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        except Exception:
+            os.close(fd)
+            raise
+        self._pid, self._fd, self._mm = os.getpid(), fd, mm
+
+    def _reset(self, mm):
+        """ Make the cache empty: clear the index, and reset the allocators """
+        mm[self._index_start:self._entries_start] = b'\0' * (self._entries_start - self._index_start)
+        self._header.pack_into(mm, 0, self._magic, self.maxsize, self.nslots, self.block_size, self.nblocks,
+                               0, 0, 0, 0, 0, 0, 0)
+
+    def close(self):
+        """ Close the file in this process """
+        if self._mm is not None:
+            self._mm.close()
+            os.close(self._fd)
+        self._pid = self._fd = self._mm = None
+
+    @contextmanager
+    def _locked(self):
+        """ Lock the cache for this thread and process
+        :rtype: mmap.mmap
+        """
+        pid = os.getpid()
+        try:
+            lock = self._locks[pid]
+        except KeyError:
+            lock = self._locks.setdefault(pid, threading.Lock())
+        with lock:
+            if self._pid != pid:
+                if self._pid is not None:  # inherited from the parent process: leave it to the parent
+                    self._pid = self._fd = self._mm = None
+                self._open()
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield self._mm
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _get(self, mm, field):
+        return self._u64.unpack_from(mm, self._field_offsets[field])[0]
+
+    def _put(self, mm, field, value):
+        self._u64.pack_into(mm, self._field_offsets[field], value)
+
+    def _entry_at(self, eid):
+        """ Get the position of an entry """
+        return self._entries_start + (eid - 1) * self._entry.size
+
+    def _next_block(self, mm, block):
+        return self._u32.unpack_from(mm, self._links_start + (block - 1) * 4)[0]
+
+    def _link_block(self, mm, block, next_block):
+        self._u32.pack_into(mm, self._links_start + (block - 1) * 4, next_block)
+
+    def _read(self, mm, block, skip, length):
+        """ Read bytes from a chain of blocks
+        :param block: The first block
+        :param skip: Bytes to skip
+        :rtype: bytes
+        """
+        block_size = self.block_size
+        while skip >= block_size:
+            block = self._next_block(mm, block)
+            skip -= block_size
+        pieces = []
+        while True:
+            start = self._data_start + (block - 1) * block_size + skip
+            n = min(block_size - skip, length)
+            pieces.append(mm[start:start+n])
+            length -= n
+            if length <= 0:
+                break
+            block, skip = self._next_block(mm, block), 0
+        return pieces[0] if len(pieces) == 1 else b''.join(pieces)
+
+    def _find(self, mm, key_hash, key):
+        """ Find a key in the index
+        :return: (slot number, entry id), or (-1, 0)
+        :rtype: tuple(int, int)
+        """
+        nslots, slot = self.nslots, self._slot
+        i = key_hash % nslots
+        while True:
+            h, eid = slot.unpack_from(mm, self._index_start + i * slot.size)
+            if h == 0:
+                return -1, 0
+            if h == key_hash:
+                key_len, first_block = self._entry.unpack_from(mm, self._entry_at(eid))[4::2]
+                if key_len == len(key) and self._read(mm, first_block, 0, key_len) == key:
+                    return i, eid
+            i = (i + 1) % nslots
+
+    def _slot_of(self, mm, key_hash, eid):
+        """ Find the index slot of an entry
+        :rtype: int
+        """
+        nslots, slot = self.nslots, self._slot
+        i = key_hash % nslots
+        while slot.unpack_from(mm, self._index_start + i * slot.size)[1] != eid:
+            i = (i + 1) % nslots
+        return i
+
+    def _unindex(self, mm, i):
+        """ Clear the index slot `i`: backward shift, so that no tombstones are left """
+        nslots, slot, index_start = self.nslots, self._slot, self._index_start
+        j = i
+        while True:
+            j = (j + 1) % nslots
+            h, eid = slot.unpack_from(mm, index_start + j * slot.size)
+            if h == 0:
+                break
+            home = h % nslots
+            # The slot stays if its home is cyclically in (i, j]
+            if (i <= j and i < home <= j) or (i > j and (home > i or home <= j)):
+                continue
+            slot.pack_into(mm, index_start + i * slot.size, h, eid)
+            i = j
+        slot.pack_into(mm, index_start + i * slot.size, 0, 0)
+
+    def _lru_unlink(self, mm, eid, prev, next):
+        """ Remove an entry from the LRU list """
+        if prev:
+            self._u32.pack_into(mm, self._entry_at(prev) + self._next_offset, next)
+        else:
+            self._put(mm, 'lru_head', next)
+        if next:
+            self._u32.pack_into(mm, self._entry_at(next) + self._prev_offset, prev)
+        else:
+            self._put(mm, 'lru_tail', prev)
+
+    def _lru_push(self, mm, eid):
+        """ Put an entry at the head of the LRU list: the most recently used """
+        head = self._get(mm, 'lru_head')
+        position = self._entry_at(eid)
+        self._u32.pack_into(mm, position + self._prev_offset, 0)
+        self._u32.pack_into(mm, position + self._next_offset, head)
+        if head:
+            self._u32.pack_into(mm, self._entry_at(head) + self._prev_offset, eid)
+        else:
+            self._put(mm, 'lru_tail', eid)
+        self._put(mm, 'lru_head', eid)
+
+    def _remove(self, mm, i, eid):
+        """ Remove the value of entry `eid` in index slot `i`: free its entry and blocks """
+        h, expires, prev, next, key_len, value_len, first_block = self._entry.unpack_from(mm, self._entry_at(eid))
+        self._unindex(mm, i)
+        self._lru_unlink(mm, eid, prev, next)
+
+        # Blocks: the chain goes to the head of the free list
+        last = first_block
+        for _ in range(self._nblocks(key_len + value_len) - 1):
+            last = self._next_block(mm, last)
+        self._link_block(mm, last, self._get(mm, 'free_block'))
+        self._put(mm, 'free_block', first_block)
+
+        # Entry: to the free list, linked with `next`
+        self._u32.pack_into(mm, self._entry_at(eid) + self._next_offset, self._get(mm, 'free_entry'))
+        self._put(mm, 'free_entry', eid)
+        self._put(mm, 'count', self._get(mm, 'count') - 1)
+
+    def _evict(self, mm):
+        """ Evict the least recently used value """
+        eid = self._get(mm, 'lru_tail')
+        key_hash = self._entry.unpack_from(mm, self._entry_at(eid))[0]
+        self._remove(mm, self._slot_of(mm, key_hash, eid), eid)
+
+    def _nblocks(self, size):
+        """ The number of blocks for `size` bytes """
+        return max(1, -(-size // self.block_size))
+
+    def _allocate_block(self, mm):
+        """ Take a free block, or None if there's none
+        :rtype: int|None
+        """
+        block = self._get(mm, 'free_block')
+        if block:
+            self._put(mm, 'free_block', self._next_block(mm, block))
+            return block
+        top = self._get(mm, 'block_top')
+        if top < self.nblocks:
+            self._put(mm, 'block_top', top + 1)
+            return top + 1
+        return None
+
+    def _allocate_entry(self, mm):
+        """ Take a free entry, or None if there's none
+        :rtype: int|None
+        """
+        eid = self._get(mm, 'free_entry')
+        if eid:
+            self._put(mm, 'free_entry', self._u32.unpack_from(mm, self._entry_at(eid) + self._next_offset)[0])
+            return eid
+        top = self._get(mm, 'entry_top')
+        if top < self.maxsize:
+            self._put(mm, 'entry_top', top + 1)
+            return top + 1
+        return None
+
+    #endregion
+
+    def get(self, key):
+        key = key.encode('utf-8')
+        with self._locked() as mm:
+            i, eid = self._find(mm, _key_hash(key), key)
+            if i < 0:
+                return None
+            h, expires, prev, next, key_len, value_len, first_block = self._entry.unpack_from(mm, self._entry_at(eid))
+            if expires and expires <= self.timer():
+                self._remove(mm, i, eid)
+                return None
+            if prev:  # not the most recently used one yet
+                self._lru_unlink(mm, eid, prev, next)
+                self._lru_push(mm, eid)
+            return self._read(mm, first_block, key_len, value_len)
+
+    def set(self, key, value, ttl=None):
+        ttl = ttl if ttl is not None else self.ttl
+        key = key.encode('utf-8')
+        key_hash = _key_hash(key)
+        record = key + bytes(value)
+        nblocks = self._nblocks(len(record))
+        with self._locked() as mm:
+            i, eid = self._find(mm, key_hash, key)
+            if i >= 0:
+                self._remove(mm, i, eid)
+            if nblocks > self.nblocks:
+                return
+
+            # Make room
+            eid = self._allocate_entry(mm)
+            while eid is None:
+                self._evict(mm)
+                eid = self._allocate_entry(mm)
+            blocks = []
+            while len(blocks) < nblocks:
+                block = self._allocate_block(mm)
+                if block is None:
+                    self._evict(mm)
+                else:
+                    blocks.append(block)
+
+            # Store
+            block_size = self.block_size
+            for n, block in enumerate(blocks):
+                self._link_block(mm, block, blocks[n + 1] if n + 1 < nblocks else 0)
+                start = self._data_start + (block - 1) * block_size
+                piece = record[n * block_size:(n + 1) * block_size]
+                mm[start:start+len(piece)] = piece
+            self._entry.pack_into(mm, self._entry_at(eid), key_hash, self.timer() + ttl if ttl is not None else 0.0,
+                                  0, 0, len(key), len(value), blocks[0])
+            self._lru_push(mm, eid)
+            i = key_hash % self.nslots
+            while self._slot.unpack_from(mm, self._index_start + i * self._slot.size)[0] != 0:
+                i = (i + 1) % self.nslots
+            self._slot.pack_into(mm, self._index_start + i * self._slot.size, key_hash, eid)
+            self._put(mm, 'count', self._get(mm, 'count') + 1)
+
+    def delete(self, key):
+        key = key.encode('utf-8')
+        with self._locked() as mm:
+            i, eid = self._find(mm, _key_hash(key), key)
+            if i >= 0:
+                self._remove(mm, i, eid)
+
+    def clear(self):
+        with self._locked() as mm:
+            self._reset(mm)
+
+    def __len__(self):
+        with self._locked() as mm:
+            return self._get(mm, 'count')
+
+
+def _key_hash(key):
+    """ Hash a key for the index of :cls:MmapCacheBackend: 64 bits, never 0
+    :type key: bytes
+    :rtype: int
+    """
+    return MmapCacheBackend._u64.unpack(hashlib.md5(key).digest()[:8])[0] or 1
+
+
+def _unlink_owned(pid, path):
+    """ Remove a temporary file at exit, only in the process that created it: not in forked workers """
+    if os.getpid() == pid:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+class CachedResponse(object):
+    """ An encoded response stored in the cache
+
+        The body is stored in the Content-Encoding it was first sent with, so cache hits are not compressed again.
+        Other encodings are made when first requested, and stored alongside.
+    """
+
+    def __init__(self, bodies, status, headers):
+        """
+        :param bodies: Encoded bodies: { content-encoding: body }. 'identity' for the uncompressed one
+        :type bodies: dict[str, bytes]
+        :param status: Status code
+        :type status: int
+        :param headers: Headers, without `Content-Encoding`
+        :type headers: list[tuple(str, str)]
+        """
+        self.bodies = bodies
+        self.status = status
+        self.headers = headers
+
+        #: Whether new bodies were added since it was loaded
+        self.modified = False
+
+    @classmethod
+    def from_response(cls, response):
+        """ Make one from a response
+        :type response: flask.Response
+        :rtype: CachedResponse
+        """
+        encoding = response.headers.get('Content-Encoding', 'identity')
+        headers = [(k, v) for k, v in response.headers.items()
+                   if k.lower() not in ('content-length', 'content-encoding', 'date')]
+        return cls({encoding: response.get_data()}, response.status_code, headers)
+
+    def get_body(self, encoding=None, level=None, min_size=0):
+        """ Get the body in a Content-Encoding, compress one if missing
+
+        :param encoding: Content-Encoding. None: uncompressed
+        :type encoding: str|None
+        :param level: Compression level
+        :type level: int|None
+        :param min_size: Do not compress bodies smaller than this
+        :type min_size: int
+        :return: (body, content-encoding)
+        :rtype: tuple(bytes, str)
+        """
+        encoding = encoding or 'identity'
+        try:
+            return self.bodies[encoding], encoding
+        except KeyError:
+            pass
+
+        # Uncompressed
+        identity = self.bodies.get('identity')
+        if identity is None:
+            stored_encoding, body = next(iter(self.bodies.items()))
+            identity = get_codec(stored_encoding).decompress(body)
+            if encoding == 'identity':
+                self.bodies['identity'] = identity
+                self.modified = True
+        if encoding == 'identity' or len(identity) < min_size:
+            return identity, 'identity'
+
+        # Compressed
+        body = self.bodies[encoding] = get_codec(encoding).compress(identity, level)
+        self.modified = True
+        return body, encoding
+
+    def dumps(self):
+        """ Serialize for a :cls:CacheBackend: a line of JSON metadata, then the bodies
+        :rtype: bytes
+        """
+        meta = json.dumps({
+            'status': self.status,
+            'headers': self.headers,
+            'bodies': [(encoding, len(body)) for encoding, body in self.bodies.items()],
+        }, separators=(',', ':'))
+        return b''.join([meta.encode('utf-8'), b'\n'] + list(self.bodies.values()))
+
+    @classmethod
+    def loads(cls, value):
+        """ Deserialize
+        :type value: bytes
+        :rtype: CachedResponse
+        """
+        newline = value.index(b'\n')
+        meta = json.loads(bytes(value[:newline]).decode('utf-8'))
+
+        bodies = {}
+        offset = newline + 1
+        for encoding, length in meta['bodies']:
+            bodies[encoding] = value[offset:offset+length]
+            offset += length
+        return cls(bodies, meta['status'], [tuple(h) for h in meta['headers']])
+
+
+class ResponseCache(object):
+    """ Server-side cache for encoded responses of @jsonapi views
+
+        Use it with `@jsonapi(cache=...)`. Caches encoded bodies of successful `GET` responses, with their headers.
+
+        The key is made of: the endpoint, route params, query args, and the `vary` function result.
+
+        Invalidation: `invalidate(endpoint, **params)` drops all responses of an endpoint,
+        or of a single resource. Entries are not deleted one by one: every endpoint, and every resource,
+        has a version stored in the backend that is a part of the key. Invalidation drops the version,
+        a new one is generated on the next request, and old entries are eventually evicted.
+
+        Resources: when the view is a class-based view with `primary_key` (:cls:RestfulView),
+        responses with the whole primary key in the route (items) depend on the versions of the endpoint and of this item,
+        and other responses (collections) depend on the versions of the endpoint and of its collections.
+        Invalidating an item invalidates it, as well as the endpoint collections, but not other items.
+    """
+
+    def __init__(self, backend=None, ttl=None, query_args=None, vary=None, key_prefix='jsonapi'):
+        """ Init the cache
+        :param backend: Storage. Default: in-process LRU cache
+        :type backend: CacheBackend|None
+        :param ttl: Time to live for cached responses, seconds
+        :type ttl: float|None
+        :param query_args: Names of query args that are a part of the key. Default: all of them
+        :type query_args: Iterable[str]|None
+        :param vary: Callable() -> str: additional part of the key, e.g. the current user id
+        :type vary: Callable|None
+        :param key_prefix: Prefix for backend keys
+        :type key_prefix: str
+        """
+        self.backend = backend if backend is not None else MemoryCacheBackend()
+        self.ttl = ttl
+        self.query_args = frozenset(query_args) if query_args is not None else None
+        self.vary = vary
+        self.key_prefix = key_prefix
+
+    #region Keys
+
+    def _namespace_version(self, namespace):
+        """ Get the current version of a namespace, create one if missing
+
+        A missing version (never set, or evicted) gets a new random value, so stale entries are never reused.
+
+        :type namespace: str
+        :rtype: str
+        """
+        key = '{}:ns:{}'.format(self.key_prefix, namespace)
+        version = self.backend.get(key)
+        if version is None:
+            version = uuid.uuid4().hex.encode('ascii')
+            self.backend.set(key, version)
+        return bytes(version).decode('ascii')
+
+    def _namespaces(self, endpoint, params):
+        """ Get the namespaces of a response: the endpoint, and a single resource or the collections of a resource view
+
+        :type endpoint: str
+        :param params: Route parameters
+        :type params: dict
+        :rtype: list[str]
+        """
+        resource_params = _resource_params(endpoint)
+        if not resource_params:
+            return [endpoint]
+        if all(params.get(p) is not None for p in resource_params):
+            return [endpoint, _item_namespace(endpoint, [params[p] for p in resource_params])]
+        return [endpoint, _collections_namespace(endpoint)]
+
+    def make_key(self, endpoint, params, args, variant=None):
+        """ Make a key for a request
+
+        :param endpoint: Endpoint name
+        :type endpoint: str
+        :param params: Route parameters
+        :type params: dict
+        :param args: Query args
+        :type args: werkzeug.datastructures.MultiDict
+        :param variant: Representation negotiated with the client, e.g. 'ndjson'
+        :type variant: str|None
+        :rtype: str
+        """
+        parts = [
+            [self._namespace_version(ns) for ns in self._namespaces(endpoint, params)],
+            endpoint,
+            sorted((k, v) for k, v in params.items() if v is not None),
+            sorted((k, v) for k, v in args.items(multi=True) if self.query_args is None or k in self.query_args),
+            self.vary() if self.vary else None,
+            variant,
+        ]
+        digest = hashlib.md5(json.dumps(parts, default=str, separators=(',', ':')).encode('utf-8')).hexdigest()
+        return '{}:r:{}'.format(self.key_prefix, digest)
+
+    def request_key(self):
+        """ Make a key for the current request, or None if it's not cacheable
+        :rtype: str|None
+        """
+        if request.method not in ('GET', 'HEAD') or request.endpoint is None:
+            return None
+        return self.make_key(request.endpoint, request.view_args or {}, request.args,
+                             'ndjson' if _client_accepts_ndjson() else None)
+
+    #endregion
+
+    #region Responses
+
+    def get(self, key):
+        """ Get a cached response
+        :type key: str
+        :rtype: CachedResponse|None
+        """
+        value = self.backend.get(key)
+        return CachedResponse.loads(value) if value is not None else None
+
+    def make_response(self, key, cached):
+        """ Make a response for the current request from a cached one
+
+        The body Content-Encoding is negotiated with the client.
+        When a new encoding is made, it is stored in the cache as well.
+
+        :type key: str
+        :type cached: CachedResponse
+        :rtype: JsonResponse
+        """
+        compression = app_settings().compression
+        if compression is None:
+            body, encoding = cached.get_body()
+        else:
+            body, encoding = cached.get_body(compression.negotiate(), level=compression.level, min_size=compression.min_size)
+        if cached.modified:
+            self.backend.set(key, cached.dumps(), ttl=self.ttl)
+
+        response = JsonResponse.from_encoded(body, cached.status, cached.headers)
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+        return response
+
+    def set(self, key, response):
+        """ Store a response, if it's cacheable
+
+        Only complete `200 OK` responses that do not set cookies are stored.
+
+        :type key: str
+        :type response: flask.Response
+        :rtype: bool
+        """
+        if isinstance(response, JsonResponse):
+            response.encode_body()  # lazy responses: ETag, compression
+        if response.status_code != 200 or response.is_streamed or 'Set-Cookie' in response.headers:
+            return False
+        self.backend.set(key, CachedResponse.from_response(response).dumps(), ttl=self.ttl)
+        return True
+
+    def invalidate(self, endpoint, **params):
+        """ Invalidate cached responses of an endpoint, or a resource
+
+        :param endpoint: Endpoint name
+        :type endpoint: str
+        :param params: Route parameters of a resource (its primary key): invalidate this resource and the collections.
+            With an incomplete primary key, only the collections are invalidated.
+            Without them, all responses of the endpoint are invalidated, items included.
+        """
+        resource_params = _resource_params(endpoint)
+        if not params or not resource_params:
+            namespaces = [endpoint]
+        else:
+            namespaces = [_collections_namespace(endpoint)]
+            if all(params.get(p) is not None for p in resource_params):
+                namespaces.append(_item_namespace(endpoint, [params[p] for p in resource_params]))
+        for ns in namespaces:
+            self.backend.delete('{}:ns:{}'.format(self.key_prefix, ns))
+
+    def clear(self):
+        """ Drop everything """
+        self.backend.clear()
+
+    #endregion
+
+
+def _resource_params(endpoint):
+    """ Get route params that identify a resource: the primary key of a class-based view
+    :type endpoint: str
+    :rtype: tuple
+    """
+    view_class = getattr(current_app.view_functions.get(endpoint), 'view_class', None)
+    return getattr(view_class, 'primary_key', ())
+
+
+def _collections_namespace(endpoint):
+    """ Namespace for the collections of a resource view
+    :type endpoint: str
+    :rtype: str
+    """
+    return '{}:*'.format(endpoint)
+
+
+def _item_namespace(endpoint, pk):
+    """ Namespace for a single resource
+    :type endpoint: str
+    :type pk: list
+    :rtype: str
+    """
+    return '{}:{}'.format(endpoint, json.dumps(pk, default=str, separators=(',', ':')))
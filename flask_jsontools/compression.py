@@ -0,0 +1,227 @@
+from __future__ import absolute_import
+from builtins import object
+
+import zlib
+
+from flask import current_app, request, has_request_context
+
+
+class Codec(object):
+    """ Content-Encoding codec """
+
+    #: Content-Encoding name
+    name = None
+
+    #: Default compression level
+    default_level = None
+
+    def compress(self, data, level=None):
+        """ Compress data
+        :type data: bytes
+        :param level: Compression level. None: the default one
+        :type level: int|None
+        :rtype: bytes
+        """
+        raise NotImplementedError
+
+    def decompress(self, data):
+        """ Decompress data
+        :type data: bytes
+        :rtype: bytes
+        """
+        raise NotImplementedError
+
+    def iter_compress(self, chunks, level=None):
+        """ Compress a stream, chunk by chunk
+
+        Every chunk is flushed, so that the client can decode it as soon as it arrives.
+
+        :type chunks: Iterable[bytes]
+        :param level: Compression level. None: the default one
+        :type level: int|None
+        :rtype: Iterator[bytes]
+        """
+        raise NotImplementedError
+
+    def iter_decompress(self, chunks):
+        """ Decompress a stream, chunk by chunk
+
+        :type chunks: Iterable[bytes]
+        :rtype: Iterator[bytes]
+        """
+        raise NotImplementedError
+
+    def __repr__(self):
+        return '<{cls}: {name}>'.format(cls=self.__class__.__name__, name=self.name)
+
+
+class GzipCodec(Codec):
+    """ gzip, with zlib """
+
+    name = 'gzip'
+    default_level = 6
+
+    # zlib window bits for the gzip container
+    _wbits = 16 + zlib.MAX_WBITS
+
+    def compress(self, data, level=None):
+        compressor = zlib.compressobj(self.default_level if level is None else level, zlib.DEFLATED, self._wbits)
+        return compressor.compress(data) + compressor.flush()
+
+    def decompress(self, data):
+        return zlib.decompress(data, self._wbits)
+
+    def iter_compress(self, chunks, level=None):
+        compressor = zlib.compressobj(self.default_level if level is None else level, zlib.DEFLATED, self._wbits)
+        for chunk in chunks:
+            yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+
+    def iter_decompress(self, chunks):
+        decompressor = zlib.decompressobj(self._wbits)
+        for chunk in chunks:
+            yield decompressor.decompress(chunk)
+        yield decompressor.flush()
+
+
+class BrotliCodec(Codec):
+    """ Brotli, with the `brotli` package """
+
+    name = 'br'
+    default_level = 4
+
+    def __init__(self):
+        import brotli
+        self._brotli = brotli
+
+    def compress(self, data, level=None):
+        return self._brotli.compress(data, quality=self.default_level if level is None else level)
+
+    def decompress(self, data):
+        return self._brotli.decompress(data)
+
+    def iter_compress(self, chunks, level=None):
+        compressor = self._brotli.Compressor(quality=self.default_level if level is None else level)
+        for chunk in chunks:
+            yield compressor.process(chunk) + compressor.flush()
+        yield compressor.finish()
+
+    def iter_decompress(self, chunks):
+        decompressor = self._brotli.Decompressor()
+        for chunk in chunks:
+            yield decompressor.process(chunk)
+
+
+class ZstdCodec(Codec):
+    """ Zstandard, with the `zstandard` package """
+
+    name = 'zstd'
+    default_level = 3
+
+    def __init__(self):
+        import zstandard
+        self._zstd = zstandard
+
+    def compress(self, data, level=None):
+        return self._zstd.ZstdCompressor(level=self.default_level if level is None else level).compress(data)
+
+    def decompress(self, data):
+        return self._zstd.ZstdDecompressor().decompressobj().decompress(data)
+
+    def iter_compress(self, chunks, level=None):
+        compressor = self._zstd.ZstdCompressor(level=self.default_level if level is None else level).compressobj()
+        for chunk in chunks:
+            yield compressor.compress(chunk) + compressor.flush(self._zstd.COMPRESSOBJ_FLUSH_BLOCK)
+        yield compressor.flush()
+
+    def iter_decompress(self, chunks):
+        decompressor = self._zstd.ZstdDecompressor().decompressobj()
+        for chunk in chunks:
+            yield decompressor.decompress(chunk)
+
+
+#: Known codecs, preferred first
+content_codecs = (ZstdCodec, BrotliCodec, GzipCodec)
+
+_codecs_cache = {}
+
+
+def get_codec(name):
+    """ Get a codec by its Content-Encoding name
+
+    :param name: 'gzip', 'br', 'zstd'
+    :type name: str
+    :rtype: Codec
+    :raises ImportError: the codec library is not installed
+    :raises ValueError: unknown codec
+    """
+    try:
+        return _codecs_cache[name]
+    except KeyError:
+        pass
+
+    try:
+        codec_cls = next(c for c in content_codecs if c.name == name)
+    except StopIteration:
+        raise ValueError('Unknown Content-Encoding: {}'.format(name))
+    codec = _codecs_cache[name] = codec_cls()
+    return codec
+
+
+def available_encodings():
+    """ Get names of codecs that are installed, preferred first
+    :rtype: tuple[str]
+    """
+    names = []
+    for codec_cls in content_codecs:
+        try:
+            get_codec(codec_cls.name)
+        except ImportError:
+            continue
+        names.append(codec_cls.name)
+    return tuple(names)
+
+
+class CompressionSettings(object):
+    """ Compression settings of an app
+
+        Config keys:
+
+        * `JSONTOOLS_COMPRESS`: enable compression. Default: False
+        * `JSONTOOLS_COMPRESS_MIN_SIZE`: do not compress bodies smaller than this, bytes. Default: 500
+        * `JSONTOOLS_COMPRESS_LEVEL`: compression level. Default: the default level of every codec
+        * `JSONTOOLS_COMPRESS_ENCODINGS`: Content-Encodings to use, preferred first. Default: all installed
+    """
+
+    def __init__(self, min_size=500, level=None, encodings=None):
+        self.min_size = min_size
+        self.level = level
+        self.encodings = tuple(encodings) if encodings is not None else available_encodings()
+
+    @classmethod
+    def from_app(cls, app=None):
+        """ Get settings of the current app
+        :rtype: CompressionSettings|None
+        :return: Settings, or None if compression is disabled
+        """
+        try:
+            config = (app or current_app).config
+            if not config.get('JSONTOOLS_COMPRESS', False):
+                return None
+        except RuntimeError:  # "RuntimeError: working outside of application context"
+            return None
+        return cls(
+            min_size=config.get('JSONTOOLS_COMPRESS_MIN_SIZE', 500),
+            level=config.get('JSONTOOLS_COMPRESS_LEVEL', None),
+            encodings=config.get('JSONTOOLS_COMPRESS_ENCODINGS', None),
+        )
+
+    def negotiate(self):
+        """ Choose the Content-Encoding for the current request, with `Accept-Encoding`
+
+        :return: Codec name, or None for no compression
+        :rtype: str|None
+        """
+        if not has_request_context():
+            return None
+        return request.accept_encodings.best_match(self.encodings)
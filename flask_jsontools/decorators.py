@@ -2,11 +2,18 @@ from __future__ import absolute_import
 
 
 from functools import wraps, update_wrapper, partial
+from timeit import default_timer
 
-from .response import normalize_response_value, make_json_response
+from flask import request
+from werkzeug.http import is_resource_modified
 
+from .response import normalize_response_value, make_json_response, JsonResponse
+from .profiling import RequestProfile
+from .aio import isawaitable, run_coroutine
+from .parsing import check_body_size, _MAX_BODY_SIZE_KEY
 
-def jsonapi(f):
+
+def jsonapi(f=None, etag=None, last_modified=None, cache=None, max_body_size=None):
     """ Declare the view as a JSON API method
 
         This converts view return value into a :cls:JsonResponse.
@@ -14,9 +21,77 @@ def jsonapi(f):
         The following return types are supported:
             - tuple: a tuple of (response, status, headers)
             - any other object is converted to JSON
+
+        Can be used as `@jsonapi`, or with options: `@jsonapi(etag=...)`.
+
+        Views can be declared with `async def`: the coroutine is run in an event loop.
+        Async generators are streamed, just like generators.
+
+        Conditional requests: give `etag` and/or `last_modified` callables that are called
+        with the view arguments and return the current version of the data (str), and its modification time.
+        When the client's copy is still valid, the view is not called at all: `304 Not Modified` is sent.
+
+        :param etag: Callable(*args, **kwargs) -> str: the version of the data
+        :type etag: Callable|None
+        :param last_modified: Callable(*args, **kwargs) -> datetime: the modification time of the data
+        :type last_modified: Callable|None
+        :param cache: Server-side cache for encoded responses
+        :type cache: flask_jsontools.cache.ResponseCache|None
+        :param max_body_size: Request body size limit, bytes. Default: the `JSONTOOLS_MAX_BODY_SIZE` config key.
+            Bodies over the limit are rejected with `413 Request Entity Too Large` before the view is called.
+            Read the body with :func:flask_jsontools.parsing.get_json_body or :func:flask_jsontools.parsing.iter_json_body
+        :type max_body_size: int|None
+
+        Profiling: see :cls:flask_jsontools.profiling.RequestProfile
     """
+    if f is None:
+        return partial(jsonapi, etag=etag, last_modified=last_modified, cache=cache, max_body_size=max_body_size)
+
     @wraps(f)
     def wrapper(*args, **kwargs):
+        if max_body_size is not None:
+            request.environ[_MAX_BODY_SIZE_KEY] = max_body_size
+        check_body_size()
+
+        profile = RequestProfile.start()
+        if profile is None:
+            return respond(args, kwargs)
+        return profile.finish(respond(args, kwargs, profile))
+
+    def call_view(args, kwargs):
         rv = f(*args, **kwargs)
-        return make_json_response(rv)
+        if isawaitable(rv):
+            rv = run_coroutine(rv)
+        return rv
+
+    def respond(args, kwargs, profile=None):
+        # Conditional request: the view is skipped when the client's copy is still valid
+        version = modified = None
+        if etag or last_modified:
+            version = etag(*args, **kwargs) if etag else None
+            modified = last_modified(*args, **kwargs) if last_modified else None
+            if request.method in ('GET', 'HEAD') and not is_resource_modified(request.environ, etag=version, last_modified=modified):
+                return JsonResponse(None, etag=version, last_modified=modified)
+
+        # Cached response
+        key = cache.request_key() if cache is not None else None
+        if key is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                return cache.make_response(key, cached).make_conditional_json()
+
+        # View
+        if profile is None:
+            rv = call_view(args, kwargs)
+        else:
+            t = default_timer()
+            rv = call_view(args, kwargs)
+            profile.view_time += default_timer() - t
+        response = make_json_response(rv)
+
+        if (version or modified) and response.status_code == 200:
+            response.make_conditional_json(version, modified)
+        if key is not None:
+            cache.set(key, response)
+        return response
     return wrapper
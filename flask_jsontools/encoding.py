@@ -0,0 +1,355 @@
+from __future__ import absolute_import
+from builtins import object
+
+import re
+import json
+import uuid
+
+from flask import current_app
+
+from .formatting import DynamicJSONEncoder
+
+
+class JsonBackend(object):
+    """ JSON serialization backend
+
+        All backends share the same output contract, so that switching them is safe:
+
+        * The result is UTF-8 encoded `bytes`. With `ensure_ascii`, non-ASCII characters are escaped: `"\\u044b"`
+        * Compact separators: `{"a":1,"b":[1,2]}`
+        * With `indent`, the output matches `json.dumps(indent=2, separators=(',', ': '))`
+        * Objects the backend does not know are passed to the `default` hook,
+          which is how `DynamicJSONEncoder.__json__()` support is preserved
+
+        The only known differences are exotic float representations (`1e16` vs `1e+16`)
+        and non-finite floats, which are not valid JSON anyway.
+    """
+
+    #: Backend name
+    name = None
+
+    def __init__(self, ensure_ascii=False):
+        """
+        :param ensure_ascii: Escape non-ASCII characters, like Flask does with `JSON_AS_ASCII`
+        :type ensure_ascii: bool
+        """
+        self.ensure_ascii = ensure_ascii
+
+    def dumps(self, obj, default=None, indent=None, sort_keys=False):
+        """ Encode an object to JSON
+
+        :param obj: The object to encode
+        :param default: Hook for objects the backend does not know how to encode
+        :type default: Callable|None
+        :param indent: Pretty-print indentation: 2, or None
+        :type indent: int|None
+        :param sort_keys: Sort dictionary keys
+        :type sort_keys: bool
+        :rtype: bytes
+        """
+        raise NotImplementedError
+
+    def loads(self, s):
+        """ Decode JSON
+        :type s: bytes|str
+        """
+        raise NotImplementedError
+
+    def __repr__(self):
+        return '<{cls}: {name}{ascii}>'.format(cls=self.__class__.__name__, name=self.name,
+                                               ascii=', ensure_ascii' if self.ensure_ascii else '')
+
+
+class StdlibJsonBackend(JsonBackend):
+    """ The `json` module from the standard library """
+
+    name = 'stdlib'
+
+    def dumps(self, obj, default=None, indent=None, sort_keys=False):
+        return json.dumps(obj, default=default, indent=indent, sort_keys=sort_keys,
+                          ensure_ascii=self.ensure_ascii,
+                          separators=(',', ': ') if indent else (',', ':')
+                          ).encode('utf-8')
+
+    def loads(self, s):
+        if isinstance(s, bytes):
+            s = s.decode('utf-8')
+        return json.loads(s)
+
+
+class OrjsonBackend(JsonBackend):
+    """ orjson: the fastest one
+
+        Dates and dataclasses are passed to the `default` hook, just like the stdlib does.
+        Anything orjson fails to encode (e.g. integers over 64 bits) is retried with the stdlib.
+        orjson always outputs UTF-8: with `ensure_ascii`, non-ASCII output is escaped afterwards.
+    """
+
+    name = 'orjson'
+
+    def __init__(self, ensure_ascii=False):
+        import orjson
+        super(OrjsonBackend, self).__init__(ensure_ascii)
+        self._orjson = orjson
+        self._fallback = StdlibJsonBackend(ensure_ascii)
+        self._option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+
+    def dumps(self, obj, default=None, indent=None, sort_keys=False):
+        option = self._option
+        if indent:
+            option |= self._orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= self._orjson.OPT_SORT_KEYS
+        try:
+            body = self._orjson.dumps(obj, default=default, option=option)
+        except TypeError:
+            return self._fallback.dumps(obj, default=default, indent=indent, sort_keys=sort_keys)
+        return _escape_non_ascii(body) if self.ensure_ascii else body
+
+    def loads(self, s):
+        return self._orjson.loads(s)
+
+
+class UjsonBackend(JsonBackend):
+    """ ujson: faster than the stdlib
+
+        Anything ujson fails to encode is retried with the stdlib.
+    """
+
+    name = 'ujson'
+
+    def __init__(self, ensure_ascii=False):
+        import ujson
+        super(UjsonBackend, self).__init__(ensure_ascii)
+        self._ujson = ujson
+        self._fallback = StdlibJsonBackend(ensure_ascii)
+
+    def dumps(self, obj, default=None, indent=None, sort_keys=False):
+        try:
+            return self._ujson.dumps(obj, default=default, indent=indent or 0, sort_keys=sort_keys,
+                                     ensure_ascii=self.ensure_ascii, escape_forward_slashes=False).encode('utf-8')
+        except (TypeError, OverflowError):
+            return self._fallback.dumps(obj, default=default, indent=indent, sort_keys=sort_keys)
+
+    def loads(self, s):
+        return self._ujson.loads(s)
+
+
+def _escape_non_ascii(body):
+    """ Escape non-ASCII characters in encoded JSON
+
+    They only occur inside of strings, so they are replaced with `\\uXXXX` escapes, just like `json.dumps()` does.
+
+    :type body: bytes
+    :rtype: bytes
+    """
+    try:
+        body.decode('ascii')
+        return body
+    except UnicodeDecodeError:
+        return _non_ascii.sub(lambda m: json.dumps(m.group())[1:-1], body.decode('utf-8')).encode('ascii')
+
+
+#: Non-ASCII characters
+_non_ascii = re.compile(u'[^\x00-\x7f]+')
+
+
+#region Pre-encoded JSON
+
+class RawJSON(object):
+    """ A pre-encoded JSON fragment: spliced into the output verbatim, without decoding it
+
+        Use it for ready-made JSON: cached documents, JSON columns fetched as text, responses of other services.
+        The fragment is not validated: it must be valid JSON.
+
+            return {'id': doc.id, 'body': RawJSON(doc.body_json)}
+
+        `JsonResponse` and `FlaskJsonClient` splice fragments into the body (see :cls:RawJSONSplicer).
+        Anything else (e.g. `flask.json.dumps()` with :cls:DynamicJSONEncoder) gets the decoded value via `__json__()`.
+    """
+
+    __slots__ = ('json', '_value')
+
+    def __init__(self, json):
+        """
+        :param json: Encoded JSON
+        :type json: bytes|str
+        """
+        #: Encoded JSON, UTF-8
+        self.json = json if isinstance(json, bytes) else json.encode('utf-8')
+        self._value = _undecoded
+
+    @property
+    def value(self):
+        """ The decoded value: decoded on first use """
+        if self._value is _undecoded:
+            self._value = app_json_backend().loads(self.json)
+        return self._value
+
+    def __json__(self):
+        return self.value
+
+    def __eq__(self, other):
+        return isinstance(other, RawJSON) and self.json == other.json
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '{cls}({json!r})'.format(cls=self.__class__.__name__, json=self.json)
+
+
+#: Marker for RawJSON values that are not decoded yet
+_undecoded = object()
+
+
+class RawJSONSplicer(object):
+    """ A `default` hook for JSON backends that splices :cls:RawJSON fragments into the output
+
+        Backends can't embed raw bytes, so every fragment is replaced with a placeholder string,
+        and placeholders are replaced with fragments in the encoded output:
+
+            splicer = RawJSONSplicer(encoder.default)
+            body = splicer.splice(backend.dumps(data, default=splicer))
+
+        Placeholders contain a random per-process token, so they never clash with real data.
+    """
+
+    __slots__ = ('default', 'fragments', 'spliced')
+
+    #: Placeholder format, and its pattern in the encoded output
+    _token = 'rawjson-{}-'.format(uuid.uuid4().hex)
+    _placeholder = re.compile(b'"' + _token.encode('ascii') + br'(\d+)"')
+
+    def __init__(self, default=None):
+        """
+        :param default: The `default` hook for other objects
+        :type default: Callable|None
+        """
+        self.default = default
+
+        #: Fragments met since the last splice()
+        self.fragments = []
+
+        #: The number of fragments spliced so far
+        self.spliced = 0
+
+    def __call__(self, o):
+        if type(o) is RawJSON:
+            self.fragments.append(o.json)
+            return self._token + str(len(self.fragments) - 1)
+        if self.default is None:
+            raise TypeError('Object of type {} is not JSON serializable'.format(type(o).__name__))
+        return self.default(o)
+
+    def splice(self, body):
+        """ Put the fragments into the encoded output
+        :type body: bytes
+        :rtype: bytes
+        """
+        if not self.fragments:
+            return body
+        fragments, self.fragments = self.fragments, []
+        self.spliced += len(fragments)
+        return self._placeholder.sub(lambda m: fragments[int(m.group(1))], body)
+
+    def dumps(self, backend, obj, indent=None, sort_keys=False):
+        """ Encode an object with fragments
+
+        :type backend: JsonBackend
+        :rtype: bytes
+        """
+        if type(obj) is RawJSON:
+            self.spliced += 1
+            return obj.json
+        return self.splice(backend.dumps(obj, default=self, indent=indent, sort_keys=sort_keys))
+
+#endregion
+
+
+#: Known backends, fastest first
+json_backends = (OrjsonBackend, UjsonBackend, StdlibJsonBackend)
+
+_backends_cache = {}
+
+
+def get_json_backend(name='auto', ensure_ascii=False):
+    """ Get a JSON backend by name
+
+    :param name: Backend name: 'orjson', 'ujson', 'stdlib', or 'auto' to pick the fastest one installed
+    :type name: str
+    :param ensure_ascii: Escape non-ASCII characters
+    :type ensure_ascii: bool
+    :rtype: JsonBackend
+    :raises ImportError: the requested backend is not installed
+    :raises ValueError: unknown backend
+    """
+    try:
+        return _backends_cache[name, ensure_ascii]
+    except KeyError:
+        pass
+
+    if name == 'auto':
+        for backend_cls in json_backends:
+            try:
+                backend = backend_cls(ensure_ascii)
+            except ImportError:
+                continue
+            break
+    else:
+        try:
+            backend_cls = next(b for b in json_backends if b.name == name)
+        except StopIteration:
+            raise ValueError('Unknown JSON backend: {}'.format(name))
+        backend = backend_cls(ensure_ascii)
+
+    _backends_cache[name, ensure_ascii] = backend
+    return backend
+
+
+def app_json_backend(app=None):
+    """ Get the JSON backend configured for the app with `JSONTOOLS_JSON_BACKEND` and `JSON_AS_ASCII`
+
+    When the app is registered with :cls:JsonTools, its resolved backend is used.
+
+    :param app: Flask application, or None to use the current one
+    :type app: flask.Flask|None
+    :rtype: JsonBackend
+    """
+    try:
+        app = app or current_app._get_current_object()
+    except RuntimeError:  # "RuntimeError: working outside of application context"
+        return get_json_backend()
+    settings = app.extensions.get('jsontools')
+    if settings is not None:
+        return settings.backend
+    return get_json_backend(app.config.get('JSONTOOLS_JSON_BACKEND', 'auto'), app.config.get('JSON_AS_ASCII', True))
+
+
+def app_json_encoder(app=None):
+    """ Get an instance of the app's `json_encoder`
+
+    Outside of the application context, :cls:DynamicJSONEncoder is used.
+
+    :param app: Flask application, or None to use the current one
+    :type app: flask.Flask|None
+    :rtype: json.JSONEncoder
+    """
+    try:
+        app = app or current_app._get_current_object()
+        encoder_cls = app.json_encoder
+    except (RuntimeError, AttributeError):  # no app context; Flask without `json_encoder`
+        encoder_cls = DynamicJSONEncoder
+    return encoder_cls()
+
+
+def app_json_default(app=None):
+    """ Get the `default` hook: the `default()` method of the app's `json_encoder`
+
+    :param app: Flask application, or None to use the current one
+    :type app: flask.Flask|None
+    :rtype: Callable
+    """
+    return app_json_encoder(app).default
@@ -0,0 +1,157 @@
+from __future__ import absolute_import
+from builtins import object
+
+from flask import current_app, request, has_app_context
+
+from .encoding import get_json_backend, app_json_encoder
+from .compression import CompressionSettings
+
+
+class JsonTools(object):
+    """ Flask extension that resolves the configuration once per app
+
+        Without it, the config is read for every response.
+        With it, the config is read at init_app(), and every response uses the prepared settings,
+        including a prepared instance of the app's `json_encoder`:
+
+            app.config['JSONTOOLS_PRETTY_ARG'] = 'pretty'
+            JsonTools(app)
+
+        Call init_app() again after changing the config.
+    """
+
+    def __init__(self, app=None, pretty=None):
+        """
+        :param app: Flask application
+        :type app: flask.Flask|None
+        :param pretty: Callable() -> bool: whether to pretty-print the response to the current request.
+            Default: see :meth:JsonToolsSettings.pretty_predicate
+        :type pretty: Callable|None
+        """
+        self.pretty = pretty
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """ Resolve the configuration of the app
+        :type app: flask.Flask
+        :rtype: JsonToolsSettings
+        """
+        app.extensions['jsontools'] = settings = JsonToolsSettings(app, pretty=self.pretty)
+        return settings
+
+
+class JsonToolsSettings(object):
+    """ Encoder configuration of an app, resolved from its config """
+
+    def __init__(self, app, pretty=None):
+        """
+        :type app: flask.Flask
+        :param pretty: Pretty-print predicate. Default: see :meth:pretty_predicate
+        :type pretty: Callable|None
+        """
+        config = app.config
+
+        #: JSON backend
+        #: :type: flask_jsontools.encoding.JsonBackend
+        self.backend = get_json_backend(config.get('JSONTOOLS_JSON_BACKEND', 'auto'), config.get('JSON_AS_ASCII', True))
+
+        #: Sort keys
+        self.sort_keys = config.get('JSON_SORT_KEYS', True)
+
+        #: Default ETag mode
+        self.etag = config.get('JSONTOOLS_ETAG', False)
+
+        #: Keep response data after encoding
+        self.keep_data = config.get('JSONTOOLS_KEEP_RESPONSE_DATA', True)
+
+        #: Query argument with a sparse fieldset
+        self.fields_arg = config.get('JSONTOOLS_FIELDS_ARG', None)
+
+        #: Encode bodies when responses are served
+        self.lazy = config.get('JSONTOOLS_LAZY_ENCODING', False)
+
+        #: Refresh expired entities in bulk
+        self.refresh_expired = config.get('JSONTOOLS_REFRESH_EXPIRED', False)
+
+        #: The maximum depth of related objects
+        self.max_depth = config.get('JSONTOOLS_MAX_DEPTH', None)
+
+        #: Serialize every object once per response
+        self.deduplicate = config.get('JSONTOOLS_DEDUPLICATE', False)
+
+        #: Whether encoders walk graphs of objects: they have per-response state then, and can't be shared
+        self.graph = self.max_depth is not None or self.deduplicate
+
+        #: Compression settings, or None if disabled
+        #: :type: CompressionSettings|None
+        self.compression = CompressionSettings.from_app(app)
+
+        #: Pretty-print predicate, or None to never pretty-print
+        #: :type: Callable|None
+        self.pretty = pretty if pretty is not None else self.pretty_predicate(config)
+
+        #: Prepared encoder, shared by responses without a sparse fieldset
+        self.encoder = self.make_encoder(app_json_encoder(app))
+
+    def make_encoder(self, encoder=None, fields=None):
+        """ Prepare an instance of the app's `json_encoder`
+
+        :param encoder: The instance to prepare. Default: a new one, of the same class as `self.encoder`
+        :type encoder: json.JSONEncoder|None
+        :param fields: Sparse fieldset
+        :type fields: dict|None
+        :rtype: json.JSONEncoder
+        """
+        if encoder is None:
+            encoder = type(self.encoder)()
+        if fields is not None:
+            encoder.fields = fields
+        if self.refresh_expired:
+            encoder.refresh_expired = True
+        if self.graph:
+            encoder.max_depth = self.max_depth
+            encoder.deduplicate = self.deduplicate
+        return encoder
+
+    @staticmethod
+    def pretty_predicate(config):
+        """ Get the default pretty-print predicate
+
+        * `JSONTOOLS_PRETTY_ARG`: pretty-print when this query argument is given, e.g. `?pretty`
+        * `JSONIFY_PRETTYPRINT_REGULAR`: pretty-print responses to requests other than `XMLHttpRequest`
+        * Otherwise: never
+
+        :rtype: Callable|None
+        """
+        arg = config.get('JSONTOOLS_PRETTY_ARG', None)
+        if arg:
+            return lambda: arg in request.args
+        if config.get('JSONIFY_PRETTYPRINT_REGULAR', False):
+            return _not_xhr
+        return None
+
+
+def _not_xhr():
+    """ Test that the request was not made with `XMLHttpRequest` """
+    return request.headers.get('X-Requested-With', '').lower() != 'xmlhttprequest'
+
+
+def app_settings(app=None):
+    """ Get the settings of the app
+
+    Resolved once, if the app is registered with :cls:JsonTools; otherwise, read from the config now.
+
+    :param app: Flask application, or None to use the current one
+    :type app: flask.Flask|None
+    :return: Settings, or None outside of the application context
+    :rtype: JsonToolsSettings|None
+    """
+    if app is None:
+        if not has_app_context():
+            return None
+        app = current_app._get_current_object()
+    try:
+        return app.extensions['jsontools']
+    except KeyError:
+        return JsonToolsSettings(app)
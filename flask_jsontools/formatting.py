@@ -1,7 +1,12 @@
 from __future__ import absolute_import
 from builtins import object
 
+import re
+import keyword
+from collections import Counter, defaultdict
+
 from flask.json import JSONEncoder
+from future.utils import string_types
 
 
 class DynamicJSONEncoder(JSONEncoder):
@@ -11,24 +16,375 @@ class DynamicJSONEncoder(JSONEncoder):
         Especially useful for SQLAlchemy models
     """
 
+    #: Sparse fieldset applied to objects with __json__(), see :func:parse_fieldset. None: all fields
+    fields = None
+
+    #: Refresh expired entities in bulk before serializing lists, see :meth:JsonSerializableBase._json_refresh_expired
+    refresh_expired = False
+
+    #: The maximum depth of related objects, see :cls:JsonGraph. None: unlimited
+    max_depth = None
+
+    #: Serialize every object only once, see :cls:JsonGraph
+    deduplicate = False
+
+    #: The graph of objects serialized by this encoder
+    _graph = None
+
     def default(self, o):
+        # Graphs of related objects
+        if (self.max_depth is not None or self.deduplicate) and _is_graph_node(o):
+            return self.json_graph().serialize(o, fields=self.fields)
+
+        # Classes with a compiled schema
+        if self.fields is None:
+            encode = json_encoders[type(o)]
+            if encode is not None:
+                return encode(o)
+
         # Custom JSON-encodeable objects
         if hasattr(o, '__json__'):
-            return o.__json__()
+            return o.__json__() if self.fields is None else json_fieldset(o, self.fields)
 
         # Default
         return super(DynamicJSONEncoder, self).default(o)
 
+    def default_many(self, objects):
+        """ Prepare a list of objects for encoding, in bulk
+
+        A list of :cls:JsonSerializableBase instances of the same class is serialized
+        with JsonSerializableBase._json_many(), which is much faster than calling default() on every one of them.
+        A list of instances of a class with a compiled schema is serialized with its encoder.
+        Any other list is returned as is.
+
+        :type objects: list
+        :rtype: list
+        """
+        if self.max_depth is not None or self.deduplicate:
+            if self.refresh_expired and objects and all(isinstance(o, JsonSerializableBase) for o in objects):
+                JsonSerializableBase._json_refresh_expired(objects, fields=self.fields)
+            graph = self.json_graph()
+            return [graph.serialize(o, fields=self.fields) if _is_graph_node(o) else o for o in objects]
+        if objects and self.fields is None:
+            cls = type(objects[0])
+            encode = json_encoders[cls]
+            if encode is not None and all(type(o) is cls for o in objects):
+                if self.refresh_expired and isinstance(objects[0], JsonSerializableBase):
+                    cls._json_refresh_expired(objects)
+                return [encode(o) for o in objects]
+        if objects and isinstance(objects[0], JsonSerializableBase):
+            cls = type(objects[0])
+            if _unbound(cls.__json__) is _unbound(JsonSerializableBase.__json__) and all(type(o) is cls for o in objects):
+                return cls._json_many(objects, fields=self.fields, refresh_expired=self.refresh_expired)
+        return objects
+
+    def json_graph(self):
+        """ Get the graph of objects serialized by this encoder: one per encoder, so deduplication is per-response
+        :rtype: JsonGraph
+        """
+        if self._graph is None:
+            self._graph = JsonGraph(self.max_depth, self.deduplicate)
+        return self._graph
+
+
+def _unbound(method):
+    """ Get the function of a method (Python 2 compatibility) """
+    return getattr(method, '__func__', method)
+
+
+#region Sparse fieldsets
+
+def parse_fieldset(spec):
+    """ Parse a sparse fieldset: the list of fields to include into the JSON representation of objects
+
+    Nested fields are given as paths: `author.name`. A field without nested paths is included as a whole.
+
+        >>> parse_fieldset('id,title,author.name')
+        {'id': None, 'title': None, 'author': {'name': None}}
+
+    :param spec: Comma-separated fields, a list of fields, or an already parsed fieldset
+    :type spec: str|Iterable[str]|dict|None
+    :return: Fieldset: { field: nested fieldset, or None for the whole field }. None: all fields
+    :rtype: dict|None
+    """
+    if spec is None or isinstance(spec, dict):
+        return spec
+    if isinstance(spec, string_types):
+        spec = spec.split(',')
+
+    fieldset = {}
+    for path in spec:
+        names = path.strip().split('.')
+        if not all(names):
+            continue
+        node = fieldset
+        for name in names[:-1]:
+            nested = node.get(name, {})
+            if nested is None:  # the whole field is already included
+                break
+            node[name] = nested
+            node = nested
+        else:
+            node[names[-1]] = None
+    return fieldset or None
+
+
+def json_fieldset(o, fields):
+    """ Get the JSON representation of an object with __json__(), limited to a sparse fieldset
+
+    :cls:JsonSerializableBase applies the fieldset while serializing, so that other attributes are never loaded.
+    Other objects are serialized with __json__(), and their dict representation is filtered.
+
+    :param o: An object with __json__()
+    :param fields: Fieldset, see :func:parse_fieldset
+    :type fields: dict
+    """
+    if isinstance(o, JsonSerializableBase) and _unbound(type(o).__json__) is _unbound(JsonSerializableBase.__json__):
+        return o.__json__(fields=fields)
+    return _json_nested(o.__json__(), fields)
+
+
+def _json_nested(value, fields):
+    """ Apply a nested fieldset to a value
+
+    :param value: Value of a field
+    :param fields: Nested fieldset, or None for the whole value
+    :type fields: dict|None
+    """
+    if fields is None:
+        return _json_whole(value)
+    if hasattr(value, '__json__'):
+        return json_fieldset(value, fields)
+    if isinstance(value, dict):
+        return { k: _json_nested(v, fields[k])  for k, v in value.items() if k in fields }
+    if isinstance(value, (list, tuple, set, frozenset)):
+        value = list(value)
+        if value and isinstance(value[0], JsonSerializableBase):
+            cls = type(value[0])
+            if _unbound(cls.__json__) is _unbound(JsonSerializableBase.__json__) and all(type(o) is cls for o in value):
+                return cls._json_many(value, fields=fields)
+        return [_json_nested(v, fields) for v in value]
+    return value
+
+
+def _json_whole(value):
+    """ Serialize a whole field of an object serialized with a fieldset
+
+    Nested objects are serialized with __json__() right away:
+    otherwise, the encoder would apply the top-level fieldset to them.
+    :cls:RawJSON fragments are left for the encoder to splice in.
+
+    :param value: Value of a field
+    """
+    if hasattr(value, '__json__'):
+        from .encoding import RawJSON  # circular import
+        if isinstance(value, RawJSON):
+            return value
+        return _json_whole(value.__json__())
+    if isinstance(value, dict):
+        return { k: _json_whole(v)  for k, v in value.items() }
+    if isinstance(value, (list, tuple, set, frozenset)):
+        value = list(value)
+        if value and isinstance(value[0], JsonSerializableBase):
+            cls = type(value[0])
+            if _unbound(cls.__json__) is _unbound(JsonSerializableBase.__json__) and all(type(o) is cls for o in value):
+                value = cls._json_many(value)
+        return [_json_whole(v) for v in value]
+    return value
+
+#endregion
+
+
+#region Compiled schemas
+
+#: Types that are encoded as is: values of these types are never converted by compiled encoders
+_native_types = (type(None), bool, int, float, dict, list, tuple) + tuple(string_types) + (bytes,)
+
+_identifier = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+class _JsonEncoders(dict):
+    """ Compiled encoders: { class: Callable(o) -> dict, or None for classes without a schema }
+
+        Classes with a `_json_schema` are compiled on first use; others are registered with :func:register_json_schema
+    """
+
+    def __missing__(self, cls):
+        schema = getattr(cls, '_json_schema', None)
+        if schema is None or getattr(cls, '_json_depth', None):  # depth limits are applied by JsonGraph
+            self[cls] = None
+            return None
+        return _compile_json_schema(cls, schema)
+
+
+#: Compiled encoders
+json_encoders = _JsonEncoders()
+
+
+def register_json_schema(cls, schema):
+    """ Register a static JSON schema for a class, and compile an encoder function for it
+
+    The schema lists the attributes to serialize, and optionally, their types: `{'id': int, 'author': User}`.
+    A list of names is the same as a schema with no types. The types that matter are:
+
+    * A class with a schema (`_json_schema`, or registered before): the value is encoded with its compiled encoder
+    * `[cls]`, a list with one such class: a list of those
+    * Anything else: the value is given to the JSON backend as is, and objects go through `default()` as usual
+
+    The generated function reads the attributes directly, and builds the dict in one go:
+    `{'id': o.id, 'author': None if o.author is None else encode_User(o.author)}`.
+    There's no `hasattr(o, '__json__')` check, no key set computation, and no generic fallback chain.
+
+    The schema is static: declared attributes are always serialized, so SqlAlchemy relationships in it are lazy-loaded
+    unless they are loaded eagerly. Sparse fieldsets are not applied by compiled encoders: they fall back to `__json__()`.
+
+    :param cls: The class
+    :type cls: type
+    :param schema: { attribute name: type|None }, or [ attribute name ]
+    :type schema: dict|Iterable[str]
+    :return: The compiled encoder
+    :rtype: Callable
+    """
+    return _compile_json_schema(cls, schema)
+
+
+def _is_schema_class(type_):
+    """ Test whether values of a schema type are encoded with a compiled encoder
+    :rtype: bool
+    """
+    return isinstance(type_, type) and not issubclass(type_, _native_types) and not getattr(type_, '_json_depth', None) and \
+           (json_encoders.get(type_) is not None or getattr(type_, '_json_schema', None) is not None)
+
+
+def _compile_json_schema(cls, schema):
+    """ Generate the encoder function for a class, and put it into `json_encoders`
+
+    The function is stored before nested encoders are resolved, so that schemas can refer to each other.
+
+    :type cls: type
+    :type schema: dict|Iterable[str]
+    :rtype: Callable
+    """
+    if not isinstance(schema, dict):
+        schema = dict.fromkeys(schema)
+
+    namespace = {}
+    nested = {}  # { function name: class }
+    lines = []
+    items = []
+    for i, (name, type_) in enumerate(sorted(schema.items())):
+        if not _identifier.match(name) or keyword.iskeyword(name):
+            raise ValueError('{}._json_schema: invalid attribute name: {!r}'.format(cls.__name__, name))
+
+        if isinstance(type_, list) and len(type_) == 1 and _is_schema_class(type_[0]):
+            nested['e{}'.format(i)] = type_[0]
+            lines.append('    v{i} = o.{name}'.format(i=i, name=name))
+            items.append('{key!r}: None if v{i} is None else [e{i}(v) for v in v{i}]'.format(key=name, i=i))
+        elif _is_schema_class(type_):
+            nested['e{}'.format(i)] = type_
+            lines.append('    v{i} = o.{name}'.format(i=i, name=name))
+            items.append('{key!r}: None if v{i} is None else e{i}(v{i})'.format(key=name, i=i))
+        else:
+            items.append('{key!r}: o.{name}'.format(key=name, name=name))
+
+    source = 'def encode(o):\n{lines}    return {{{items}}}\n'.format(
+        lines=''.join(line + '\n' for line in lines),
+        items=', '.join(items))
+    exec(compile(source, '<json schema: {}.{}>'.format(cls.__module__, cls.__name__), 'exec'), namespace)
+    encode = namespace['encode']
+    encode.__name__ = 'encode_{}'.format(cls.__name__)
+    encode.source = source  # for debugging
+
+    json_encoders[cls] = encode
+    for fname, type_ in nested.items():
+        namespace[fname] = json_encoders[type_]
+    return encode
+
+#endregion
+
 
 #region SqlAlchemy Tools
 
 try:
-    from sqlalchemy import inspect
+    from sqlalchemy import inspect, event, tuple_
+    from sqlalchemy.orm import Mapper, selectinload, joinedload, load_only
     from sqlalchemy.orm.state import InstanceState
 except ImportError as e:
     def __nomodule(*args, **kwargs): raise e
     inspect = __nomodule
     InstanceState = __nomodule
+    Mapper = None
+
+
+#: Bulk refresh counters: { 'queries': SELECTs issued, 'instances': expired instances refreshed }.
+#: Without the bulk refresh, every instance would have been refreshed with a query of its own.
+refresh_counters = Counter()
+
+
+class _JsonSerializationPlan(object):
+    """ Class-level key sets for :meth:JsonSerializableBase.__json__, precompiled per mapper
+
+        These sets are identical for all instances of a class, so they're computed once.
+        Only the instance state (unloaded, expired attributes) has to be checked per instance.
+    """
+
+    #: Cached plans are stored on their mappers, in this attribute, so that they live exactly as long.
+    #: (Plans refer to their mappers, so a `WeakKeyDictionary` would never release them.)
+    _attr = '_jsontools_plan'
+
+    #: Plans of earlier generations are stale: see :meth:invalidate
+    _generation = 0
+
+    def __init__(self, mapper):
+        #: The `mapper.attrs` collection the plan was compiled from.
+        #: It's replaced when properties are added to the mapper, which makes the plan stale.
+        self.attrs = mapper.attrs
+        #: The generation of plans
+        self.generation = self._generation
+
+        #: Column attributes
+        self.columns = frozenset(mapper.column_attrs.keys())
+        #: Relationships
+        self.relationships = frozenset(mapper.relationships.keys())
+        #: All candidate keys
+        self.keys = self.columns | self.relationships
+        #: Primary key attributes
+        self.primary_key = tuple(mapper.get_property_by_column(c).key for c in mapper.primary_key)
+
+        #: Keys to include even if they're not loaded
+        self.include = frozenset(mapper.class_._json_include)
+        #: Keys to exclude
+        self.exclude = frozenset(mapper.class_._json_exclude)
+
+    @classmethod
+    def get(cls, mapper):
+        """ Get a plan for the mapper, compile one if necessary
+
+        :type mapper: sqlalchemy.orm.Mapper
+        :rtype: _JsonSerializationPlan
+        """
+        plan = getattr(mapper, cls._attr, None)
+        if plan is None or plan.attrs is not mapper.attrs or plan.generation != cls._generation:
+            plan = cls(mapper)
+            setattr(mapper, cls._attr, plan)
+        return plan
+
+    @classmethod
+    def invalidate(cls, mapper=None):
+        """ Drop cached plans
+
+        :param mapper: The mapper to drop the plan for, or None to drop them all
+        :type mapper: sqlalchemy.orm.Mapper|None
+        """
+        if mapper is None:
+            _JsonSerializationPlan._generation += 1
+        else:
+            mapper.__dict__.pop(cls._attr, None)
+
+
+if Mapper is not None:
+    # Drop plans for mappers that are (re)configured
+    event.listen(Mapper, 'mapper_configured', lambda mapper, class_: _JsonSerializationPlan.invalidate(mapper))
 
 
 class JsonSerializableBase(object):
@@ -61,26 +417,181 @@ class JsonSerializableBase(object):
             the output JSON representation. It is applied last, so it beats all
             other things like _json_include.
             Useful for hiding sensitive data, like password hashes stored in DB.
+
+        A sparse fieldset (see :func:parse_fieldset) limits the keys even further:
+        attributes that are not requested are never read, so they are never loaded.
+        Nested fieldsets are applied to related objects.
+
+        Related objects are serialized recursively. To bound the depth, and to break cycles
+        of bidirectional relationships, see :cls:JsonGraph and `_json_depth`.
     """
 
     _json_include = []
     _json_exclude = []
 
-    def __json__(self, excluded_keys=set()):
-        ins = inspect(self)
+    #: Depth limits of relationships: { relationship name: depth }, see :cls:JsonGraph.
+    #: 0: emit references; 1: serialize related objects, but not their relationships; etc.
+    #: When set, instances are always serialized with a :cls:JsonGraph.
+    _json_depth = {}
+
+    #: Static schema: { attribute name: type|None }, or [ attribute name ].
+    #: When set, instances are serialized with a compiled encoder function, see :func:register_json_schema;
+    #: sparse fieldsets are limited to the schema keys, and _json_include and _json_exclude are not used
+    _json_schema = None
+
+    def __json__(self, excluded_keys=set(), fields=None):
+        if self._json_depth:
+            return JsonGraph().serialize(self, excluded_keys, fields)
+        if self._json_schema is not None:
+            return self._json_static(excluded_keys, fields)
+        keys = self._json_keys(inspect(self), excluded_keys, fields)
+        if fields is None:
+            return { key: getattr(self, key)  for key in keys }
+        return { key: _json_nested(getattr(self, key), fields[key])  for key in keys }
+
+    def _json_static(self, excluded_keys=set(), fields=None):
+        """ Serialize with the static `_json_schema`: the compiled encoder, or the schema keys in the fieldset """
+        if fields is None:
+            d = json_encoders[type(self)](self)
+            return d if not excluded_keys else { k: v  for k, v in d.items() if k not in excluded_keys }
+        return { key: _json_nested(getattr(self, key), fields[key])
+                 for key in fields if key in self._json_schema and key not in excluded_keys }
+
+    @classmethod
+    def _json_many(cls, instances, excluded_keys=set(), fields=None, refresh_expired=False):
+        """ Serialize a list of instances in bulk
+
+        The result is exactly the same as calling __json__() on every instance, but faster:
+        the set of keys is computed once for every group of instances with the same load state,
+        and loaded values are taken from the instance `__dict__` directly.
+
+        :param instances: The instances to serialize
+        :type instances: Iterable[JsonSerializableBase]
+        :param excluded_keys: Additional keys to exclude
+        :type excluded_keys: set
+        :param fields: Sparse fieldset, see :func:parse_fieldset
+        :type fields: dict|None
+        :param refresh_expired: Refresh expired instances in bulk first, see :meth:_json_refresh_expired
+        :type refresh_expired: bool
+        :rtype: list[dict]
+        """
+        if refresh_expired:
+            instances = list(instances)
+            cls._json_refresh_expired(instances, excluded_keys, fields)
+        if cls._json_depth:
+            graph = JsonGraph()
+            return [graph.serialize(instance, excluded_keys, fields) for instance in instances]
+        if cls._json_schema is not None:
+            return [instance._json_static(excluded_keys, fields) for instance in instances]
+
+        keys_by_state = {}
+        ret = []
+        for instance in instances:
+            ins = inspect(instance)
+
+            # Instances in the same load state have the same keys
+            state = (ins.mapper, ins.transient, ins.deleted, ins.detached,
+                     frozenset(ins.unloaded), frozenset(ins.expired_attributes) if ins.expired else None)
+            try:
+                keys = keys_by_state[state]
+            except KeyError:
+                keys = keys_by_state[state] = cls._json_keys(ins, excluded_keys, fields)
+
+            # Loaded attributes are in the __dict__; anything else is loaded by getattr()
+            d = instance.__dict__
+            if fields is None:
+                ret.append({ key: d[key] if key in d else getattr(instance, key)  for key in keys })
+            else:
+                ret.append({ key: _json_nested(d[key] if key in d else getattr(instance, key), fields[key])  for key in keys })
+        return ret
+
+    def _json_ref(self):
+        """ Get a reference to the object, emitted instead of the object where it's not serialized, see :cls:JsonGraph
+
+        Default: the primary key, `{'id': 1}`
+
+        :rtype: dict
+        """
+        return { key: getattr(self, key)  for key in _JsonSerializationPlan.get(inspect(self).mapper).primary_key }
+
+    @classmethod
+    def _json_refresh_expired(cls, instances, excluded_keys=set(), fields=None, chunk_size=500):
+        """ Refresh expired instances in bulk: one query per mapper, instead of one per instance
+
+        __json__() reads expired attributes, and every instance refreshes them with a query of its own.
+        Here, all expired instances are refreshed together: `SELECT ... WHERE pk IN (...)`.
+        Expired relationships that would have been lazy-loaded are loaded with `selectinload()`.
+
+        Only instances that are fully expired (e.g. after a commit) are refreshed.
+
+        :param instances: The instances to serialize
+        :type instances: Iterable[JsonSerializableBase]
+        :param excluded_keys: Additional keys to exclude
+        :type excluded_keys: set
+        :param fields: Sparse fieldset: only requested attributes are loaded
+        :type fields: dict|None
+        :param chunk_size: The maximum number of primary keys in a query
+        :type chunk_size: int
+        :return: The number of queries
+        :rtype: int
+        """
+        # Group expired instances by session and mapper, collect the relationships to load
+        groups = defaultdict(list)  # { (session, mapper): [InstanceState] }
+        relationships = defaultdict(set)  # { (session, mapper): {relationship key} }
+        for instance in instances:
+            ins = inspect(instance)
+            if not ins.expired or not ins.persistent:
+                continue
+            keys = cls._json_keys(ins, excluded_keys, fields)
+            if keys.isdisjoint(ins.expired_attributes):
+                continue
+            group = (ins.session, ins.mapper)
+            groups[group].append(ins)
+            relationships[group].update(keys & _JsonSerializationPlan.get(ins.mapper).relationships)
+
+        # Refresh
+        queries = 0
+        for (session, mapper), states in groups.items():
+            pk = mapper.primary_key
+            options = [selectinload(getattr(mapper.class_, key)) for key in sorted(relationships[(session, mapper)])]
+            with session.no_autoflush:
+                for i in range(0, len(states), chunk_size):
+                    identities = [state.identity for state in states[i:i+chunk_size]]
+                    if len(pk) == 1:
+                        condition = pk[0].in_([identity[0] for identity in identities])
+                    else:
+                        condition = tuple_(*pk).in_(identities)
+                    session.query(mapper).options(*options).filter(condition).all()
+                    queries += 1 + len(options)
+            refresh_counters['instances'] += len(states)
+        refresh_counters['queries'] += queries
+        return queries
+
+    @staticmethod
+    def _json_keys(ins, excluded_keys=set(), fields=None):
+        """ Get the keys that should be present in the JSON representation of an instance
 
-        columns = set(ins.mapper.column_attrs.keys())
-        relationships = set(ins.mapper.relationships.keys())
+        :param ins: Instance state
+        :type ins: sqlalchemy.orm.state.InstanceState
+        :param excluded_keys: Additional keys to exclude
+        :type excluded_keys: set
+        :param fields: Sparse fieldset: only these keys are allowed
+        :type fields: dict|None
+        :rtype: frozenset
+        """
+        # Class-level key sets are precompiled once per mapper
+        plan = _JsonSerializationPlan.get(ins.mapper)
+        relationships = plan.relationships
         unloaded = ins.unloaded
         expired = ins.expired_attributes
-        include = set(self._json_include)
-        exclude = set(self._json_exclude) | excluded_keys
+        include = plan.include
+        exclude = plan.exclude | excluded_keys if excluded_keys else plan.exclude
 
         # This set of keys determines which fields will be present in
         # the resulting JSON object.
         # Here we initialize it with properties defined by the model class,
         # and then add/delete some columns below in a tricky way.
-        keys = columns | relationships
+        keys = plan.keys
 
 
         # 1. Remove not yet loaded properties.
@@ -124,6 +635,196 @@ class JsonSerializableBase(object):
         # sensitive data from JSON representation.
         keys -= exclude
 
-        return { key: getattr(self, key)  for key in keys }
+        # 6. Sparse fieldset: leave only the requested keys.
+        if fields is not None:
+            keys = keys.intersection(fields)
+
+        return keys
+
+
+def _is_graph_node(o):
+    """ Test whether an object is serialized by :cls:JsonGraph: a JsonSerializableBase without a custom __json__() """
+    return isinstance(o, JsonSerializableBase) and _unbound(type(o).__json__) is _unbound(JsonSerializableBase.__json__)
+
+
+class JsonGraph(object):
+    """ Serializes graphs of related :cls:JsonSerializableBase objects, with a bounded depth, and safe from cycles
+
+        Normally, __json__() returns related objects, and the encoder serializes them recursively, without knowing the depth.
+        With bidirectional relationships (e.g. loaded backrefs, or relationships in `_json_include`),
+        this walks huge graphs, or loops until the recursion limit.
+
+        A graph serializes related objects itself, so it knows the depth of every one of them:
+
+        * Objects deeper than `max_depth` are replaced with references: :meth:JsonSerializableBase._json_ref
+        * `_json_depth` of a model limits the depth of its relationships further: `{'children': 1}`.
+          It can only lower the limit, so that a recursive relationship is always bounded.
+        * An object inside of itself (a cycle) is replaced with a reference
+        * With `deduplicate`, every object is serialized only once; later occurrences are replaced with references.
+          Objects given to :meth:serialize are always serialized in full, even if they were referenced before:
+          these are the items of the response.
+
+        Use one graph per response: objects are deduplicated per-request.
+        Encoders make one when `max_depth` or `deduplicate` is set: `JSONTOOLS_MAX_DEPTH`, `JSONTOOLS_DEDUPLICATE`.
+    """
+
+    def __init__(self, max_depth=None, deduplicate=False):
+        """
+        :param max_depth: The maximum depth of related objects. 0: references only. None: unlimited
+        :type max_depth: int|None
+        :param deduplicate: Serialize every object only once
+        :type deduplicate: bool
+        """
+        self.max_depth = max_depth
+        self.deduplicate = deduplicate
+
+        #: Serialized objects, with `deduplicate`: { id: object }
+        self.seen = {}
+        #: Objects being serialized: ids of the current path
+        self.path = set()
+
+    def serialize(self, o, excluded_keys=set(), fields=None):
+        """ Serialize an object and the objects related to it
+
+        The object itself is never replaced with a reference.
+
+        :type o: JsonSerializableBase
+        :param excluded_keys: Additional keys to exclude
+        :type excluded_keys: set
+        :param fields: Sparse fieldset, see :func:parse_fieldset
+        :type fields: dict|None
+        :rtype: dict
+        """
+        return self._object(o, self.max_depth, excluded_keys, fields, top=True)
+
+    def _object(self, o, depth, excluded_keys=set(), fields=None, top=False):
+        """ Serialize an object, or get a reference to it
+
+        :param depth: The remaining depth of related objects
+        :type depth: int|None
+        :param top: A top-level object: serialize it even if it was seen before
+        :type top: bool
+        :rtype: dict
+        """
+        oid = id(o)
+        if not top and (oid in self.path or (self.deduplicate and oid in self.seen)):
+            return o._json_ref()
+        if self.deduplicate:
+            self.seen[oid] = o  # keep the object, so that its id is not reused
+
+        cls = type(o)
+        ins = inspect(o)
+        relationships = _JsonSerializationPlan.get(ins.mapper).relationships
+        if cls._json_schema is not None:
+            keys = [key for key in cls._json_schema if key not in excluded_keys and (fields is None or key in fields)]
+        else:
+            keys = cls._json_keys(ins, excluded_keys, fields)
+
+        self.path.add(oid)
+        try:
+            ret = {}
+            for key in keys:
+                value = getattr(o, key)
+                nested = fields[key] if fields is not None else None
+                if key in relationships:
+                    limit = cls._json_depth.get(key)
+                    if limit is not None and (depth is None or limit < depth):
+                        ret[key] = self._related(value, limit, nested)
+                    else:
+                        ret[key] = self._related(value, depth, nested)
+                else:
+                    ret[key] = value if nested is None else _json_nested(value, nested)
+            return ret
+        finally:
+            self.path.discard(oid)
+
+    def _related(self, value, depth, fields):
+        """ Serialize the value of a relationship
+
+        :param depth: The remaining depth: objects are serialized when it's above 0
+        :type depth: int|None
+        """
+        if _is_graph_node(value):
+            if depth is not None and depth <= 0:
+                return value._json_ref()
+            return self._object(value, None if depth is None else depth - 1, fields=fields)
+        if isinstance(value, (list, tuple, set, frozenset)):
+            return [self._related(v, depth, fields) for v in value]
+        if isinstance(value, dict):  # attribute_mapped_collection()
+            return { k: self._related(v, depth, fields)  for k, v in value.items() }
+        return value if fields is None else _json_nested(value, fields)
+
+
+def json_load_options(model, fields=None, max_depth=None):
+    """ Get query options that eagerly load everything JsonSerializableBase.__json__() is going to serialize
+
+    Relationships from `_json_include` are lazy-loaded one by one when serialized.
+    These options load them up front, recursively: collections with `selectinload()`, and scalars with `joinedload()`,
+    so the whole result is fetched with a fixed number of queries: one, plus one for every collection.
+    Columns from `_json_exclude` are not loaded at all: `load_only()`.
+
+    With a sparse fieldset, only requested columns and relationships are loaded,
+    and relationships in the fieldset are loaded as well, even if they are not in `_json_include`.
+
+        >>> db.query(User).options(*json_load_options(User)).all()
+
+    :param model: The model class
+    :type model: type
+    :param fields: Sparse fieldset, see :func:parse_fieldset
+    :type fields: str|Iterable[str]|dict|None
+    :param max_depth: The maximum depth of nested relationships to load. None: unlimited.
+        Relationships that lead back to a model that is already being loaded are never followed.
+    :type max_depth: int|None
+    :rtype: list
+    """
+    return _json_load_options(inspect(model), parse_fieldset(fields), max_depth, ())
+
+
+def _json_load_options(mapper, fields, max_depth, path):
+    """ Get relative loader options for a mapper
+
+    :type mapper: sqlalchemy.orm.Mapper
+    :param fields: Fieldset
+    :type fields: dict|None
+    :param max_depth: Remaining depth
+    :type max_depth: int|None
+    :param path: Mappers being loaded, to detect cycles
+    :type path: tuple[sqlalchemy.orm.Mapper]
+    :rtype: list
+    """
+    plan = _JsonSerializationPlan.get(mapper)
+    cls = mapper.class_
+    options = []
+
+    # Relationships to serialize
+    relationships = plan.relationships & (plan.include if fields is None else plan.include.union(fields))
+    if fields is not None:
+        relationships = relationships.intersection(fields)
+    relationships = [mapper.relationships[key] for key in sorted(relationships - plan.exclude)]
+
+    # Columns, and foreign keys of relationships: otherwise they are loaded one by one
+    columns = plan.columns - plan.exclude
+    if fields is not None:
+        columns = columns.intersection(fields)
+    columns = columns.union(mapper.get_property_by_column(c).key for c in mapper.primary_key)
+    columns = columns.union(mapper.get_property_by_column(c).key for r in relationships for c in r.local_columns)
+    if columns != plan.columns:
+        options.append(load_only(*[getattr(cls, key) for key in sorted(columns)]))
+
+    # Eager loading
+    if max_depth is not None and max_depth <= 0:
+        return options
+    path += (mapper,)
+    for relationship in relationships:
+        if relationship.lazy == 'dynamic' or relationship.mapper in path:
+            continue
+        loader = selectinload if relationship.uselist else joinedload
+        nested = _json_load_options(relationship.mapper,
+                                    fields[relationship.key] if fields is not None else None,
+                                    max_depth - 1 if max_depth is not None else None,
+                                    path)
+        attr = getattr(cls, relationship.key)
+        options.append(loader(attr).options(*nested) if nested else loader(attr))
+    return options
 
 #endregion
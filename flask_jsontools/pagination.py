@@ -0,0 +1,214 @@
+from __future__ import absolute_import
+
+import json
+import uuid
+import base64
+import binascii
+import datetime
+from decimal import Decimal
+
+from flask import request
+from werkzeug.exceptions import BadRequest
+from future.utils import string_types
+
+try:
+    from urllib.parse import urlencode
+except ImportError:  # Python 2
+    from urllib import urlencode
+
+try:
+    from datetime import timezone
+except ImportError:  # Python 2
+    timezone = None
+
+try:
+    from sqlalchemy import and_, or_
+except ImportError as e:  # keyset pagination requires SQLAlchemy
+    _sqlalchemy_import_error = e  # `e` is deleted at the end of the `except` block
+
+    def and_(*args, **kwargs):
+        raise _sqlalchemy_import_error
+    or_ = and_
+
+
+#region Cursors
+
+def encode_cursor(values):
+    """ Encode sort key values into an opaque cursor
+
+    Dates, times, decimals and UUIDs are tagged with their types, so that :func:decode_cursor restores them,
+    and the database compares them as such, not as strings. Other objects are encoded as strings.
+
+    :type values: list
+    :rtype: str
+    """
+    data = json.dumps(values, default=_encode_cursor_value, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def decode_cursor(cursor, length=None):
+    """ Decode a cursor made with :func:encode_cursor
+
+    :type cursor: str
+    :param length: The expected number of values
+    :type length: int|None
+    :rtype: list
+    :raises BadRequest: invalid cursor
+    """
+    try:
+        data = base64.urlsafe_b64decode(cursor.encode('ascii') + b'=' * (-len(cursor) % 4))
+        values = json.loads(data.decode('utf-8'), object_hook=_decode_cursor_value)
+    except (ValueError, TypeError, KeyError, UnicodeError, binascii.Error):
+        raise BadRequest('Invalid cursor')
+    if not isinstance(values, list) or (length is not None and len(values) != length):
+        raise BadRequest('Invalid cursor')
+    return values
+
+
+def _encode_cursor_value(o):
+    """ Encode a sort key value that is not JSON: `{type: value}` """
+    if isinstance(o, datetime.datetime):
+        parts = [o.year, o.month, o.day, o.hour, o.minute, o.second, o.microsecond]
+        if o.utcoffset() is not None:
+            parts.append(int(o.utcoffset().total_seconds()))
+        return {'datetime': parts}
+    if isinstance(o, datetime.date):
+        return {'date': [o.year, o.month, o.day]}
+    if isinstance(o, datetime.time):
+        return {'time': [o.hour, o.minute, o.second, o.microsecond]}
+    if isinstance(o, Decimal):
+        return {'decimal': str(o)}
+    if isinstance(o, uuid.UUID):
+        return {'uuid': o.hex}
+    return str(o)
+
+
+def _decode_cursor_value(o):
+    """ Decode a value made with :func:_encode_cursor_value
+    :type o: dict
+    :raises ValueError, TypeError, KeyError: invalid value
+    """
+    (tag, value), = o.items()
+    if tag == 'datetime':
+        if len(value) == 7:
+            return datetime.datetime(*value)
+        offset = datetime.timedelta(seconds=value[7])
+        if timezone is None:  # Python 2: naive UTC
+            return datetime.datetime(*value[:7]) - offset
+        return datetime.datetime(*value[:7], tzinfo=timezone(offset))
+    if tag == 'date':
+        return datetime.date(*value)
+    if tag == 'time':
+        return datetime.time(*value)
+    if tag == 'decimal':
+        return Decimal(value)
+    if tag == 'uuid':
+        return uuid.UUID(value)
+    raise ValueError('Unknown cursor value type: {}'.format(tag))
+
+#endregion
+
+
+#region Keyset pagination
+
+def parse_ordering(ordering):
+    """ Parse sort keys
+
+    :param ordering: Attribute names; '-name' for descending order
+    :type ordering: str|Iterable[str]
+    :return: [ (name, descending) ]
+    :rtype: list[tuple(str, bool)]
+    """
+    if isinstance(ordering, string_types):
+        ordering = (ordering,)
+    return [(name[1:], True) if name.startswith('-') else (name, False) for name in ordering]
+
+
+def keyset_page(query, ordering, cursor=None, limit=100):
+    """ Get a page of results with keyset (cursor) pagination
+
+    Instead of `OFFSET`, which gets slower with every page, the next page starts right after the last row
+    of the previous one: `WHERE (a, b) > (:a, :b) ORDER BY a, b LIMIT :limit`.
+    This is only correct when sort keys are unique together, and never NULL: make the primary key the last one.
+
+    :param query: The query: its own ordering is replaced
+    :type query: sqlalchemy.orm.Query
+    :param ordering: Sort keys: attribute names of the queried model; '-name' for descending order
+    :type ordering: str|Iterable[str]
+    :param cursor: The cursor of the page: None for the first one
+    :type cursor: str|None
+    :param limit: Page size
+    :type limit: int
+    :return: (items, cursor of the next page, or None if it's the last one)
+    :rtype: tuple(list, str|None)
+    :raises BadRequest: invalid cursor
+    """
+    keys = parse_ordering(ordering)
+    entity = query.column_descriptions[0]['entity']
+    columns = [getattr(entity, name) for name, descending in keys]
+
+    query = query.order_by(None).order_by(*[c.desc() if descending else c.asc()
+                                            for c, (name, descending) in zip(columns, keys)])
+    if cursor is not None:
+        values = decode_cursor(cursor, len(keys))
+        query = query.filter(_keyset_condition(columns, [descending for name, descending in keys], values))
+
+    items = query.limit(limit + 1).all()
+    if len(items) <= limit:
+        return items, None
+    items = items[:limit]
+    return items, encode_cursor([getattr(items[-1], name) for name, descending in keys])
+
+
+def iter_keyset(query, ordering, cursor=None, chunk_size=1000):
+    """ Iterate over all results, page by page, with keyset pagination
+
+    Use it to walk a whole table: every page is a quick indexed query, unlike `OFFSET`.
+
+    :param query: The query
+    :type query: sqlalchemy.orm.Query
+    :param ordering: Sort keys, see :func:keyset_page
+    :type ordering: str|Iterable[str]
+    :param cursor: Start after this cursor
+    :type cursor: str|None
+    :param chunk_size: Page size
+    :type chunk_size: int
+    :rtype: Iterator
+    """
+    while True:
+        items, cursor = keyset_page(query, ordering, cursor, chunk_size)
+        for item in items:
+            yield item
+        if cursor is None:
+            break
+
+
+def _keyset_condition(columns, descending, values):
+    """ Condition for rows after the given sort key values
+
+    `(a > :a) OR (a = :a AND b > :b) OR ...`: works with mixed directions, and without row values support.
+
+    :type columns: list
+    :type descending: list[bool]
+    :type values: list
+    """
+    clauses = []
+    for i, (column, desc, value) in enumerate(zip(columns, descending, values)):
+        equal = [c == v for c, v in zip(columns[:i], values[:i])]
+        clauses.append(and_(*equal + [column < value if desc else column > value]))
+    return or_(*clauses)
+
+
+def page_url(cursor, cursor_arg='cursor'):
+    """ Get the URL of the current request with another cursor
+
+    :type cursor: str
+    :param cursor_arg: Query argument name
+    :type cursor_arg: str
+    :rtype: str
+    """
+    args = [(k, v) for k, v in request.args.items(multi=True) if k != cursor_arg]
+    args.append((cursor_arg, cursor))
+    return '{}?{}'.format(request.base_url, urlencode(args))
+
+#endregion
@@ -0,0 +1,257 @@
+from __future__ import absolute_import
+
+import json
+import codecs
+
+from flask import current_app, request
+from werkzeug.exceptions import BadRequest, RequestEntityTooLarge, UnsupportedMediaType
+
+from .encoding import app_json_backend
+
+
+#: Request environ key for the body size limit of the current view
+_MAX_BODY_SIZE_KEY = 'flask_jsontools.max_body_size'
+
+#: Request environ key for the decoded body
+_JSON_BODY_KEY = 'flask_jsontools.json_body'
+
+#: Marker for "not set"
+_missing = object()
+
+
+def max_body_size():
+    """ Get the request body size limit for the current view
+
+    Set with `@jsonapi(max_body_size=...)`, or with the `JSONTOOLS_MAX_BODY_SIZE` config key.
+
+    :return: The limit, bytes, or None for no limit
+    :rtype: int|None
+    """
+    limit = request.environ.get(_MAX_BODY_SIZE_KEY, _missing)
+    if limit is _missing:
+        limit = current_app.config.get('JSONTOOLS_MAX_BODY_SIZE', None)
+    return limit
+
+
+def check_body_size(limit=None):
+    """ Reject a request with a body over the limit early, before it's read
+
+    Only `Content-Length` is checked here; bodies without it are checked as they are read.
+
+    :param limit: The limit, bytes. Default: :func:max_body_size
+    :type limit: int|None
+    :raises RequestEntityTooLarge: the body is too large
+    """
+    limit = max_body_size() if limit is None else limit
+    if limit is not None and request.content_length is not None and request.content_length > limit:
+        raise RequestEntityTooLarge('Request body is over {} bytes'.format(limit))
+
+
+def is_json_request():
+    """ Test whether the request body is JSON or NDJSON
+    :rtype: bool
+    """
+    mimetype = request.mimetype
+    return mimetype in ('application/json', 'application/x-ndjson') or \
+           (mimetype.startswith('application/') and mimetype.endswith('+json'))
+
+
+def get_json_body(force=False, max_size=None):
+    """ Decode the JSON request body
+
+    Unlike `request.get_json()`, this uses the fast JSON backend (see `JSONTOOLS_JSON_BACKEND`),
+    and enforces the body size limit. The result is cached for the request.
+
+    :param force: Decode the body even if the Content-Type is not JSON
+    :type force: bool
+    :param max_size: Body size limit, bytes. Default: :func:max_body_size
+    :type max_size: int|None
+    :return: The decoded body, or None if the request is not JSON
+    :raises RequestEntityTooLarge: the body is too large
+    :raises BadRequest: invalid JSON
+    """
+    try:
+        return request.environ[_JSON_BODY_KEY]
+    except KeyError:
+        pass
+
+    if not force and not is_json_request():
+        return None
+
+    data = b''.join(_read_body(max_size))
+    try:
+        if not data:
+            body = None
+        elif request.mimetype == 'application/x-ndjson':
+            body = [_loads(line) for line in data.splitlines() if line.strip()]
+        else:
+            body = _loads(data)
+    except ValueError as e:
+        raise BadRequest('Invalid JSON: {}'.format(e))
+    request.environ[_JSON_BODY_KEY] = body
+    return body
+
+
+def iter_json_body(max_size=None, chunk_size=65536):
+    """ Decode a large JSON array from the request body incrementally, item by item
+
+    Items are yielded as soon as they arrive, so the whole body is never held in memory.
+    A top-level JSON array and NDJSON (`application/x-ndjson`, one item per line) are supported.
+
+        @app.route('/import', methods=['POST'])
+        @jsonapi(max_body_size=1 << 30)
+        def bulk_import():
+            for item in iter_json_body():
+                db.add(Item(**item))
+
+    :param max_size: Body size limit, bytes. Default: :func:max_body_size
+    :type max_size: int|None
+    :param chunk_size: The number of bytes to read at once
+    :type chunk_size: int
+    :rtype: Iterator
+    :raises RequestEntityTooLarge: the body is too large
+    :raises UnsupportedMediaType: not a JSON request
+    :raises BadRequest: invalid JSON, or not an array
+    """
+    if not is_json_request():
+        raise UnsupportedMediaType('Expected a JSON request body')
+    chunks = _read_body(max_size, chunk_size)
+    if request.mimetype == 'application/x-ndjson':
+        return _iter_ndjson(chunks)
+    return _iter_json_array(chunks)
+
+
+def _loads(data):
+    """ Decode JSON with the app's backend
+    :raises ValueError: invalid JSON
+    """
+    try:
+        return app_json_backend().loads(data)
+    except ValueError:
+        raise
+    except Exception as e:  # backends raise their own errors, e.g. ujson.JSONDecodeError
+        raise ValueError(str(e))
+
+
+def _read_body(max_size=None, chunk_size=65536):
+    """ Read the request body in chunks, enforcing the size limit
+
+    :rtype: Iterator[bytes]
+    :raises RequestEntityTooLarge: the body is too large
+    """
+    limit = max_body_size() if max_size is None else max_size
+    check_body_size(limit)
+
+    stream = request.stream
+    size = 0
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        size += len(chunk)
+        if limit is not None and size > limit:
+            raise RequestEntityTooLarge('Request body is over {} bytes'.format(limit))
+        yield chunk
+
+
+def _iter_ndjson(chunks):
+    """ Decode NDJSON chunks, line by line
+    :type chunks: Iterable[bytes]
+    :rtype: Iterator
+    """
+    tail = b''
+    for chunk in chunks:
+        lines = (tail + chunk).split(b'\n')
+        tail = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield _decode_item(line)
+    if tail.strip():
+        yield _decode_item(tail)
+
+
+def _decode_item(line):
+    try:
+        return _loads(line)
+    except ValueError as e:
+        raise BadRequest('Invalid JSON: {}'.format(e))
+
+
+def _iter_json_array(chunks):
+    """ Decode a JSON array from chunks, item by item
+
+    The buffer only holds the unread part of the current chunk, and the item being decoded.
+
+    :type chunks: Iterable[bytes]
+    :rtype: Iterator
+    :raises BadRequest: invalid JSON, or not an array
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    chunks = iter(chunks)
+
+    class state:
+        buf = ''
+        pos = 0
+        eof = False
+
+    def read(size=1):
+        """ Append at least `size` characters to the buffer, unless the body ends """
+        text = []
+        for chunk in chunks:
+            text.append(utf8.decode(chunk))
+            size -= len(text[-1])
+            if size <= 0:
+                break
+        else:
+            state.eof = True
+        state.buf = state.buf[state.pos:] + ''.join(text)
+        state.pos = 0
+
+    def next_char():
+        """ Skip whitespace, and get the next character, or None at the end of the body """
+        while True:
+            buf, pos = state.buf, state.pos
+            while pos < len(buf) and buf[pos] in ' \t\r\n':
+                pos += 1
+            state.pos = pos
+            if pos < len(buf):
+                return buf[pos]
+            if state.eof:
+                return None
+            read()
+
+    if next_char() != '[':
+        raise BadRequest('Invalid JSON: expected an array')
+    state.pos += 1
+
+    first = True
+    while True:
+        c = next_char()
+        if c == ']':
+            state.pos += 1
+            if next_char() is not None:
+                raise BadRequest('Invalid JSON: extra data after the array')
+            return
+        if not first:
+            if c != ',':
+                raise BadRequest('Invalid JSON: expected "," or "]"')
+            state.pos += 1
+            next_char()
+        first = False
+
+        while True:
+            try:
+                item, end = decoder.raw_decode(state.buf, state.pos)
+            except ValueError:
+                item, end = None, None
+            # Incomplete, or ends with the buffer, so may be incomplete (e.g. a number): read more and retry.
+            # Read as much as there is in the buffer, so a huge item is re-scanned only a logarithmic number of times
+            if (end is None or end == len(state.buf)) and not state.eof:
+                read(len(state.buf) - state.pos)
+                continue
+            if end is None:
+                raise BadRequest('Invalid JSON: invalid array item')
+            break
+        state.pos = end
+        yield item
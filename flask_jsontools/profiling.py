@@ -0,0 +1,135 @@
+from __future__ import absolute_import
+from builtins import object
+
+from collections import Counter
+
+from flask import current_app, g, has_app_context
+from flask.signals import Namespace
+
+
+_signals = Namespace()
+
+#: Sent when a @jsonapi request is profiled. Receivers get: sender=app, profile=RequestProfile
+json_request_profiled = _signals.signal('json-request-profiled')
+
+
+class RequestProfile(object):
+    """ Profile of a @jsonapi request
+
+        Enabled with the `JSONTOOLS_PROFILE` config key. When disabled, nothing is measured.
+        `JSONTOOLS_SERVER_TIMING` adds the `Server-Timing` header with the measured phases.
+
+        The profile is sent with the :data:json_request_profiled signal, and is available as `g.jsontools_profile`
+        during the request.
+
+        Encode time and body size are not measured for streamed responses:
+        they are encoded after the view has returned.
+    """
+
+    def __init__(self):
+        #: View function time, seconds
+        self.view_time = 0.0
+        #: JsonResponse.preprocess_response_data() time, seconds
+        self.preprocess_time = 0.0
+        #: Encoding time, including __json__() calls, seconds
+        self.encode_time = 0.0
+        #: Encoded body size, bytes. None for streamed responses
+        self.body_size = None
+        #: Number of __json__() calls, by class name
+        self.json_calls = Counter()
+        #: Whether the response is streamed
+        self.streamed = False
+
+    @classmethod
+    def start(cls):
+        """ Start profiling the current request, if enabled
+
+        Nested @jsonapi calls add to the profile of the outer one.
+
+        :return: The new profile, or None if profiling is disabled, or already started
+        :rtype: RequestProfile|None
+        """
+        if not current_app.config.get('JSONTOOLS_PROFILE', False) or g.get('jsontools_profile') is not None:
+            return None
+        profile = g.jsontools_profile = cls()
+        return profile
+
+    @staticmethod
+    def current():
+        """ Get the profile of the current request
+        :rtype: RequestProfile|None
+        """
+        return g.get('jsontools_profile') if has_app_context() else None
+
+    def finish(self, response):
+        """ Finish profiling: add `Server-Timing`, send the signal
+
+        :type response: flask.Response
+        :rtype: flask.Response
+        """
+        g.jsontools_profile = None
+
+        self.streamed = response.is_streamed
+        if not self.streamed and self.body_size is None:
+            self.body_size = response.content_length
+
+        if current_app.config.get('JSONTOOLS_SERVER_TIMING', False):
+            response.headers['Server-Timing'] = self.server_timing()
+        json_request_profiled.send(current_app._get_current_object(), profile=self)
+        return response
+
+    def instrument_encoder(self, encoder):
+        """ Wrap a JSON encoder to count __json__() calls
+
+        :type encoder: json.JSONEncoder
+        :rtype: _CountingJSONEncoder
+        """
+        return _CountingJSONEncoder(encoder, self.json_calls)
+
+    def server_timing(self):
+        """ Format the `Server-Timing` header value
+        :rtype: str
+        """
+        return ', '.join('{};dur={:.3f}'.format(name, seconds * 1000) for name, seconds in (
+            ('view', self.view_time),
+            ('preprocess', self.preprocess_time),
+            ('encode', self.encode_time),
+        ))
+
+    def to_dict(self):
+        """ Get the profile as a dict
+        :rtype: dict
+        """
+        return {
+            'view_time': self.view_time,
+            'preprocess_time': self.preprocess_time,
+            'encode_time': self.encode_time,
+            'body_size': self.body_size,
+            'json_calls': dict(self.json_calls),
+            'streamed': self.streamed,
+        }
+
+    def __repr__(self):
+        return '<{cls}: {profile}>'.format(cls=self.__class__.__name__, profile=self.to_dict())
+
+
+class _CountingJSONEncoder(object):
+    """ JSON encoder proxy that counts __json__() calls by class """
+
+    def __init__(self, encoder, counter):
+        self._encoder = encoder
+        self._counter = counter
+
+    def default(self, o):
+        if hasattr(o, '__json__'):
+            self._counter[type(o).__name__] += 1
+        return self._encoder.default(o)
+
+    def default_many(self, objects):
+        default_many = getattr(self._encoder, 'default_many', None)
+        if default_many is None:
+            return objects
+        ret = default_many(objects)
+        if ret is not objects:
+            self._counter.update(type(o).__name__ for o in objects)
+        return ret
@@ -1,12 +1,88 @@
 from __future__ import absolute_import
+from builtins import object
 
-from flask import current_app, request, Response, json
+from itertools import islice
+from functools import partial
+from timeit import default_timer
+
+from flask import request, Response, has_request_context, stream_with_context
+
+from .encoding import app_json_backend, app_json_encoder, RawJSONSplicer
+from .formatting import parse_fieldset
+from .compression import get_codec
+from .profiling import RequestProfile
+from .extension import app_settings
+from .aio import is_async_iterable, iter_async
+
+try:
+    from sqlalchemy.orm import Query
+except ImportError:
+    Query = ()  # matches nothing in isinstance()
+
+try:
+    from collections.abc import Iterator
+except ImportError:  # Python 2
+    from collections import Iterator
+
+try:
+    from hashlib import blake2b
+    _etag_hash = partial(blake2b, digest_size=16)
+except ImportError:  # Python 2
+    from hashlib import md5 as _etag_hash
+
+
+class JsonStream(object):
+    """ Marker for a collection that should be streamed to the client
+
+        :cls:JsonResponse encodes such collections incrementally, item by item,
+        so the whole encoded response is never held in memory.
+
+        The output is a JSON array, or NDJSON (one item per line) when the client asks for
+        `application/x-ndjson` with the `Accept` header. NDJSON lines are flushed one by one.
+    """
+
+    def __init__(self, iterable, ndjson=None, chunk_size=100):
+        """ Wrap an iterable for streaming
+        :param iterable: The collection to stream: a generator, any other iterator, an SqlAlchemy `Query`,
+            an async generator
+        :type iterable: Iterable|AsyncIterable
+        :param ndjson: Force NDJSON (True) or a JSON array (False). Default: negotiate with the `Accept` header
+        :type ndjson: bool|None
+        :param chunk_size: The number of items to encode into a single chunk of output
+        :type chunk_size: int
+        """
+        self.iterable = iter_async(iterable) if is_async_iterable(iterable) else iterable
+        self.ndjson = ndjson
+        self.chunk_size = chunk_size
+
+    def __iter__(self):
+        return iter(self.iterable)
+
+    @classmethod
+    def is_streamable(cls, rv):
+        """ Test whether the view return value should be streamed
+
+        :type rv: *
+        :rtype: bool
+        """
+        return isinstance(rv, (cls, Iterator, Query)) or is_async_iterable(rv)
 
 
 class JsonResponse(Response):
     """ Response from a JSON API view """
 
-    def __init__(self, response, status=None, headers=None, **kwargs):
+    default_mimetype = 'application/json'
+
+    #: App settings, or None outside of application context
+    _settings = None
+
+    #: The number of RawJSON fragments spliced into the body
+    _spliced = 0
+
+    #: Lazy responses, until encoded: arguments of encode_body()
+    _pending = None
+
+    def __init__(self, response, status=None, headers=None, etag=None, last_modified=None, fields=None, keep_data=None, lazy=None, **kwargs):
         """ Init a JSON response
         :param response: Response data
         :type response: *
@@ -14,21 +90,192 @@ class JsonResponse(Response):
         :type status: int|None
         :param headers: Additional headers
         :type headers: dict|None
+        :param etag: ETag: a version string, True to hash the encoded body, False to disable.
+            Default: the `JSONTOOLS_ETAG` config key (False)
+        :type etag: str|bool|None
+        :param last_modified: Last modification time of the data
+        :type last_modified: datetime.datetime|None
+        :param fields: Sparse fieldset: fields of objects with __json__() to include, e.g. 'id,name,author.name'.
+            Default: the query argument named by the `JSONTOOLS_FIELDS_ARG` config key, if set
+        :type fields: str|Iterable[str]|dict|None
+        :param keep_data: Keep the response data object after it's encoded, for get_json().
+            When False, the data is released as soon as the body is ready, and get_json() decodes the body instead.
+            Streamed data is always kept. Default: the `JSONTOOLS_KEEP_RESPONSE_DATA` config key (True)
+        :type keep_data: bool|None
+        :param lazy: Encode the body when the response is served, not now; see :meth:encode_body.
+            Until then, the data can be changed. Default: the `JSONTOOLS_LAZY_ENCODING` config key (False)
+        :type lazy: bool|None
         """
+        profile = RequestProfile.current()
+
         # Store response
-        self._response_data = self.preprocess_response_data(response)
+        if profile is None:
+            self._response_data = self.preprocess_response_data(response)
+        else:
+            t = default_timer()
+            self._response_data = self.preprocess_response_data(response)
+            profile.preprocess_time += default_timer() - t
 
-        # PrettyPrint?
-        try:
-            indent = 2 if current_app.config['JSONIFY_PRETTYPRINT_REGULAR'] and not request.is_xhr else None
-        except RuntimeError:  # "RuntimeError: working outside of application context"
+        # PrettyPrint? Sort keys? ETag?
+        self._settings = settings = app_settings()
+        if settings is not None:
+            indent = 2 if settings.pretty is not None and has_request_context() and settings.pretty() else None
+            sort_keys = settings.sort_keys
+            if etag is None:
+                etag = settings.etag
+            if fields is None:
+                fields = _requested_fields(settings.fields_arg)
+            if keep_data is None:
+                keep_data = settings.keep_data
+            if lazy is None:
+                lazy = settings.lazy
+        else:  # outside of application context
             indent = None
+            sort_keys = True
+            if keep_data is None:
+                keep_data = True
+
+        #: Sparse fieldset
+        self.fields = parse_fieldset(fields)
+
+        # Streaming? NDJSON?
+        mimetype = 'application/json'
+        vary_accept = False
+        if isinstance(self._response_data, JsonStream):
+            ndjson = self._response_data.ndjson
+            if ndjson is None:
+                ndjson = _client_accepts_ndjson()
+                vary_accept = True
+            if ndjson:
+                mimetype = 'application/x-ndjson'
+            body = self.iter_encode_response_data(self._response_data, ndjson=ndjson, sort_keys=sort_keys)
+            if has_request_context():
+                body = stream_with_context(body)
+        else:
+            vary_accept = isinstance(self._response_data, (list, tuple))
+            ndjson = vary_accept and _client_accepts_ndjson()
+            if ndjson:
+                mimetype = 'application/x-ndjson'
+            if lazy:
+                # Encoded when served
+                body = None
+                self._pending = (indent, sort_keys, ndjson, keep_data, etag, last_modified)
+            elif profile is None:
+                body = self._encode_body(indent, sort_keys, ndjson, keep_data)
+            else:
+                t = default_timer()
+                body = self._encode_body(indent, sort_keys, ndjson, keep_data)
+                profile.encode_time += default_timer() - t
+                profile.body_size = len(body)
 
         # Init super
         super(JsonResponse, self).__init__(
-            json.dumps(self._response_data, indent=indent),
-            headers=headers, status=status, mimetype='application/json',
+            body,
+            headers=headers, status=status, mimetype=mimetype,
             direct_passthrough=True, **kwargs)
+        if vary_accept:
+            self.vary.add('Accept')
+
+        if self._pending is None:
+            self._finalize(etag, last_modified)
+
+    def _encode_body(self, indent, sort_keys, ndjson, keep_data):
+        """ Encode the response data, and release it unless it's kept
+        :rtype: bytes
+        """
+        body = self.encode_response_data(self._response_data, indent=indent, sort_keys=sort_keys, ndjson=ndjson)
+        if not keep_data or self._spliced:
+            # Not kept, or has RawJSON fragments: get_json() decodes the body on first use
+            self._response_data = _encoded
+        return body
+
+    def _finalize(self, etag, last_modified):
+        """ Make the encoded response conditional, and compress it """
+        # Conditional response
+        if etag is True and 'ETag' in self.headers:  # a lazy response got a version with make_conditional_json()
+            etag = None
+        if (etag or last_modified) and self.status_code == 200:
+            self.make_conditional_json(etag, last_modified)
+
+        # Compression
+        if self.status_code == 200 and self._settings is not None:
+            compression = self._settings.compression
+            if compression is not None:
+                self.vary.add('Accept-Encoding')
+                encoding = compression.negotiate()
+                if encoding:
+                    self.compress(encoding, level=compression.level, min_size=compression.min_size)
+
+    #region Lazy encoding
+
+    @property
+    def encoded(self):
+        """ Whether the body is encoded: always, unless the response is lazy and not served yet
+        :rtype: bool
+        """
+        return self._pending is None
+
+    def encode_body(self):
+        """ Encode the body of a lazy response now
+
+        Lazy responses are encoded when they're served: by the WSGI server, or when the body is read
+        (get_data(), iter_encoded()). Views and `after_request` handlers that replace the response,
+        or only change its headers, never pay for encoding.
+        `ETag`, compression and `Content-Length` are applied here, with the status the response has now.
+
+        Does nothing when the body is already encoded.
+
+        :rtype: JsonResponse
+        """
+        if self._pending is not None:
+            (indent, sort_keys, ndjson, keep_data, etag, last_modified), self._pending = self._pending, None
+            if self.status_code in (204, 304):  # no body
+                return self
+            if ndjson and not isinstance(self._response_data, (list, tuple)):  # replaced with set_json()
+                ndjson = False
+                self.mimetype = 'application/json'
+            self.set_data(self._encode_body(indent, sort_keys, ndjson, keep_data))
+            self._finalize(etag, last_modified)
+        return self
+
+    def set_json(self, data):
+        """ Replace the response data of a lazy response, before it's encoded
+
+        :param data: Response data (preprocessed)
+        :raises RuntimeError: the body is already encoded
+        """
+        if self._pending is None:
+            raise RuntimeError('The response body is already encoded')
+        self._response_data = data
+
+    def __setitem__(self, item, value):
+        """ Proxy method to set items of the underlying object, before it's encoded """
+        if self._pending is None:
+            raise RuntimeError('The response body is already encoded')
+        self._response_data[item] = value
+
+    def get_wsgi_response(self, environ):
+        self.encode_body()
+        return super(JsonResponse, self).get_wsgi_response(environ)
+
+    def get_data(self, as_text=False):
+        self.encode_body()
+        return super(JsonResponse, self).get_data(as_text)
+
+    def iter_encoded(self):
+        self.encode_body()
+        return super(JsonResponse, self).iter_encoded()
+
+    def calculate_content_length(self):
+        if self._pending is not None:  # unknown until encoded
+            return None
+        return super(JsonResponse, self).calculate_content_length()
+
+    def freeze(self, *args, **kwargs):
+        self.encode_body()
+        return super(JsonResponse, self).freeze(*args, **kwargs)
+
+    #endregion
 
     def preprocess_response_data(self, response):
         """ Preprocess the response data.
@@ -41,13 +288,204 @@ class JsonResponse(Response):
         """
         return response
 
+    def encode_response_data(self, data, indent=None, sort_keys=False, ndjson=False):
+        """ Encode the preprocessed response data to JSON
+
+        Uses the backend configured with `JSONTOOLS_JSON_BACKEND`,
+        and the app's `json_encoder` for objects the backend does not know.
+        Lists are prepared in bulk with `json_encoder.default_many()`, when available.
+        :cls:RawJSON fragments are spliced in verbatim.
+
+        :param data: Preprocessed response data
+        :type data: *
+        :param ndjson: Encode a list as NDJSON: one item per line
+        :type ndjson: bool
+        :rtype: bytes
+        """
+        encoder = _json_encoder(self.fields, self._settings)
+        if isinstance(data, (list, tuple)) and hasattr(encoder, 'default_many'):
+            data = encoder.default_many(list(data))
+        backend, splicer = _json_backend(self._settings), RawJSONSplicer(encoder.default)
+        if ndjson:
+            body = b''.join(_ndjson_line(splicer.dumps(backend, item, sort_keys=sort_keys)) for item in data)
+        else:
+            body = splicer.dumps(backend, data, indent=indent, sort_keys=sort_keys)
+        self._spliced = splicer.spliced
+        return body
+
+    def iter_encode_response_data(self, stream, ndjson=False, sort_keys=False):
+        """ Encode a :cls:JsonStream incrementally
+
+        Items are encoded one by one and grouped into chunks of `stream.chunk_size` items.
+        Every chunk is prepared in bulk with `json_encoder.default_many()`, when available.
+        NDJSON lines are yielded one by one, so that every record is flushed to the client as soon as it's ready.
+
+        :param stream: The collection to encode
+        :type stream: JsonStream
+        :param ndjson: Produce NDJSON instead of a JSON array
+        :type ndjson: bool
+        :rtype: Iterator[bytes]
+        """
+        backend, encoder = _json_backend(self._settings), _json_encoder(self.fields, self._settings)
+        dumps = RawJSONSplicer(encoder.default).dumps
+        chunks = _chunks(stream, stream.chunk_size)
+        if hasattr(encoder, 'default_many'):
+            chunks = (encoder.default_many(chunk) for chunk in chunks)
+
+        if ndjson:
+            for chunk in chunks:
+                for item in chunk:
+                    yield _ndjson_line(dumps(backend, item, sort_keys=sort_keys))
+        else:
+            yield b'['
+            separator = b''
+            for chunk in chunks:
+                yield separator + b','.join(dumps(backend, item, sort_keys=sort_keys) for item in chunk)
+                separator = b','
+            yield b']'
+
+    def make_conditional_json(self, etag=None, last_modified=None):
+        """ Set `ETag` and `Last-Modified`, and answer conditional requests
+
+        When the client's copy is still valid (`If-None-Match`, `If-Modified-Since`),
+        the response becomes `304 Not Modified` with no body.
+        Lazy responses are made conditional when they're encoded, see :meth:encode_body.
+
+        :param etag: ETag: a version string, or True to hash the encoded body.
+            Streamed responses are never hashed.
+        :type etag: str|bool|None
+        :param last_modified: Last modification time of the data
+        :type last_modified: datetime.datetime|None
+        :rtype: JsonResponse
+        """
+        if self._pending is not None:
+            indent, sort_keys, ndjson, keep_data, pending_etag, pending_modified = self._pending
+            self._pending = (indent, sort_keys, ndjson, keep_data, etag or pending_etag, last_modified or pending_modified)
+            return self
+        if etag is True:
+            etag = None if self.is_streamed else self.calculate_etag()
+        if etag:
+            self.set_etag(etag)
+        if last_modified:
+            self.last_modified = last_modified
+        if has_request_context():
+            self.make_conditional(request)
+        return self
+
+    def calculate_etag(self):
+        """ Calculate an ETag: a fast hash of the encoded body
+        :rtype: str
+        """
+        return _etag_hash(self.get_data()).hexdigest()
+
+    def compress(self, encoding, level=None, min_size=0):
+        """ Compress the body, and set `Content-Encoding`
+
+        Streamed responses are compressed chunk by chunk.
+        A strong ETag becomes weak, because it describes the uncompressed body.
+
+        :param encoding: Content-Encoding: 'gzip', 'br', 'zstd'
+        :type encoding: str
+        :param level: Compression level. None: the codec default
+        :type level: int|None
+        :param min_size: Do not compress bodies smaller than this
+        :type min_size: int
+        :return: Whether the body was compressed
+        :rtype: bool
+        """
+        codec = get_codec(encoding)
+        if self.is_streamed:
+            self.response = codec.iter_compress(self.response, level)
+        else:
+            data = self.get_data()
+            if len(data) < min_size:
+                return False
+            self.set_data(codec.compress(data, level))
+
+        self.headers['Content-Encoding'] = encoding
+        etag, weak = self.get_etag()
+        if etag and not weak:
+            self.set_etag(etag, weak=True)
+        return True
+
+    @classmethod
+    def from_encoded(cls, body, status=None, headers=None, **kwargs):
+        """ Make a response from an already encoded body, e.g. a cached one
+
+        The body is sent as is; get_json() decodes it on first use.
+        An empty body is decoded as None; an `application/x-ndjson` body as a list.
+
+        The body can be an iterable of chunks, e.g. a streamed response: :meth:iter_json decodes NDJSON lazily.
+
+        :param body: Encoded JSON
+        :type body: bytes|Iterable[bytes]
+        :param status: Status code
+        :type status: int|None
+        :param headers: Headers
+        :type headers: dict|list|werkzeug.datastructures.Headers|None
+        :rtype: JsonResponse
+        """
+        self = cls.__new__(cls)
+        self._response_data = _encoded
+        self.fields = None
+        Response.__init__(self, body, status=status, headers=headers,
+                          direct_passthrough=isinstance(body, bytes), **kwargs)
+        return self
+
     def get_json(self):
-        """ Get the response data object (preprocessed) """
+        """ Get the response data object (preprocessed)
+
+        For streamed responses, this is the :cls:JsonStream itself.
+        When the data was not kept (see `keep_data`), or the response was made from an encoded body,
+        the body is decoded instead.
+        """
+        if self._response_data is _encoded:
+            data = self.get_data()
+            if 'Content-Encoding' in self.headers:
+                data = get_codec(self.headers['Content-Encoding']).decompress(data)
+            backend = app_json_backend()
+            if not data:
+                self._response_data = None
+            elif self.mimetype == 'application/x-ndjson':
+                self._response_data = [backend.loads(line) for line in data.splitlines() if line]
+            else:
+                self._response_data = backend.loads(data)
         return self._response_data
 
+    def iter_json(self):
+        """ Iterate over the items of an NDJSON response, decoding them lazily
+
+        A streamed body is read line by line, and never held in memory as a whole.
+        For other responses, this iterates over the data from get_json().
+
+        :rtype: Iterator
+        """
+        if self._response_data is not _encoded or self.mimetype != 'application/x-ndjson':
+            for item in self.get_json():
+                yield item
+            return
+
+        chunks = self.iter_encoded()
+        if 'Content-Encoding' in self.headers:
+            chunks = get_codec(self.headers['Content-Encoding']).iter_decompress(chunks)
+        backend = app_json_backend()
+        tail = b''
+        for chunk in chunks:
+            lines = (tail + chunk).split(b'\n')
+            tail = lines.pop()
+            for line in lines:
+                if line:
+                    yield backend.loads(line)
+        if tail.strip():
+            yield backend.loads(tail)
+
     def __getitem__(self, item):
         """ Proxy method to get items from the underlying object """
-        return self._response_data[item]
+        return self.get_json()[item]
+
+
+#: Marker for responses made from an encoded body, not decoded yet
+_encoded = object()
 
 
 def normalize_response_value(rv):
@@ -68,12 +506,95 @@ def make_json_response(rv):
     :type rv: tuple|*
     :rtype: JsonResponse
     """
-    # Tuple of (response, status, headers)
-    rv, status, headers = normalize_response_value(rv)
-
     # JsonResponse
     if isinstance(rv, JsonResponse):
         return rv
 
+    # Tuple of (response, status, headers)
+    if isinstance(rv, tuple):
+        rv, status, headers = normalize_response_value(rv)
+        if isinstance(rv, JsonResponse):
+            return rv
+    else:
+        status = headers = None
+
+    # Collections to stream
+    if JsonStream.is_streamable(rv) and not isinstance(rv, JsonStream):
+        rv = JsonStream(rv)
+
     # Data
     return JsonResponse(rv, status, headers)
+
+
+def _json_encoder(fields=None, settings=None):
+    """ Get the app's JSON encoder, instrumented when the request is profiled
+
+    Without a sparse fieldset and graph settings, the encoder prepared by the settings is shared.
+
+    :param fields: Sparse fieldset
+    :type fields: dict|None
+    :param settings: App settings, or None outside of application context
+    :type settings: JsonToolsSettings|None
+    :rtype: json.JSONEncoder
+    """
+    if settings is None:
+        encoder = app_json_encoder()
+        if fields is not None:
+            encoder.fields = fields
+    elif fields is None and not settings.graph:
+        encoder = settings.encoder
+    else:
+        encoder = settings.make_encoder(fields=fields)
+    profile = RequestProfile.current()
+    return encoder if profile is None else profile.instrument_encoder(encoder)
+
+
+def _json_backend(settings=None):
+    """ Get the app's JSON backend
+    :type settings: JsonToolsSettings|None
+    :rtype: JsonBackend
+    """
+    return app_json_backend() if settings is None else settings.backend
+
+
+def _requested_fields(arg):
+    """ Get the sparse fieldset requested with the query argument `arg` (`JSONTOOLS_FIELDS_ARG`)
+    :type arg: str|None
+    :rtype: str|None
+    """
+    if not arg or not has_request_context() or arg not in request.args:
+        return None
+    return ','.join(request.args.getlist(arg))
+
+
+def _client_accepts_ndjson():
+    """ Test whether the client prefers NDJSON over JSON
+    :rtype: bool
+    """
+    if not has_request_context():
+        return False
+    return request.accept_mimetypes.best_match(('application/json', 'application/x-ndjson')) == 'application/x-ndjson'
+
+
+def _ndjson_line(line):
+    """ Make an NDJSON line: newlines can only be whitespace in JSON, e.g. in pretty-printed RawJSON fragments
+    :type line: bytes
+    :rtype: bytes
+    """
+    if b'\n' in line:
+        line = line.replace(b'\n', b' ')
+    return line + b'\n'
+
+
+def _chunks(iterable, size):
+    """ Split an iterable into lists of `size` items
+    :type iterable: Iterable
+    :type size: int
+    :rtype: Iterator[list]
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
@@ -1,7 +1,9 @@
-import flask.json
 from flask.testing import FlaskClient
+from werkzeug.datastructures import Headers
 
 from .response import JsonResponse
+from .encoding import app_json_backend, app_json_default, RawJSONSplicer
+from .compression import get_codec
 
 
 class FlaskJsonClient(FlaskClient):
@@ -17,7 +19,7 @@ class FlaskJsonClient(FlaskClient):
         """
         # Prepare request
         if json:
-            kwargs['data'] = flask.json.dumps(json)
+            kwargs['data'] = RawJSONSplicer(app_json_default(self.application)).dumps(app_json_backend(self.application), json)
             kwargs['content_type'] = 'application/json'
             kwargs.setdefault('method', 'POST')
 
@@ -25,8 +27,25 @@ class FlaskJsonClient(FlaskClient):
         rv = super(FlaskJsonClient, self).open(path, **kwargs)
         ':type rv: flask.Response'
 
-        # Response: JSON?
-        if rv.mimetype == 'application/json':
-            response = flask.json.loads(rv.get_data())
-            return JsonResponse(response, rv.status_code, rv.headers)
+        # Response: streamed NDJSON is decoded lazily, with JsonResponse.iter_json()
+        if rv.mimetype == 'application/x-ndjson' and rv.is_streamed:
+            body = rv.iter_encoded()
+            headers = Headers(rv.headers)
+            if 'Content-Encoding' in headers:
+                body = get_codec(headers.pop('Content-Encoding')).iter_decompress(body)
+            response = JsonResponse.from_encoded(body, rv.status_code, headers)
+            response.call_on_close(rv.close)
+            return response
+
+        # Response: JSON? NDJSON?
+        if rv.mimetype in ('application/json', 'application/x-ndjson'):
+            # Decompress
+            data = rv.get_data()
+            headers = Headers(rv.headers)
+            if 'Content-Encoding' in headers:
+                data = get_codec(headers.pop('Content-Encoding')).decompress(data)
+                headers['Content-Length'] = str(len(data))
+
+            # Decoded on first use
+            return JsonResponse.from_encoded(data, rv.status_code, headers)
         return rv
@@ -1,14 +1,21 @@
 from __future__ import absolute_import
 from builtins import object
 
+import re
 import inspect
 from collections import defaultdict
-from functools import wraps
+from types import FunctionType
+from functools import wraps, update_wrapper
 
-from flask.views import View, with_metaclass
+from flask.views import View
 from flask import request
-from werkzeug.exceptions import MethodNotAllowed
-from future.utils import string_types
+from werkzeug.exceptions import HTTPException, MethodNotAllowed, BadRequest, RequestEntityTooLarge
+from future.utils import string_types, with_metaclass
+
+from .aio import isawaitable, run_coroutine
+from .response import JsonResponse, JsonStream, normalize_response_value
+from .parsing import get_json_body, _JSON_BODY_KEY
+from .pagination import keyset_page, iter_keyset, page_url, decode_cursor, parse_ordering
 
 
 def methodview(methods=(), ifnset=None, ifset=None):
@@ -29,18 +36,31 @@ def methodview(methods=(), ifnset=None, ifset=None):
 class _MethodViewInfo(object):
     """ Method view info object """
 
+    __slots__ = ('methods', 'ifnset', 'ifset')
+
     def decorator(self, func):
-        """ Wrapper function to decorate a function """
-        # This wrapper seems useless, but in fact is serves the purpose
-        # of being a clean namespace for setting custom attributes
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            return func(*args, **kwargs)
+        """ Mark a function as a view
 
-        # Put the sign
-        wrapper._methodview = self
+        The info is attached to the function itself, so calling the view costs no extra frame.
+        A function that is already a view with different info (e.g. one function used as both `create` and `update`,
+        or an inherited view re-decorated by a subclass) is copied first; other callables are wrapped.
+        """
+        if _MethodViewInfo.get_info(func) is not None:
+            func = _copy_function(func)
 
-        return wrapper
+        # Put the sign
+        try:
+            func._methodview = self
+        except (AttributeError, TypeError):  # bound methods, builtins, Python 2 unbound methods
+            # This wrapper seems useless, but in fact is serves the purpose
+            # of being a clean namespace for setting custom attributes
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                return func(*args, **kwargs)
+            func = wrapper
+            func._methodview = self
+
+        return func
 
     @classmethod
     def get_info(cls, func):
@@ -79,6 +99,15 @@ class _MethodViewInfo(object):
                (self.ifnset  is None or self.ifnset.isdisjoint(params)) and \
                (self.methods is None or verb in self.methods)
 
+    @property
+    def conditions(self):
+        """ Conditions of this view: (ifset, ifnset)
+
+        A view with a superset of conditions of another view is more specific
+        :rtype: tuple(frozenset, frozenset)
+        """
+        return self.ifset or frozenset(), self.ifnset or frozenset()
+
     def __repr__(self):
         return '<{cls}: methods={methods} ifset={ifset} ifnset={ifnset}>'.format(
             cls=self.__class__.__name__,
@@ -87,6 +116,109 @@ class _MethodViewInfo(object):
             ifnset=set(self.ifnset) if self.ifnset else '-',
         )
 
+
+def _copy_function(func):
+    """ Copy a function, so that its attributes can be changed independently
+
+    :type func: Callable
+    :return: The copy, or the callable itself if it's not a plain function
+    :rtype: Callable
+    """
+    if not isinstance(func, FunctionType):
+        return func
+    copy = FunctionType(func.__code__, func.__globals__, func.__name__, func.__defaults__, func.__closure__)
+    update_wrapper(copy, func)
+    if getattr(func, '__kwdefaults__', None):
+        copy.__kwdefaults__ = dict(func.__kwdefaults__)
+    return copy
+
+
+class _MethodViewDispatcher(object):
+    """ Dispatch index for a single HTTP verb of a MethodView
+
+        Compiled once per class. Views are looked up by the signature of a request:
+        the set of route parameters that are set, memoized.
+
+        When multiple views match a signature, the most specific one wins:
+        the one whose conditions are a superset of conditions of the others.
+        Views that may match the same request with no most specific one among them
+        are reported when the class is created.
+    """
+
+    def __init__(self, verb, views):
+        """ Compile the index
+        :param verb: HTTP verb
+        :type verb: str
+        :param views: Views for this verb: { view-name: _MethodViewInfo }
+        :type views: dict
+        :raises TypeError: ambiguous views
+        """
+        self.verb = verb
+        self.views = views
+
+        #: Route parameters that views have conditions on. Other parameters do not affect matching.
+        self.params = frozenset().union(*(info.ifset or () for info in views.values())) | \
+                      frozenset().union(*(info.ifnset or () for info in views.values()))
+
+        #: Memoized lookups: { signature: view-name|None }
+        self._index = {}
+
+        self._check_ambiguity()
+
+    def _check_ambiguity(self):
+        """ Make sure that for every request there is at most one most specific view
+
+        :raises TypeError: ambiguous views
+        """
+        conditions = {name: info.conditions for name, info in self.views.items()}
+        names = sorted(conditions)
+        for i, a in enumerate(names):
+            for b in names[i+1:]:
+                (set_a, nset_a), (set_b, nset_b) = conditions[a], conditions[b]
+                overlap = (set_a | set_b, nset_a | nset_b)
+
+                # Never match the same request
+                if not overlap[0].isdisjoint(overlap[1]):
+                    continue
+
+                # Requests that match both are handled by a more specific view: one of them, or another one
+                if conditions[a] != conditions[b] and overlap in conditions.values():
+                    continue
+
+                raise TypeError('Ambiguous views for {verb}: {a}() and {b}() may match the same request ({params})'.format(
+                    verb=self.verb, a=a, b=b, params=', '.join(sorted(overlap[0])) or 'no params'))
+
+    def match(self, route_params):
+        """ Find the view for the route parameters
+
+        :param route_params: Route parameters dict
+        :type route_params: dict
+        :return: View name
+        :rtype: str|None
+        """
+        signature = frozenset(k for k, v in route_params.items() if v is not None and k in self.params)
+        try:
+            return self._index[signature]
+        except KeyError:
+            view_name = self._index[signature] = self._resolve(signature)
+            return view_name
+
+    def _resolve(self, signature):
+        """ Find the most specific view that matches the signature
+
+        :type signature: frozenset
+        :rtype: str|None
+        """
+        matching = [(name, info.conditions) for name, info in self.views.items() if info.matches(self.verb, signature)]
+        for name, (ifset, ifnset) in matching:
+            if all(ifset >= other_ifset and ifnset >= other_ifnset for _, (other_ifset, other_ifnset) in matching):
+                return name
+        return None
+
+    def __repr__(self):
+        return '<{cls}: {verb} {views}>'.format(cls=self.__class__.__name__, verb=self.verb, views=sorted(self.views))
+
+
 class MethodViewType(type):
     """ Metaclass that collects methods decorated with @methodview """
 
@@ -107,11 +239,16 @@ class MethodViewType(type):
         # Finish
         cls.methods = tuple(sorted(methods_map.keys()))  # ('GET', ... )
         cls.methods_map = dict(methods_map)  # { 'GET': {'get': _MethodViewInfo } }
+        cls._dispatch = {method: _MethodViewDispatcher(method, views)  # { 'GET': _MethodViewDispatcher }
+                         for method, views in cls.methods_map.items()}
         super(MethodViewType, cls).__init__(name, bases, d)
 
 
 class MethodView(with_metaclass(MethodViewType, View)):
-    """ Class-based view that dispatches requests to methods decorated with @methodview """
+    """ Class-based view that dispatches requests to methods decorated with @methodview
+
+        Methods can be declared with `async def`: the coroutine is run in an event loop.
+    """
 
     def _match_view(self, method, route_params):
         """ Detect a view matching the query
@@ -121,20 +258,22 @@ class MethodView(with_metaclass(MethodViewType, View)):
         :return: Method
         :rtype: Callable|None
         """
-        method = method.upper()
-        route_params = frozenset(k for k, v in route_params.items() if v is not None)
-
-        for view_name, info in self.methods_map[method].items():
-            if info.matches(method, route_params):
-                return getattr(self, view_name)
-        else:
+        try:
+            dispatcher = self._dispatch[method.upper()]
+        except KeyError:
             return None
 
+        view_name = dispatcher.match(route_params)
+        return getattr(self, view_name) if view_name is not None else None
+
     def dispatch_request(self, *args, **kwargs):
         view = self._match_view(request.method, kwargs)
         if view is None:
             raise MethodNotAllowed(description='No view implemented for {}({})'.format(request.method, ', '.join(kwargs.keys())))
-        return view(*args, **kwargs)
+        rv = view(*args, **kwargs)
+        if isawaitable(rv):
+            rv = run_coroutine(rv)
+        return rv
 
     @classmethod
     def route_as_view(cls, app, name, rules, *class_args, **class_kwargs):
@@ -182,14 +321,19 @@ class RestfulViewType(MethodViewType):
                 # Get the view func
                 view = getattr(cls, view_name, None)
                 if callable(view):  # method exists and is callable
-                    # Automatically decorate it with @methodview() and conditions on PK
+                    # Automatically decorate it with @methodview() and conditions on PK.
+                    # Decorate a copy: the same function may be used under another name, e.g. `create = update = upsert`
                     view = methodview(
                         method,
                         ifnset=None if needs_pk else pk,
                         ifset=pk if needs_pk else None,
-                    )(view)
+                    )(_copy_function(view))
                     setattr(cls, view_name, view)
 
+            # Batch operations: a separate route, marked with the `_batch` route default
+            if cls.batch_route:
+                cls.batch = methodview('POST', ifset='_batch', ifnset=pk)(_copy_function(cls.batch))
+
         # Proceed
         super(RestfulViewType, cls).__init__(name, bases, d)
 
@@ -205,6 +349,8 @@ class RestfulView(with_metaclass(RestfulViewType, MethodView)):
             PUT /<pk>     -> replace()
             POST /<pk>    -> update()
             DELETE /<pk>  -> delete()
+        Batch operations, when `batch_route` is set:
+            POST /batch   -> batch(): create_many(), update_many(), replace_many(), delete_many()
 
         You just need to specify PK fields
     """
@@ -213,5 +359,272 @@ class RestfulView(with_metaclass(RestfulViewType, MethodView)):
     #: If specified -- then we're working with an individual entry, and if not -- with the whole collection
     primary_key = ()
 
+    #: Sort keys for cursor pagination: model attribute names; '-name' for descending order.
+    #: Default: `primary_key`
+    ordering = None
+
+    #: Page size for cursor pagination, and the maximum one a client can ask for with `?limit=`
+    page_size = 100
+    max_page_size = 1000
+
+    #: Query arguments for cursor pagination
+    cursor_arg = 'cursor'
+    limit_arg = 'limit'
+
+    #: Response cache used with `@jsonapi(cache=...)`.
+    #: When set, requests that modify data invalidate cached responses of the entry, and of the collection
+    #: :type: flask_jsontools.cache.ResponseCache|None
+    cache = None
+
+    #: Batch operations route, appended to collection routes, e.g. '/batch'. Default: no batch route
+    batch_route = None
+
+    #: The maximum number of operations in a batch
+    max_batch_size = 1000
+
+    @classmethod
+    def route_as_view(cls, app, name, rules, *class_args, **class_kwargs):
+        """ Register the view with an URL route
+
+        When `batch_route` is set, it is also registered for every collection route (the one without PK fields)
+        """
+        view = super(RestfulView, cls).route_as_view(app, name, rules, *class_args, **class_kwargs)
+        if cls.batch_route:
+            for rule in rules:
+                if isinstance(rule, string_types) and cls._is_collection_rule(rule):
+                    app.add_url_rule(rule.rstrip('/') + cls.batch_route, view_func=view,
+                                     defaults={'_batch': True}, methods=('POST',))
+        return view
+
+    @classmethod
+    def _is_collection_rule(cls, rule):
+        """ Test whether the route rule has no PK fields
+        :type rule: str
+        :rtype: bool
+        """
+        params = re.findall(r'<(?:[^<>:]+:)?([^<>:]+)>', rule)
+        return set(cls.primary_key).isdisjoint(params)
+
+    def dispatch_request(self, *args, **kwargs):
+        rv = super(RestfulView, self).dispatch_request(*args, **kwargs)
+        if self.cache is not None and request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            self.invalidate_cache(**kwargs)
+        return rv
+
+    def invalidate_cache(self, **route_params):
+        """ Invalidate cached responses of an entry, and of the collection
+
+        Called automatically after create(), update(), replace(), delete(), and custom methods
+        for verbs other than GET.
+
+        :param route_params: Route parameters: the primary key of the entry, if any
+        """
+        self.cache.invalidate(request.endpoint, **{k: route_params.get(k) for k in self.primary_key})
+
+    #region Batch operations
+
+    #: Batch operations: { op: needs-primary-key }
+    batch_ops = {'create': False, 'update': True, 'replace': True, 'delete': True}
+
+    def batch(self, _batch, **kwargs):
+        """ Perform a batch of operations, given as a JSON array in the request body:
+
+            [ {"op": "create", "data": {...}},
+              {"op": "update", "pk": 1, "data": {...}},
+              {"op": "delete", "pk": {"id": 2}} ]
+
+        `pk` is a dict of PK fields, or a scalar when there's just one.
+        Consecutive operations of the same kind are given to the `<op>_many()` hook at once, if it's defined,
+        which allows bulk SQL; otherwise, the single-item method is called for every item,
+        and `get_json_body()` returns the item's `data`.
+
+        Responds with a list of per-item results, in the same order: `{"status": 200, "data": ...}`,
+        or `{"status": 404, "error": "..."}` for items that failed with an HTTPException.
+
+        :param kwargs: Route parameters of the collection
+        :rtype: JsonResponse
+        :raises BadRequest: invalid operations
+        :raises RequestEntityTooLarge: more than `max_batch_size` operations
+        """
+        ops = [self._parse_batch_op(op) for op in self._get_batch()]
+
+        results = []
+        i = 0
+        while i < len(ops):
+            # Group consecutive operations of the same kind
+            name = ops[i][0]
+            j = i
+            while j < len(ops) and ops[j][0] == name:
+                j += 1
+            group = [(pk, data) for _, pk, data in ops[i:j]]
+            results.extend(self._batch_call(name, group, kwargs))
+            i = j
+
+        if self.cache is not None:
+            for _, pk, _ in ops:
+                if pk is not None:
+                    self.invalidate_cache(**pk)
+        return JsonResponse(results)
+
+    def _get_batch(self):
+        """ Get the operations from the request body
+        :rtype: list
+        """
+        ops = get_json_body(force=True)
+        if not isinstance(ops, list):
+            raise BadRequest('Expected an array of operations')
+        if len(ops) > self.max_batch_size:
+            raise RequestEntityTooLarge('Too many operations: the limit is {}'.format(self.max_batch_size))
+        return ops
+
+    def _parse_batch_op(self, op):
+        """ Validate an operation
+        :type op: dict
+        :return: (name, pk, data)
+        :rtype: tuple(str, dict|None, *)
+        :raises BadRequest: invalid operation
+        """
+        if not isinstance(op, dict) or op.get('op') not in self.batch_ops:
+            raise BadRequest('Invalid operation: expected {"op": ' + '|'.join(sorted(self.batch_ops)) + ', ...}')
+        name = op['op']
+        if not self.batch_ops[name]:
+            return name, None, op.get('data')
+
+        pk = op.get('pk')
+        if not isinstance(pk, dict):
+            if len(self.primary_key) != 1:
+                raise BadRequest('Invalid operation: "pk" should have {}'.format(', '.join(self.primary_key)))
+            pk = {self.primary_key[0]: pk}
+        if set(pk) != set(self.primary_key) or None in pk.values():
+            raise BadRequest('Invalid operation: "pk" should have {}'.format(', '.join(self.primary_key)))
+        return name, pk, op.get('data')
+
+    def _batch_call(self, name, group, kwargs):
+        """ Perform a group of operations of the same kind
+
+        :param name: Operation
+        :type name: str
+        :param group: [ (pk, data) ]
+        :type group: list
+        :param kwargs: Route parameters of the collection
+        :return: Per-item results
+        :rtype: list[dict]
+        """
+        # Bulk hook
+        hook = getattr(self, name + '_many', None)
+        if callable(hook):
+            if name == 'create':
+                items = [data for pk, data in group]
+            elif name == 'delete':
+                items = [pk for pk, data in group]
+            else:
+                items = group
+            try:
+                rvs = _await(hook(items, **kwargs))
+            except HTTPException as e:
+                return [_batch_result(e)] * len(group)
+            rvs = list(rvs)
+            if len(rvs) != len(group):
+                raise ValueError('{}_many() returned {} results for {} items'.format(name, len(rvs), len(group)))
+            return [_batch_result(rv) for rv in rvs]
+
+        # Single-item method
+        view = getattr(self, name, None)
+        if not callable(view):
+            return [_batch_result(MethodNotAllowed(description='No view implemented for {}'.format(name)))] * len(group)
+
+        results = []
+        environ = request.environ
+        body = environ.get(_JSON_BODY_KEY)
+        try:
+            for pk, data in group:
+                environ[_JSON_BODY_KEY] = data
+                try:
+                    rv = _await(view(**dict(kwargs, **pk)) if pk else view(**kwargs))
+                except HTTPException as e:
+                    rv = e
+                results.append(_batch_result(rv))
+        finally:
+            environ[_JSON_BODY_KEY] = body
+        return results
+
+    #endregion
+
+    #region Pagination
+
+    def paginate(self, query):
+        """ Respond with a page of results, with cursor (keyset) pagination
+
+        The page is given with the `?cursor=` query argument, its size with `?limit=`.
+        The cursor of the next page is given in the `X-Next-Cursor` header, and as a `Link: <url>; rel="next"`.
+        Sort keys are taken from `ordering`, or from the `primary_key`.
+
+            def list(self):
+                return self.paginate(db.query(User))
+
+        :param query: The query
+        :type query: sqlalchemy.orm.Query
+        :rtype: JsonResponse
+        :raises BadRequest: invalid cursor or limit
+        """
+        items, cursor = keyset_page(query, self.ordering or self.primary_key,
+                                    request.args.get(self.cursor_arg), self._page_limit())
+        headers = {}
+        if cursor is not None:
+            headers['Link'] = '<{}>; rel="next"'.format(page_url(cursor, self.cursor_arg))
+            headers['X-Next-Cursor'] = cursor
+        return JsonResponse(items, headers=headers)
+
+    def export(self, query):
+        """ Stream all results, with keyset pagination under the hood
+
+        For export endpoints that walk the whole table: the table is read page by page,
+        every page is an indexed query, and the output is streamed.
+        Starts after `?cursor=`, if given.
+
+        :param query: The query
+        :type query: sqlalchemy.orm.Query
+        :rtype: JsonStream
+        :raises BadRequest: invalid cursor
+        """
+        ordering = self.ordering or self.primary_key
+        cursor = request.args.get(self.cursor_arg)
+        if cursor is not None:
+            decode_cursor(cursor, len(parse_ordering(ordering)))  # fail before streaming starts
+        return JsonStream(iter_keyset(query, ordering, cursor, self.page_size), chunk_size=self.page_size)
+
+    def _page_limit(self):
+        """ Get the page size requested with `?limit=`
+        :rtype: int
+        """
+        try:
+            limit = int(request.args.get(self.limit_arg, self.page_size))
+        except ValueError:
+            raise BadRequest('Invalid limit')
+        if limit < 1:
+            raise BadRequest('Invalid limit')
+        return min(limit, self.max_page_size)
+
+    #endregion
+
+
+def _await(rv):
+    """ Run the coroutine, if the method was declared with `async def` """
+    return run_coroutine(rv) if isawaitable(rv) else rv
+
+
+def _batch_result(rv):
+    """ Convert a result of a batch operation into {status, data|error}
+
+    :param rv: A view return value, or an HTTPException
+    :rtype: dict
+    """
+    if isinstance(rv, HTTPException):
+        return {'status': rv.code, 'error': rv.description}
+    rv, status, headers = normalize_response_value(rv)
+    if isinstance(rv, JsonResponse):
+        return {'status': status or rv.status_code, 'data': rv.get_json()}
+    return {'status': status or 200, 'data': rv}
+
 
 __all__ = ('methodview', 'MethodView', 'RestfulView')
@@ -0,0 +1,83 @@
+""" Views declared with `async def`, for async-test.py
+
+    A separate module: `async def` is a syntax error before Python 3.5, and async generators before 3.6.
+"""
+
+import asyncio
+from flask import request
+
+from flask_jsontools import jsonapi, MethodView, RestfulView, methodview
+
+
+async def fetch(value, delay=0.01):
+    await asyncio.sleep(delay)
+    return value
+
+
+class ItemsView(RestfulView):
+
+    decorators = (jsonapi,)
+    primary_key = ('id',)
+
+    async def list(self):
+        return await asyncio.gather(fetch(1), fetch(2), fetch(3))
+
+    async def get(self, id):
+        return {'id': await fetch(id)}
+
+    def delete(self, id):
+        return {'id': id, 'sync': True}
+
+
+class StreamView(MethodView):
+
+    decorators = (jsonapi,)
+
+    @methodview('GET')
+    async def stream(self):
+        async def items():
+            for i in range(5):
+                yield {'id': await fetch(i, 0)}
+        return items()
+
+
+def init_app(app):
+    """ Register the views """
+    @app.route('/gather')
+    @jsonapi
+    async def gather():
+        # Concurrent calls: ~0.05s, not 0.25s
+        loop = asyncio.get_event_loop()
+        t = loop.time()
+        values = await asyncio.gather(*[fetch(i, 0.05) for i in range(5)])
+        return {'values': values, 'concurrent': loop.time() - t < 0.2}
+
+    @app.route('/context')
+    @jsonapi
+    async def context():
+        return {'args': request.args.to_dict()}
+
+    @app.route('/status')
+    @jsonapi
+    async def status():
+        return {'created': True}, 201, {'X-Async': 'yes'}
+
+    @app.route('/agen')
+    @jsonapi
+    async def agen():
+        async def items():
+            for i in range(3):
+                await asyncio.sleep(0)
+                yield i
+        return items()
+
+    @app.route('/agen/sync')
+    @jsonapi
+    def agen_sync():
+        async def items():
+            yield {'a': 1}
+            yield {'b': 2}
+        return items()
+
+    ItemsView.route_as_view(app, 'items', ('/items/', '/items/<int:id>'))
+    StreamView.route_as_view(app, 'stream', ('/stream/',))
@@ -0,0 +1,53 @@
+import sys
+import unittest
+from flask import Flask
+
+from flask_jsontools import FlaskJsonClient
+
+if sys.version_info >= (3, 6):
+    import _async_views  # async def: a syntax error on older interpreters
+
+
+@unittest.skipUnless(sys.version_info >= (3, 6), 'async def and async generators: Python 3.6+')
+class AsyncTest(unittest.TestCase):
+    def setUp(self):
+        self.app = app = Flask(__name__)
+        app.debug = app.testing = True
+        app.test_client_class = FlaskJsonClient
+        _async_views.init_app(app)
+
+    def test_jsonapi(self):
+        """ async def views with @jsonapi """
+        with self.app.test_client() as c:
+            rv = c.get('/gather')
+            self.assertEqual(rv.get_json(), {'values': [0, 1, 2, 3, 4], 'concurrent': True})
+
+            rv = c.get('/context?a=1')
+            self.assertEqual(rv['args'], {'a': '1'})
+
+            rv = c.get('/status')
+            self.assertEqual(rv.status_code, 201)
+            self.assertEqual(rv.headers['X-Async'], 'yes')
+            self.assertEqual(rv.get_json(), {'created': True})
+
+    def test_async_generators(self):
+        """ Async generators are streamed """
+        with self.app.test_client() as c:
+            rv = c.get('/agen')
+            self.assertEqual(rv.get_json(), [0, 1, 2])
+
+            rv = c.get('/agen/sync')
+            self.assertEqual(rv.get_json(), [{'a': 1}, {'b': 2}])
+
+            rv = c.get('/agen', headers={'Accept': 'application/x-ndjson'})
+            self.assertEqual(rv.get_json(), [0, 1, 2])
+
+            rv = c.get('/stream/')
+            self.assertEqual(rv.get_json(), [{'id': i} for i in range(5)])
+
+    def test_methodview(self):
+        """ async def methods of MethodView and RestfulView """
+        with self.app.test_client() as c:
+            self.assertEqual(c.get('/items/').get_json(), [1, 2, 3])
+            self.assertEqual(c.get('/items/10').get_json(), {'id': 10})
+            self.assertEqual(c.delete('/items/10').get_json(), {'id': 10, 'sync': True})
@@ -0,0 +1,263 @@
+import os
+import random
+import unittest
+from flask import Flask
+
+from flask_jsontools import jsonapi, FlaskJsonClient, JsonResponse, RestfulView
+from flask_jsontools import ResponseCache, CacheBackend, MemoryCacheBackend, MmapCacheBackend
+
+
+class FakeCacheBackend(CacheBackend):
+    """ Dict-based backend that records calls """
+
+    def __init__(self):
+        self.data = {}
+        self.calls = []
+
+    def get(self, key):
+        self.calls.append('get')
+        return self.data.get(key)
+
+    def set(self, key, value, ttl=None):
+        self.calls.append('set')
+        assert isinstance(value, bytes)
+        self.data[key] = value
+
+    def delete(self, key):
+        self.calls.append('delete')
+        self.data.pop(key, None)
+
+    def clear(self):
+        self.data.clear()
+
+
+class MemoryCacheBackendTest(unittest.TestCase):
+    def test_lru(self):
+        cache = MemoryCacheBackend(maxsize=2)
+        cache.set('a', b'1')
+        cache.set('b', b'2')
+        self.assertEqual(cache.get('a'), b'1')  # 'a' is now recently used
+        cache.set('c', b'3')
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('a'), b'1')
+        self.assertEqual(cache.get('c'), b'3')
+
+        cache.delete('a')
+        self.assertEqual(cache.get('a'), None)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+    def test_ttl(self):
+        now = [0]
+        cache = MemoryCacheBackend(ttl=10, timer=lambda: now[0])
+        cache.set('a', b'1')
+        cache.set('b', b'2', ttl=100)
+        now[0] = 9
+        self.assertEqual(cache.get('a'), b'1')
+        now[0] = 10
+        self.assertEqual(cache.get('a'), None)
+        self.assertEqual(cache.get('b'), b'2')
+
+
+@unittest.skipUnless(hasattr(os, 'fork'), 'POSIX only')
+class MmapCacheBackendTest(unittest.TestCase):
+    def test_lru(self):
+        cache = MmapCacheBackend(maxsize=2)
+        cache.set('a', b'1')
+        cache.set('b', b'2')
+        self.assertIsInstance(cache.get('a'), bytes)
+        self.assertEqual(cache.get('a'), b'1')  # 'a' is now recently used
+        cache.set('c', b'3')
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('a'), b'1')
+        self.assertEqual(cache.get('c'), b'3')
+
+        cache.set('a', b'11')  # replaced
+        self.assertEqual(cache.get('a'), b'11')
+        cache.delete('a')
+        self.assertEqual(cache.get('a'), None)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.get('c'), None)
+
+    def test_size(self):
+        """ Values are evicted to make room in the data region: 3 blocks """
+        cache = MmapCacheBackend(maxsize=100, size=100, block_size=32)
+        for key in 'abcd':
+            cache.set(key, key.encode() * 30)
+        self.assertEqual(len(cache), 3)
+        self.assertEqual(cache.get('a'), None)
+        self.assertEqual(cache.get('d'), b'd' * 30)
+
+        cache.set('big', b'x' * 200)  # too large: not stored
+        self.assertEqual(cache.get('big'), None)
+        cache.set('e', b'e' * 60)  # 2 blocks: evicts two
+        self.assertEqual([key for key in 'bcde' if cache.get(key) is not None], ['d', 'e'])
+
+        value = bytes(bytearray(range(95)))  # all 3 blocks
+        cache.set('f', value)
+        self.assertEqual(cache.get('f'), value)
+        self.assertEqual(len(cache), 1)
+        cache.delete('f')  # blocks are reused
+        cache.set('g', value)
+        self.assertEqual(cache.get('g'), value)
+
+    def test_ttl(self):
+        now = [0]
+        cache = MmapCacheBackend(ttl=10, timer=lambda: now[0])
+        cache.set('a', b'1')
+        cache.set('b', b'2', ttl=100)
+        now[0] = 9
+        self.assertEqual(cache.get('a'), b'1')
+        now[0] = 10
+        self.assertEqual(cache.get('a'), None)
+        self.assertEqual(cache.get('b'), b'2')
+
+    def test_index(self):
+        """ The hash index stays consistent through collisions and removals """
+        cache = MmapCacheBackend(maxsize=50, size=1 << 12, block_size=16)
+        expected = {}
+        rnd = random.Random(0)
+        for i in range(2000):
+            key = str(rnd.randrange(40))
+            if rnd.random() < 0.3:
+                cache.delete(key)
+                expected.pop(key, None)
+            else:
+                expected[key] = key.encode() * rnd.randrange(1, 50)
+                cache.set(key, expected[key])
+        self.assertEqual({key: cache.get(key) for key in expected}, expected)
+        self.assertEqual(len(cache), len(expected))
+
+    def test_processes(self):
+        """ The cache is shared by forked processes """
+        cache = MmapCacheBackend()
+        cache.set('parent', b'1')
+        pid = os.fork()
+        if pid == 0:  # child
+            try:
+                ok = cache.get('parent') == b'1'
+                cache.set('child', b'2')
+            finally:
+                os._exit(0 if ok else 1)
+        self.assertEqual(os.waitpid(pid, 0)[1], 0)
+        self.assertEqual(cache.get('child'), b'2')
+
+        # Another cache with the same file
+        other = MmapCacheBackend(cache.path)
+        self.assertEqual(other.get('child'), b'2')
+        with self.assertRaises(ValueError):
+            MmapCacheBackend(cache.path, maxsize=10).get('child')
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.app = app = Flask(__name__)
+        app.debug = app.testing = True
+        app.test_client_class = FlaskJsonClient
+
+        self.backend = FakeCacheBackend()
+        self.cache = cache = ResponseCache(self.backend, query_args=('q',), vary=lambda: self.user)
+        self.user = 'a'
+        self.calls = calls = []
+        self.users = users = {1: 'a', 2: 'b'}
+
+        @app.route('/hello/<name>')
+        @jsonapi(cache=cache)
+        def hello(name):
+            calls.append(name)
+            return {'hello': name}
+
+        @app.route('/error')
+        @jsonapi(cache=cache)
+        def error():
+            calls.append('error')
+            return {'error': True}, 500
+
+        class UserView(RestfulView):
+            decorators = (jsonapi(cache=self.cache),)
+            primary_key = ('id',)
+            cache = self.cache
+
+            def list(self):
+                calls.append('list')
+                return sorted(users.values())
+
+            def get(self, id):
+                calls.append('get')
+                return users[id]
+
+            def update(self, id):
+                users[id] = users[id].upper()
+                return users[id]
+
+        UserView.route_as_view(app, 'user', ('/user/', '/user/<int:id>'))
+
+    def test_cache(self):
+        with self.app.test_client() as c:
+            for i in range(2):
+                rv = c.get('/hello/a')
+                self.assertEqual(rv.status_code, 200)
+                self.assertEqual(rv.get_json(), {'hello': 'a'})
+            self.assertEqual(self.calls, ['a'])
+
+            # Different keys
+            c.get('/hello/b')
+            c.get('/hello/a?q=1')
+            c.get('/hello/a?other=1')  # not a part of the key
+            self.user = 'b'
+            c.get('/hello/a')
+            self.assertEqual(self.calls, ['a', 'b', 'a', 'a'])
+
+            # Not cached: errors, other methods
+            c.get('/error')
+            c.get('/error')
+            self.assertEqual(self.calls.count('error'), 2)
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'POSIX only')
+    def test_mmap(self):
+        """ Responses served from a shared memory cache """
+        self.cache.backend = MmapCacheBackend()
+        with self.app.test_client() as c:
+            for i in range(2):
+                rv = c.get('/hello/a')
+                self.assertEqual(rv.get_json(), {'hello': 'a'})
+            self.assertEqual(self.calls, ['a'])
+
+    def test_cached_response(self):
+        """ Cached responses are served from the encoded body """
+        with self.app.test_request_context('/hello/a'):
+            self.app.preprocess_request()
+            rv = self.app.dispatch_request()
+            rv = self.app.dispatch_request()
+            self.assertIsInstance(rv, JsonResponse)
+            self.assertEqual(rv.get_data(), b'{"hello":"a"}')
+            self.assertEqual(rv['hello'], 'a')
+            self.assertEqual(rv.mimetype, 'application/json')
+
+    def test_restful_invalidation(self):
+        with self.app.test_client() as c:
+            self.assertEqual(c.get('/user/').get_json(), ['a', 'b'])
+            self.assertEqual(c.get('/user/1').get_json(), 'a')
+            self.assertEqual(c.get('/user/2').get_json(), 'b')
+            self.assertEqual(c.get('/user/').get_json(), ['a', 'b'])
+            self.assertEqual(c.get('/user/1').get_json(), 'a')
+            self.assertEqual(self.calls, ['list', 'get', 'get'])
+
+            # Update: invalidates the item and the collection, but not other items
+            del self.calls[:]
+            c.post('/user/1')
+            self.assertEqual(c.get('/user/').get_json(), ['A', 'b'])
+            self.assertEqual(c.get('/user/1').get_json(), 'A')
+            self.assertEqual(c.get('/user/2').get_json(), 'b')
+            self.assertEqual(self.calls, ['list', 'get'])
+
+            # Explicit invalidation
+            del self.calls[:]
+            with self.app.app_context():
+                self.cache.invalidate('user')
+            c.get('/user/')
+            c.get('/user/1')
+            self.assertEqual(self.calls, ['list', 'get'])  # items as well
@@ -0,0 +1,124 @@
+import unittest
+from flask import Flask
+from flask.testing import FlaskClient
+from werkzeug.datastructures import MultiDict
+
+from flask_jsontools import jsonapi, FlaskJsonClient, JsonResponse, ResponseCache, MemoryCacheBackend
+from flask_jsontools.compression import get_codec, available_encodings
+
+
+class CompressionTest(unittest.TestCase):
+    def setUp(self):
+        self.app = app = Flask(__name__)
+        app.debug = app.testing = True
+        app.test_client_class = FlaskJsonClient
+        app.config['JSONTOOLS_COMPRESS'] = True
+        app.config['JSONTOOLS_COMPRESS_MIN_SIZE'] = 100
+
+        self.cache = cache = ResponseCache(MemoryCacheBackend())
+        self.calls = calls = []
+
+        @app.route('/items/<int:n>')
+        @jsonapi
+        def items(n):
+            return [{'id': i, 'name': 'item'} for i in range(n)]
+
+        @app.route('/stream')
+        @jsonapi
+        def stream():
+            return ({'id': i} for i in range(1000))
+
+        @app.route('/etag')
+        @jsonapi
+        def etag():
+            return JsonResponse(list(range(100)), etag=True)
+
+        @app.route('/cached')
+        @jsonapi(cache=cache)
+        def cached():
+            calls.append(1)
+            return list(range(1000))
+
+    def raw_get(self, path, encoding=None, **headers):
+        if encoding:
+            headers['Accept-Encoding'] = encoding
+        return FlaskClient(self.app, self.app.response_class).get(path, headers=headers)
+
+    def decoded(self, rv):
+        data = rv.get_data()
+        if 'Content-Encoding' in rv.headers:
+            data = get_codec(rv.headers['Content-Encoding']).decompress(data)
+        return data
+
+    def test_codecs(self):
+        self.assertIn('gzip', available_encodings())
+        for encoding in available_encodings():
+            codec = get_codec(encoding)
+            data = b'{"a":1}' * 100
+            self.assertEqual(codec.decompress(codec.compress(data)), data)
+            self.assertEqual(codec.decompress(b''.join(codec.iter_compress([data[:10], data[10:], b'']))), data)
+
+    def test_negotiation(self):
+        expected = self.raw_get('/items/100').get_data()
+
+        for encoding in available_encodings():
+            rv = self.raw_get('/items/100', encoding)
+            self.assertEqual(rv.headers['Content-Encoding'], encoding)
+            self.assertEqual(rv.headers['Vary'], 'Accept, Accept-Encoding')  # a list: NDJSON can be negotiated
+            self.assertLess(len(rv.get_data()), len(expected))
+            self.assertEqual(self.decoded(rv), expected)
+
+        # Preferences
+        self.assertEqual(self.raw_get('/items/100', 'gzip;q=1, br;q=0.5').headers['Content-Encoding'], 'gzip')
+        self.assertNotIn('Content-Encoding', self.raw_get('/items/100', 'compress').headers)
+
+        # Too small
+        rv = self.raw_get('/items/1', 'gzip')
+        self.assertNotIn('Content-Encoding', rv.headers)
+        self.assertEqual(rv.headers['Vary'], 'Accept, Accept-Encoding')  # a list: NDJSON can be negotiated
+
+        # Disabled
+        self.app.config['JSONTOOLS_COMPRESS'] = False
+        self.assertNotIn('Content-Encoding', self.raw_get('/items/100', 'gzip').headers)
+
+        # FlaskJsonClient decompresses
+        self.app.config['JSONTOOLS_COMPRESS'] = True
+        with self.app.test_client() as c:
+            rv = c.get('/items/100', headers={'Accept-Encoding': 'gzip'})
+            self.assertEqual(len(rv.get_json()), 100)
+
+    def test_stream(self):
+        expected = self.raw_get('/stream').get_data()
+        rv = self.raw_get('/stream', 'gzip')
+        self.assertEqual(rv.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(self.decoded(rv), expected)
+
+    def test_etag(self):
+        rv = self.raw_get('/etag', 'gzip')
+        etag = rv.headers['ETag']
+        self.assertTrue(etag.startswith('W/'))
+        self.assertEqual(self.raw_get('/etag', 'gzip', **{'If-None-Match': etag}).status_code, 304)
+
+    def test_cache(self):
+        """ The cache keeps compressed bodies """
+        expected = self.raw_get('/cached').get_data()  # stored uncompressed
+        self.assertEqual(self.calls, [1])
+
+        # Compressed once, then served from the cache
+        for encoding in available_encodings() * 2:
+            rv = self.raw_get('/cached', encoding)
+            self.assertEqual(rv.headers['Content-Encoding'], encoding)
+            self.assertEqual(self.decoded(rv), expected)
+        self.assertEqual(self.calls, [1])
+
+        with self.app.test_request_context():
+            key = self.cache.make_key('cached', {}, MultiDict())
+            self.assertEqual(set(self.cache.get(key).bodies), set(available_encodings()) | {'identity'})
+
+        # Stored compressed: identity is made from the compressed body
+        self.cache.clear()
+        self.raw_get('/cached', 'gzip')
+        rv = self.raw_get('/cached')
+        self.assertNotIn('Content-Encoding', rv.headers)
+        self.assertEqual(rv.get_data(), expected)
+        self.assertEqual(self.calls, [1, 1])
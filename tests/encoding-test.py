@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+import json
+import unittest
+import datetime
+from decimal import Decimal
+import flask
+from flask import Flask
+from flask.testing import FlaskClient
+
+from flask_jsontools import jsonapi, FlaskJsonClient, DynamicJSONEncoder, JsonBackend, JsonResponse, get_json_backend, RawJSON
+from flask_jsontools.encoding import json_backends, RawJSONSplicer, _undecoded
+from flask_jsontools.response import _encoded
+
+
+def available_backends():
+    for backend_cls in json_backends:
+        try:
+            yield backend_cls()
+            yield backend_cls(ensure_ascii=True)
+        except ImportError:
+            pass
+
+
+class Point(object):
+    def __init__(self, x, y):
+        self.x, self.y = x, y
+
+    def __json__(self):
+        return {'x': self.x, 'y': self.y}
+
+
+class ApiJSONEncoder(DynamicJSONEncoder):
+    def default(self, o):
+        if isinstance(o, Decimal):
+            return str(o)
+        return super(ApiJSONEncoder, self).default(o)
+
+
+class EncodingTest(unittest.TestCase):
+    data = {
+        'str': u'abc é  "quoted" \\ / \n\t\x1f',
+        'int': 1, 'bigint': 2**70, 'float': 0.1, 'neg': -2.5,
+        'bool': True, 'none': None,
+        'list': [1, [2, [3]], {}, []],
+        'tuple': (1, 2),
+        'nested': {'b': {'d': 1, 'c': 2}, 'a': [{'z': 1, 'y': 2}]},
+        'point': Point(1, 2),
+        'date': datetime.datetime(2020, 1, 2, 3, 4, 5),
+        'decimal': Decimal('1.5'),
+    }
+
+    def setUp(self):
+        self.app = app = Flask(__name__)
+        app.json_encoder = ApiJSONEncoder
+        app.test_client_class = FlaskJsonClient
+        app.debug = app.testing = True
+
+        @app.route('/data')
+        @jsonapi
+        def data():
+            return self.data
+
+    def test_backends_compatible(self):
+        """ All backends produce the same bytes """
+        default = ApiJSONEncoder().default
+        for ensure_ascii in (False, True):
+            stdlib = get_json_backend('stdlib', ensure_ascii)
+            expected = stdlib.dumps(self.data, default=default, sort_keys=True)
+            expected_indented = stdlib.dumps(self.data, default=default, sort_keys=True, indent=2)
+            self.assertIn(b'"point":{"x":1,"y":2}', expected)
+            self.assertIn(b'"decimal":"1.5"', expected)
+            self.assertIn(u'abc \\u00e9' if ensure_ascii else u'abc é', expected.decode('utf-8'))
+
+            for backend in available_backends():
+                if backend.ensure_ascii != ensure_ascii:
+                    continue
+                self.assertEqual(backend.dumps(self.data, default=default, sort_keys=True), expected, backend)
+                self.assertEqual(backend.dumps(self.data, default=default, sort_keys=True, indent=2), expected_indented, backend)
+                self.assertEqual(backend.loads(expected)['point'], {'x': 1, 'y': 2})
+                self.assertEqual(backend.dumps({1: 'int key'}), b'{"1":"int key"}')
+                self.assertEqual(backend.dumps([u'ы\U0001f600']), stdlib.dumps([u'ы\U0001f600']), backend)  # surrogate pairs
+
+    def test_get_json_backend(self):
+        self.assertIsInstance(get_json_backend(), JsonBackend)
+        self.assertIs(get_json_backend('stdlib'), get_json_backend('stdlib'))
+        self.assertIsNot(get_json_backend('stdlib', ensure_ascii=True), get_json_backend('stdlib'))
+        self.assertRaises(ValueError, get_json_backend, 'nope')
+
+    def test_response_backends(self):
+        """ JsonResponse uses the configured backend """
+        bodies = set()
+        for backend in available_backends():
+            self.app.config['JSONTOOLS_JSON_BACKEND'] = backend.name
+            with self.app.test_client() as c:
+                rv = c.get('/data')
+                self.assertEqual(rv.status_code, 200)
+                self.assertEqual(rv['point'], {'x': 1, 'y': 2})
+                self.assertEqual(rv['decimal'], '1.5')
+                self.assertEqual(rv['date'], 'Thu, 02 Jan 2020 03:04:05 GMT')
+            # Raw response body
+            bodies.add(FlaskClient(self.app, self.app.response_class).get('/data').get_data())
+        self.assertEqual(len(bodies), 1)
+        self.assertIn(b'abc \\u00e9', bodies.pop())  # JSON_AS_ASCII: True by default
+
+        self.app.config['JSON_AS_ASCII'] = False
+        body = FlaskClient(self.app, self.app.response_class).get('/data').get_data()
+        self.assertIn(u'abc é'.encode('utf-8'), body)
+
+
+class RawJSONTest(unittest.TestCase):
+    def setUp(self):
+        self.app = app = Flask(__name__)
+        app.json_encoder = DynamicJSONEncoder
+        app.test_client_class = FlaskJsonClient
+        app.debug = app.testing = True
+
+        self.doc = doc = RawJSON(u'{"b": [1, 2],\n "a": "é"}')
+
+        @app.route('/doc')
+        @jsonapi
+        def get_doc():
+            return {'id': 1, 'doc': doc, 'docs': [doc, RawJSON(b'null')], 'point': Point(1, 2)}
+
+        @app.route('/raw')
+        @jsonapi
+        def get_raw():
+            return RawJSON(b'{"raw":true}')
+
+        @app.route('/list')
+        @jsonapi
+        def get_list():
+            return [doc, {'x': doc}]
+
+        @app.route('/stream')
+        @jsonapi
+        def get_stream():
+            return (RawJSON(str(i)) for i in range(3))
+
+    def test_splice(self):
+        """ Fragments are spliced into the output verbatim """
+        for backend in available_backends():
+            self.app.config['JSONTOOLS_JSON_BACKEND'] = backend.name
+            with self.app.test_client() as c:
+                rv = c.get('/doc')
+                self.assertEqual(rv.get_data(), u'{"doc":{"b": [1, 2],\n "a": "é"},"docs":[{"b": [1, 2],\n "a": "é"},null],'
+                                                u'"id":1,"point":{"x":1,"y":2}}'.encode('utf-8'))
+                self.assertEqual(rv.get_json()['doc'], {'b': [1, 2], 'a': u'é'})
+
+                self.assertEqual(c.get('/raw').get_data(), b'{"raw":true}')
+                self.assertEqual(c.get('/stream').get_data(), b'[0,1,2]')
+
+                # NDJSON: newlines in fragments are whitespace
+                rv = c.get('/list', headers={'Accept': 'application/x-ndjson'})
+                self.assertEqual(rv.get_data().count(b'\n'), 2)
+                self.assertEqual(rv.get_json(), [{'b': [1, 2], 'a': u'é'}, {'x': {'b': [1, 2], 'a': u'é'}}])
+
+        # The fragment itself is never decoded
+        self.assertIs(self.doc._value, _undecoded)
+
+    def test_response(self):
+        """ JsonResponse.get_json() decodes the body with fragments lazily """
+        with self.app.test_request_context():
+            rv = JsonResponse({'doc': self.doc})
+            self.assertIs(rv._response_data, _encoded)
+            self.assertEqual(rv.get_json(), {'doc': {'b': [1, 2], 'a': u'é'}})
+
+    def test_raw_json(self):
+        """ RawJSON outside of responses """
+        raw = RawJSON(b'[1]')
+        self.assertEqual(raw, RawJSON(u'[1]'))
+        self.assertEqual(raw.value, [1])
+        with self.app.app_context():
+            self.assertEqual(json.loads(flask.json.dumps({'a': raw})), {'a': [1]})  # decoded with __json__()
+
+        # The client posts fragments
+        with self.app.test_request_context():
+            self.assertEqual(RawJSONSplicer().dumps(get_json_backend('stdlib'), [raw, {'b': raw}]), b'[[1],{"b":[1]}]')
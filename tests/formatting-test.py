@@ -0,0 +1,530 @@
+import gc
+import weakref
+import unittest
+from flask import Flask
+from sqlalchemy import create_engine, event, Column, Integer, String, ForeignKey, inspect, literal_column
+from sqlalchemy.orm import sessionmaker, relationship, joinedload, column_property
+from sqlalchemy.ext.declarative import declarative_base
+
+from flask_jsontools import JsonSerializableBase, DynamicJSONEncoder, FlaskJsonClient, jsonapi, JsonResponse, json_load_options, JsonGraph
+from flask_jsontools.formatting import _JsonSerializationPlan, parse_fieldset, refresh_counters, register_json_schema, json_encoders
+
+
+Base = declarative_base(cls=(JsonSerializableBase,))
+
+
+class User(Base):
+    __tablename__ = 'users'
+    id = Column(Integer, primary_key=True)
+    name = Column(String)
+    password = Column(String)
+
+    articles = relationship('Article', back_populates='author')
+
+    _json_exclude = ['password']
+
+
+class Article(Base):
+    __tablename__ = 'articles'
+    id = Column(Integer, primary_key=True)
+    title = Column(String)
+    author_id = Column(ForeignKey(User.id))
+
+    author = relationship(User, back_populates='articles')
+
+    _json_include = ['author']
+
+
+class Node(Base):
+    __tablename__ = 'nodes'
+    id = Column(Integer, primary_key=True)
+    name = Column(String)
+    secret = Column(String)
+    parent_id = Column(ForeignKey('nodes.id'))
+
+    children = relationship('Node', lazy='joined', join_depth=2)
+
+    _json_schema = {'id': int, 'name': str, 'children': ['Node']}
+
+
+Node._json_schema['children'] = [Node]  # a schema may refer to its own class
+
+
+class Category(Base):
+    __tablename__ = 'categories'
+    id = Column(Integer, primary_key=True)
+    name = Column(String)
+    parent_id = Column(ForeignKey('categories.id'))
+
+    children = relationship('Category')
+
+    _json_include = ['children']
+    _json_depth = {'children': 1}
+
+
+class Point(object):
+    def __init__(self, x, y, node=None):
+        self.x, self.y, self.node = x, y, node
+
+
+class JsonSerializableBaseTest(unittest.TestCase):
+    def setUp(self):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        self.db = db = sessionmaker(bind=engine)()
+        db.add(User(id=1, name='a', password='secret', articles=[Article(id=1, title='x'), Article(id=2, title='y')]))
+        db.commit()
+        db.expunge_all()
+
+    def test_json(self):
+        """ Loaded attributes, _json_include, _json_exclude """
+        db = self.db
+
+        # Transient: all columns
+        self.assertEqual(User(id=2, name='b').__json__(), {'id': 2, 'name': 'b', 'articles': []})
+
+        # Persistent: loaded attributes only
+        user = db.query(User).get(1)
+        self.assertEqual(user.__json__(), {'id': 1, 'name': 'a'})
+        self.assertEqual(user.__json__({'name'}), {'id': 1})
+
+        # Eager loading
+        db.expunge_all()
+        user = db.query(User).options(joinedload(User.articles)).get(1)
+        self.assertEqual(set(user.__json__()), {'id', 'name', 'articles'})
+
+        # _json_include: lazy-loaded relationship
+        article = db.query(Article).get(1)
+        self.assertEqual(article.__json__()['author'], user)
+
+        # Expired: refreshed
+        db.commit()
+        self.assertEqual(inspect(user).unloaded, {'id', 'name', 'password', 'articles'})
+        self.assertEqual(set(user.__json__()), {'id', 'name', 'articles'})
+
+        # Detached: no relationships
+        db.expunge(article)
+        self.assertEqual(article.__json__(), {'id': 1, 'title': 'x', 'author_id': 1})
+
+    def test_plan_cache(self):
+        """ Plans are compiled once per mapper and dropped when the mapper changes """
+        mapper = inspect(User)
+        self.db.query(User).get(1).__json__()
+        plan = _JsonSerializationPlan.get(mapper)
+        self.assertIs(_JsonSerializationPlan.get(mapper), plan)
+        self.assertEqual(plan.keys, {'id', 'name', 'password', 'articles'})
+        self.assertEqual(plan.exclude, {'password'})
+
+        # Invalidate
+        _JsonSerializationPlan.invalidate(mapper)
+        self.assertIsNot(_JsonSerializationPlan.get(mapper), plan)
+        plan = _JsonSerializationPlan.get(mapper)
+        _JsonSerializationPlan.invalidate()
+        self.assertIsNot(_JsonSerializationPlan.get(mapper), plan)
+
+        # Plans don't keep mappers alive
+        def make_model():
+            class Temp(declarative_base(cls=(JsonSerializableBase,))):
+                __tablename__ = 'temp'
+                id = Column(Integer, primary_key=True)
+            Temp(id=1).__json__()
+            return weakref.ref(inspect(Temp))
+        mappers = [make_model() for i in range(3)]
+        gc.collect()
+        self.assertEqual([m() for m in mappers], [None] * 3)
+
+        # Reconfigure: a new property
+        class Tag(Base):
+            __tablename__ = 'tags'
+            id = Column(Integer, primary_key=True)
+        Tag.const = column_property(literal_column('1'))
+        self.assertEqual(Tag(id=1).__json__(), {'id': 1, 'const': None})
+        Tag.const2 = column_property(literal_column('2'))
+        self.assertEqual(Tag(id=1).__json__(), {'id': 1, 'const': None, 'const2': None})
+
+    def test_json_many(self):
+        """ Bulk serialization gives the same result as __json__() """
+        db = self.db
+        db.add_all([User(id=i, name=str(i), password='-') for i in range(2, 10)])
+        db.commit()
+
+        def load_users():
+            """ Load users in mixed states """
+            db.expunge_all()
+            users = db.query(User).order_by(User.id).all()
+            users[1].articles  # loaded relationship
+            db.expire(users[2])  # expired
+            db.expire(users[3], ['name'])  # partially expired
+            db.expunge(users[4])  # detached
+            users.append(User(id=100, name='transient'))
+            return users
+
+        def ids(rows):
+            """ Replace relationships with ids """
+            return [{k: [a.id for a in v] if k == 'articles' else v for k, v in row.items()} for row in rows]
+
+        expected = ids([u.__json__() for u in load_users()])
+        self.assertEqual(ids(User._json_many(load_users())), expected)
+        self.assertEqual(ids(User._json_many(load_users(), {'name'})), [{k: v for k, v in d.items() if k != 'name'} for d in expected])
+
+    def test_default_many(self):
+        """ DynamicJSONEncoder.default_many() takes homogeneous lists only """
+        encoder = DynamicJSONEncoder()
+        users = self.db.query(User).all()
+        self.assertEqual(encoder.default_many(users), [u.__json__() for u in users])
+
+        mixed = users + self.db.query(Article).all()
+        self.assertIs(encoder.default_many(mixed), mixed)
+        self.assertEqual(encoder.default_many([]), [])
+        self.assertEqual(encoder.default_many([1, 2]), [1, 2])
+
+
+class SparseFieldsetTest(unittest.TestCase):
+    def setUp(self):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        self.db = db = sessionmaker(bind=engine)()
+        db.add(User(id=1, name='a', password='secret', articles=[Article(id=1, title='x'), Article(id=2, title='y')]))
+        db.commit()
+        db.expunge_all()
+
+        self.queries = queries = []
+        event.listen(engine, 'before_cursor_execute', lambda conn, cursor, statement, *args: queries.append(statement))
+
+    def test_parse(self):
+        """ parse_fieldset() """
+        self.assertEqual(parse_fieldset('id,title,author.name'), {'id': None, 'title': None, 'author': {'name': None}})
+        self.assertEqual(parse_fieldset(['a.b.c', 'a.d', ' e ']), {'a': {'b': {'c': None}, 'd': None}, 'e': None})
+        self.assertEqual(parse_fieldset('a,a.b'), {'a': None})
+        self.assertEqual(parse_fieldset('a.b,a'), {'a': None})
+        self.assertEqual(parse_fieldset('a,,b.'), {'a': None})
+        self.assertIsNone(parse_fieldset(''))
+        self.assertIsNone(parse_fieldset(None))
+
+    def test_json(self):
+        """ __json__() and _json_many() with a fieldset """
+        db = self.db
+        article = db.query(Article).get(1)
+        self.assertEqual(article.__json__(fields={'id': None, 'author': {'name': None}}), {'id': 1, 'author': {'name': 'a'}})
+        self.assertEqual(article.__json__(fields={'title': None, 'missing': None}), {'title': 'x'})
+
+        # Nested collections
+        db.expunge_all()
+        user = db.query(User).options(joinedload(User.articles)).get(1)
+        self.assertEqual(user.__json__(fields=parse_fieldset('name,articles.title')),
+                         {'name': 'a', 'articles': [{'title': 'x'}, {'title': 'y'}]})
+        self.assertEqual(User._json_many([user], fields=parse_fieldset('articles.id')), [{'articles': [{'id': 1}, {'id': 2}]}])
+
+        # _json_exclude still applies
+        self.assertEqual(user.__json__(fields=parse_fieldset('id,password')), {'id': 1})
+
+    def test_expired(self):
+        """ Expired attributes that are not requested are not refreshed """
+        db = self.db
+        articles = db.query(Article).order_by(Article.id).all()
+        for article in articles:
+            db.expire(article, ['title'])
+        del self.queries[:]
+
+        self.assertEqual(Article._json_many(articles, fields={'id': None}), [{'id': 1}, {'id': 2}])
+        self.assertEqual(articles[0].__json__(fields={'id': None}), {'id': 1})
+        self.assertEqual(len(self.queries), 0)
+
+        # Requested expired attributes are refreshed
+        db.expire_all()
+        self.assertEqual(Article._json_many(articles, fields={'title': None}), [{'title': 'x'}, {'title': 'y'}])
+        self.assertEqual(len(self.queries), 2)
+
+    def test_response(self):
+        """ ?fields= with JSONTOOLS_FIELDS_ARG, and JsonResponse(fields=) """
+        app = Flask(__name__)
+        app.test_client_class = FlaskJsonClient
+        app.json_encoder = DynamicJSONEncoder
+        app.config['JSONTOOLS_FIELDS_ARG'] = 'fields'
+        db = self.db
+
+        @app.route('/articles')
+        @jsonapi
+        def articles():
+            return db.query(Article).order_by(Article.id).all()
+
+        @app.route('/article')
+        @jsonapi
+        def article():
+            return {'article': db.query(Article).get(1), 'total': 1}
+
+        @app.route('/fixed')
+        @jsonapi
+        def fixed():
+            return JsonResponse(db.query(Article).get(1), fields='id')
+
+        with app.test_client() as c:
+            self.assertEqual(c.get('/articles?fields=id,author.name').get_json(),
+                             [{'id': 1, 'author': {'name': 'a'}}, {'id': 2, 'author': {'name': 'a'}}])
+            self.assertEqual(c.get('/articles?fields=id,author').get_json(),  # the whole author
+                             [{'id': 1, 'author': {'id': 1, 'name': 'a'}}, {'id': 2, 'author': {'id': 1, 'name': 'a'}}])
+            self.assertEqual(c.get('/article?fields=id,author').get_json(),
+                             {'article': {'id': 1, 'author': {'id': 1, 'name': 'a'}}, 'total': 1})
+            self.assertEqual(c.get('/articles?fields=id&fields=title').get_json(),
+                             [{'id': 1, 'title': 'x'}, {'id': 2, 'title': 'y'}])
+            self.assertEqual(c.get('/article?fields=title').get_json(), {'article': {'title': 'x'}, 'total': 1})
+            self.assertEqual(c.get('/fixed?fields=title').get_json(), {'id': 1})
+            self.assertEqual(set(c.get('/article').get_json()['article']), {'id', 'title', 'author_id', 'author'})
+
+            # Disabled
+            app.config['JSONTOOLS_FIELDS_ARG'] = None
+            self.assertEqual(set(c.get('/article?fields=title').get_json()['article']), {'id', 'title', 'author_id', 'author'})
+
+
+class BulkRefreshTest(unittest.TestCase):
+    def setUp(self):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        self.db = db = sessionmaker(bind=engine)()
+        db.add_all([User(id=i, name=str(i), password='-', articles=[Article(id=i, title='t{}'.format(i))])
+                    for i in range(1, 21)])
+        db.commit()
+        db.expunge_all()
+
+        self.queries = queries = []
+        event.listen(engine, 'before_cursor_execute', lambda conn, cursor, statement, *args: queries.append(statement))
+
+    def load_expired(self):
+        """ Load users with their articles, then expire them all, like a commit does """
+        db = self.db
+        db.expunge_all()
+        users = db.query(User).options(joinedload(User.articles)).order_by(User.id).all()
+        db.expire_all()
+        del self.queries[:]
+        return users
+
+    def test_refresh(self):
+        """ Expired instances are refreshed with a query per mapper """
+        def ids(rows):
+            return [{k: [a.id for a in v] if k == 'articles' else v for k, v in row.items()} for row in rows]
+
+        # One by one: a query per instance
+        expected = ids([u.__json__() for u in self.load_expired()])
+        self.assertEqual(len(self.queries), 20)
+
+        # In bulk: one query for users, one for their articles
+        refresh_counters.clear()
+        self.assertEqual(ids(User._json_many(self.load_expired(), refresh_expired=True)), expected)
+        self.assertEqual(len(self.queries), 2)
+        self.assertEqual(refresh_counters, {'queries': 2, 'instances': 20})
+
+        # Chunks
+        self.assertEqual(User._json_refresh_expired(self.load_expired(), chunk_size=7), 6)
+        self.assertEqual(len(self.queries), 6)
+
+        # Nothing to refresh
+        users = self.load_expired()
+        User._json_many(users, refresh_expired=True)
+        del self.queries[:]
+        self.assertEqual(User._json_refresh_expired(users), 0)
+        self.assertEqual(len(self.queries), 0)
+
+    def test_fieldset(self):
+        """ Instances are only refreshed when requested attributes are expired """
+        users = self.load_expired()
+        self.assertEqual(User._json_many(users, fields={'name': None}, refresh_expired=True), [{'name': str(i)} for i in range(1, 21)])
+        self.assertEqual(len(self.queries), 1)  # no articles
+
+    def test_response(self):
+        """ JSONTOOLS_REFRESH_EXPIRED """
+        app = Flask(__name__)
+        app.test_client_class = FlaskJsonClient
+        app.json_encoder = DynamicJSONEncoder
+        app.config['JSONTOOLS_REFRESH_EXPIRED'] = True
+
+        @app.route('/users')
+        @jsonapi
+        def users():
+            return JsonResponse(self.load_expired(), fields='id,articles.title')
+
+        with app.test_client() as c:
+            rv = c.get('/users')
+            self.assertEqual(rv.get_json()[0], {'id': 1, 'articles': [{'title': 't1'}]})
+            self.assertEqual(len(self.queries), 2)
+
+
+class LoadOptionsTest(unittest.TestCase):
+    def setUp(self):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        self.db = db = sessionmaker(bind=engine)()
+        db.add_all([User(id=i, name=str(i), password='-', articles=[Article(id=i * 10 + j, title='t') for j in range(3)])
+                    for i in range(1, 6)])
+        db.commit()
+        db.expunge_all()
+
+        self.queries = queries = []
+        event.listen(engine, 'before_cursor_execute', lambda conn, cursor, statement, *args: queries.append(statement))
+
+    def serialize(self, model, options, fields=None):
+        """ Load and serialize all rows, return the number of queries """
+        self.db.expunge_all()
+        del self.queries[:]
+        rows = self.db.query(model).options(*options).all()
+        rv = model._json_many(rows, fields=parse_fieldset(fields))
+        return rv, len(self.queries)
+
+    def test_include(self):
+        """ _json_include relationships are eagerly loaded, _json_exclude columns are not loaded """
+        expected, queries = self.serialize(Article, [])
+        self.assertEqual(queries, 1 + 5)  # lazy-loaded authors
+        self.assertEqual(set(expected[0]['author'].__json__()), {'id', 'name'})
+
+        rv, queries = self.serialize(Article, json_load_options(Article))
+        self.assertEqual(queries, 1)
+        self.assertEqual([{k: v.id if k == 'author' else v for k, v in row.items()} for row in rv],
+                         [{k: v.id if k == 'author' else v for k, v in row.items()} for row in expected])
+        self.assertNotIn('password', rv[0]['author'].__dict__)  # load_only()
+
+    def test_fields(self):
+        """ Sparse fieldsets """
+        fields = 'name,articles.title,articles.author.name'
+        rv, queries = self.serialize(User, json_load_options(User, fields), fields)
+        self.assertEqual(queries, 2)  # users, articles: author is the same user
+        self.assertEqual(rv[0], {'name': '1', 'articles': [{'title': 't', 'author': {'name': '1'}}] * 3})
+
+        # Only requested columns are loaded
+        self.db.expunge_all()
+        user = self.db.query(User).options(*json_load_options(User, 'name')).first()
+        self.assertEqual(set(inspect(user).unloaded), {'password', 'articles'})
+
+        # Only relationships
+        self.db.expunge_all()
+        article = self.db.query(Article).options(*json_load_options(Article, 'author')).first()
+        self.assertEqual(set(inspect(article).unloaded), {'title'})  # author_id is needed for the relationship
+
+    def test_cycles(self):
+        """ Cycles and depth """
+        # The cycle is not followed: articles.author is the user being loaded
+        options = json_load_options(User, 'articles.author.articles.author')
+        self.assertEqual(len(options), 2)  # load_only(), selectinload(articles)
+
+        # max_depth
+        self.assertEqual(len(json_load_options(Article)), 1)  # joinedload(author)
+        self.assertEqual(len(json_load_options(Article, max_depth=0)), 0)
+        self.assertEqual(len(json_load_options(User, 'articles', max_depth=0)), 1)
+
+
+class CompiledSchemaTest(unittest.TestCase):
+    def setUp(self):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        self.db = db = sessionmaker(bind=engine)()
+        db.add(Node(id=1, name='root', secret='-', children=[Node(id=2, name='a', secret='-'), Node(id=3, name='b')]))
+        db.commit()
+        db.expunge_all()
+
+    def test_json(self):
+        """ __json__() uses the compiled encoder """
+        root = self.db.query(Node).get(1)
+        expected = {'id': 1, 'name': 'root', 'children': [{'id': 2, 'name': 'a', 'children': []},
+                                                          {'id': 3, 'name': 'b', 'children': []}]}
+        self.assertEqual(root.__json__(), expected)
+        self.assertEqual(json_encoders[Node].__name__, 'encode_Node')
+
+        # Other arguments fall back to the dynamic serialization
+        self.assertEqual(root.__json__(fields=parse_fieldset('name')), {'name': 'root'})
+        self.assertEqual(root.__json__({'children'}), {'id': 1, 'name': 'root'})
+        self.assertEqual(root.__json__(fields=parse_fieldset('name,secret')), {'name': 'root'})  # only schema keys
+        self.assertEqual(Node._json_many([root], fields=parse_fieldset('id,children.name')),
+                         [{'id': 1, 'children': [{'name': 'a'}, {'name': 'b'}]}])
+
+        # Encoder
+        encoder = DynamicJSONEncoder()
+        self.assertEqual(encoder.default(root), expected)
+        self.assertEqual(encoder.default_many([root]), [expected])
+        encoder.fields = parse_fieldset('id')
+        self.assertEqual(encoder.default(root), {'id': 1})
+
+    def test_register(self):
+        """ register_json_schema() for any class """
+        register_json_schema(Point, ('x', 'y'))
+        self.assertEqual(DynamicJSONEncoder().default(Point(1, 2)), {'x': 1, 'y': 2})
+
+        # Nested
+        register_json_schema(Point, {'x': None, 'y': None, 'node': Node})
+        node = Node(id=10, name='n')
+        self.assertEqual(DynamicJSONEncoder().default(Point(1, 2, node)), {'x': 1, 'y': 2, 'node': {'id': 10, 'name': 'n', 'children': []}})
+        self.assertEqual(DynamicJSONEncoder().default(Point(1, 2)), {'x': 1, 'y': 2, 'node': None})
+
+        # Response
+        app = Flask(__name__)
+        app.json_encoder = DynamicJSONEncoder
+        with app.test_request_context():
+            self.assertEqual(JsonResponse([Point(1, 2), Point(3, 4)]).get_data(),
+                             b'[{"node":null,"x":1,"y":2},{"node":null,"x":3,"y":4}]')
+
+        with self.assertRaises(ValueError):
+            register_json_schema(Point, ['x', 'import'])
+
+
+class JsonGraphTest(unittest.TestCase):
+    def setUp(self):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        self.db = db = sessionmaker(bind=engine)()
+        db.add(User(id=1, name='a', password='secret', articles=[Article(id=1, title='x'), Article(id=2, title='y')]))
+        db.add(Category(id=1, name='root', children=[Category(id=2, name='a', children=[Category(id=3, name='b')])]))
+        db.commit()
+        db.expunge_all()
+
+    def test_cycles(self):
+        """ Bidirectional relationships are serialized once, and then referenced """
+        user = self.db.query(User).options(joinedload(User.articles)).get(1)  # article.author is the user
+        self.assertEqual(JsonGraph().serialize(user), {'id': 1, 'name': 'a', 'articles': [
+            {'id': 1, 'title': 'x', 'author_id': 1, 'author': {'id': 1}},
+            {'id': 2, 'title': 'y', 'author_id': 1, 'author': {'id': 1}},
+        ]})
+
+        # Sparse fieldsets
+        self.assertEqual(JsonGraph().serialize(user, fields=parse_fieldset('articles.author.name')),
+                         {'articles': [{'author': {'id': 1}}, {'author': {'id': 1}}]})
+
+    def test_depth(self):
+        """ max_depth """
+        user = self.db.query(User).options(joinedload(User.articles)).get(1)
+        self.assertEqual(JsonGraph(max_depth=0).serialize(user), {'id': 1, 'name': 'a', 'articles': [{'id': 1}, {'id': 2}]})
+        self.assertEqual(JsonGraph(max_depth=1).serialize(user)['articles'][0], {'id': 1, 'title': 'x', 'author_id': 1, 'author': {'id': 1}})
+
+        # Per-relationship limits
+        root = self.db.query(Category).get(1)
+        self.assertEqual(root.__json__(), {'id': 1, 'name': 'root', 'parent_id': None, 'children': [
+            {'id': 2, 'name': 'a', 'parent_id': 1, 'children': [{'id': 3}]},
+        ]})
+        self.assertEqual(JsonGraph(max_depth=0).serialize(root)['children'], [{'id': 2}])  # only lowers the limit
+
+    def test_deduplicate(self):
+        """ Objects are serialized once per graph """
+        articles = self.db.query(Article).order_by(Article.id).all()
+        encoder = DynamicJSONEncoder()
+        encoder.deduplicate = True
+        self.assertEqual(encoder.default_many(articles), [
+            {'id': 1, 'title': 'x', 'author_id': 1, 'author': {'id': 1, 'name': 'a'}},
+            {'id': 2, 'title': 'y', 'author_id': 1, 'author': {'id': 1}},
+        ])
+
+        # Top-level items are never references, even if they were nested in an earlier item
+        categories = self.db.query(Category).filter(Category.id < 3).order_by(Category.id).all()
+        encoder = DynamicJSONEncoder()
+        encoder.deduplicate = True
+        self.assertEqual(encoder.default_many(categories), [
+            {'id': 1, 'name': 'root', 'parent_id': None, 'children': [
+                {'id': 2, 'name': 'a', 'parent_id': 1, 'children': [{'id': 3}]},
+            ]},
+            {'id': 2, 'name': 'a', 'parent_id': 1, 'children': [{'id': 3, 'name': 'b', 'parent_id': 2, 'children': []}]},
+        ])
+
+        # Per response
+        app = Flask(__name__)
+        app.json_encoder = DynamicJSONEncoder
+        app.config['JSONTOOLS_DEDUPLICATE'] = True
+        with app.test_request_context():
+            for i in range(2):
+                self.assertEqual(JsonResponse(articles, keep_data=False).get_json()[0]['author'], {'id': 1, 'name': 'a'})
+            app.config['JSONTOOLS_MAX_DEPTH'] = 0
+            self.assertEqual(JsonResponse({'article': articles[0]}, keep_data=False).get_json(), {'article': {'id': 1, 'title': 'x', 'author_id': 1, 'author': {'id': 1}}})
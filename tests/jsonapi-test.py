@@ -1,8 +1,11 @@
 import unittest
+import weakref
+from datetime import datetime
 from flask import Flask, request, Response
 from werkzeug.exceptions import NotFound
 
-from flask_jsontools import jsonapi, FlaskJsonClient, JsonResponse, make_json_response
+from flask_jsontools import jsonapi, FlaskJsonClient, JsonResponse, JsonTools, make_json_response
+from flask_jsontools.response import _json_encoder
 
 
 class TestJsonApi(unittest.TestCase):
@@ -113,3 +116,235 @@ class TestJsonApi(unittest.TestCase):
             self.assertEqual(rv.status_code, 200)
             self.assertIsInstance(rv, JsonResponse)
             self.assertEqual(rv.get_json(), True)
+
+
+class TestConditional(unittest.TestCase):
+    def setUp(self):
+        self.app = app = Flask(__name__)
+        app.debug = app.testing = True
+        app.test_client_class = FlaskJsonClient
+
+        self.calls = calls = []
+        self.version = {'v': 'v1'}
+        modified = datetime(2020, 1, 1)
+
+        @app.route('/hashed')
+        @jsonapi
+        def hashed():
+            calls.append('hashed')
+            return JsonResponse({'a': 1}, etag=True)
+
+        @app.route('/versioned/<int:id>')
+        @jsonapi(etag=lambda id: '{}-{}'.format(id, self.version['v']), last_modified=lambda id: modified)
+        def versioned(id):
+            calls.append('versioned')
+            return {'id': id}
+
+        @app.route('/error')
+        @jsonapi(etag=lambda: 'v1')
+        def error():
+            return {'error': 'Denied'}, 403
+
+    def test_body_hash(self):
+        with self.app.test_client() as c:
+            rv = c.get('/hashed')
+            self.assertEqual(rv.status_code, 200)
+            etag = rv.headers['ETag']
+
+            rv = c.get('/hashed', headers={'If-None-Match': etag})
+            self.assertEqual(rv.status_code, 304)
+            self.assertEqual(rv.get_data(), b'')
+
+            rv = c.get('/hashed', headers={'If-None-Match': '"other"'})
+            self.assertEqual(rv.status_code, 200)
+            self.assertEqual(rv.get_json(), {'a': 1})
+
+    def test_config(self):
+        self.app.config['JSONTOOLS_ETAG'] = True
+        with self.app.test_client() as c:
+            rv = c.get('/versioned/1')
+            self.assertEqual(rv.headers['ETag'], '"1-v1"')  # the view-supplied version wins
+            rv = c.get('/error')
+            self.assertEqual(rv.status_code, 403)
+            self.assertNotIn('ETag', rv.headers)
+
+    def test_skip_view(self):
+        """ The view is not called when the client's copy is valid """
+        with self.app.test_client() as c:
+            rv = c.get('/versioned/1')
+            self.assertEqual(rv.status_code, 200)
+            self.assertEqual(rv.headers['ETag'], '"1-v1"')
+            self.assertEqual(rv.headers['Last-Modified'], 'Wed, 01 Jan 2020 00:00:00 GMT')
+            self.assertEqual(self.calls, ['versioned'])
+
+            # ETag
+            rv = c.get('/versioned/1', headers={'If-None-Match': '"1-v1"'})
+            self.assertEqual(rv.status_code, 304)
+            self.assertEqual(self.calls, ['versioned'])
+
+            # Last-Modified
+            rv = c.get('/versioned/1', headers={'If-Modified-Since': 'Wed, 01 Jan 2020 00:00:00 GMT'})
+            self.assertEqual(rv.status_code, 304)
+            self.assertEqual(self.calls, ['versioned'])
+
+            # New version
+            self.version['v'] = 'v2'
+            rv = c.get('/versioned/1', headers={'If-None-Match': '"1-v1"'})
+            self.assertEqual(rv.status_code, 200)
+            self.assertEqual(rv.get_json(), {'id': 1})
+            self.assertEqual(self.calls, ['versioned', 'versioned'])
+
+
+class TestKeepData(unittest.TestCase):
+    def test_keep_data(self):
+        """ JsonResponse(keep_data=False) releases the data after encoding """
+        class Data(dict):
+            pass
+
+        app = Flask(__name__)
+        with app.test_request_context():
+            data = Data(a=1)
+            rv = JsonResponse(data)
+            self.assertIs(rv.get_json(), data)
+
+            data = Data(a=1)
+            ref = weakref.ref(data)
+            rv = JsonResponse(data, keep_data=False)
+            del data
+            self.assertIsNone(ref())
+            self.assertEqual(rv.get_json(), {'a': 1})  # decoded from the body
+
+            app.config['JSONTOOLS_KEEP_RESPONSE_DATA'] = False
+            rv = JsonResponse([1, 2])
+            self.assertEqual(rv.get_json(), [1, 2])
+            self.assertEqual(rv.get_data(), b'[1,2]')
+
+
+class TestJsonTools(unittest.TestCase):
+    def setUp(self):
+        self.app = app = Flask(__name__)
+        app.test_client_class = FlaskJsonClient
+
+        @app.route('/data')
+        @jsonapi
+        def data():
+            return {'a': [1, 2]}
+
+    def test_pretty(self):
+        """ Pretty-print predicates """
+        app = self.app
+        with app.test_client() as c:
+            self.assertEqual(c.get('/data?pretty').get_data(), b'{"a":[1,2]}')
+
+            # Query argument
+            app.config['JSONTOOLS_PRETTY_ARG'] = 'pretty'
+            self.assertEqual(c.get('/data?pretty').get_data(), b'{\n  "a": [\n    1,\n    2\n  ]\n}')
+            self.assertEqual(c.get('/data').get_data(), b'{"a":[1,2]}')
+
+            # Flask setting: not for XMLHttpRequest
+            del app.config['JSONTOOLS_PRETTY_ARG']
+            app.config['JSONIFY_PRETTYPRINT_REGULAR'] = True
+            self.assertIn(b'\n', c.get('/data').get_data())
+            self.assertEqual(c.get('/data', headers={'X-Requested-With': 'XMLHttpRequest'}).get_data(), b'{"a":[1,2]}')
+
+            # Explicit predicate
+            JsonTools(app, pretty=lambda: request.args.get('format') == 'pretty')
+            self.assertIn(b'\n', c.get('/data?format=pretty').get_data())
+            self.assertEqual(c.get('/data').get_data(), b'{"a":[1,2]}')
+
+    def test_init_app(self):
+        """ Settings are resolved once per app """
+        app = self.app
+        app.config['JSONTOOLS_ETAG'] = True
+        jsontools = JsonTools()
+        settings = jsontools.init_app(app)
+        self.assertIs(app.extensions['jsontools'], settings)
+
+        with app.test_request_context():
+            rv1, rv2 = JsonResponse({'a': 1}), JsonResponse({'a': 2})
+            self.assertIn('ETag', rv1.headers)
+            self.assertIs(_json_encoder(None, rv1._settings), _json_encoder(None, rv2._settings))  # shared
+            self.assertIsNot(_json_encoder({'a': None}, rv1._settings), settings.encoder)
+
+            # Config changes apply after init_app()
+            app.config['JSONTOOLS_ETAG'] = False
+            self.assertIn('ETag', JsonResponse({'a': 1}).headers)
+            jsontools.init_app(app)
+            self.assertNotIn('ETag', JsonResponse({'a': 1}).headers)
+
+
+class TestLazy(unittest.TestCase):
+    def setUp(self):
+        self.encoded = encoded = []
+
+        class CountingJsonResponse(JsonResponse):
+            def encode_response_data(self, data, **kwargs):
+                encoded.append(data)
+                return super(CountingJsonResponse, self).encode_response_data(data, **kwargs)
+
+        self.app = app = Flask(__name__)
+        app.test_client_class = FlaskJsonClient
+        app.config['JSONTOOLS_LAZY_ENCODING'] = True
+
+        @app.route('/data')
+        @jsonapi
+        def data():
+            return CountingJsonResponse({'a': 1}, etag=True)
+
+        @app.route('/versioned')
+        @jsonapi(etag=lambda: 'v1')
+        def versioned():
+            return CountingJsonResponse({'a': 1}, etag=True)
+
+        self.after_request = []
+
+        @app.after_request
+        def after_request(rv):
+            self.after_request.append(rv.encoded)
+            if request.args.get('replace'):
+                return Response('replaced')
+            if request.args.get('b'):
+                rv['b'] = int(request.args['b'])
+            return rv
+
+    def test_lazy(self):
+        """ The body is encoded when served """
+        with self.app.test_client() as c:
+            rv = c.get('/data?b=2')
+            self.assertEqual(rv.get_json(), {'a': 1, 'b': 2})  # changed after the view
+            self.assertEqual(rv.headers['Content-Length'], str(len(rv.get_data())))
+            self.assertIn('ETag', rv.headers)
+            self.assertEqual(len(self.encoded), 1)
+
+            # Replaced: never encoded
+            rv = c.get('/data?replace=1')
+            self.assertEqual(rv.get_data(), b'replaced')
+            self.assertEqual(len(self.encoded), 1)
+
+            # Not modified: never encoded
+            rv = c.get('/versioned?b=2')
+            self.assertEqual(rv.headers['ETag'], '"v1"')  # the view-supplied version wins
+            self.assertEqual(rv.get_json(), {'a': 1, 'b': 2})
+            self.assertEqual(len(self.encoded), 2)
+            self.assertEqual(self.after_request, [False] * 3)  # @jsonapi(etag=) does not encode
+            rv = c.get('/versioned', headers={'If-None-Match': '"v1"'})
+            self.assertEqual(rv.status_code, 304)
+            self.assertEqual(len(self.encoded), 2)
+
+    def test_mutation(self):
+        """ The data can be changed until it's encoded """
+        with self.app.test_request_context():
+            rv = JsonResponse({'a': 1})
+            self.assertFalse(rv.encoded)
+            rv['b'] = 2
+            rv.set_json(dict(rv.get_json(), c=3))
+            self.assertEqual(rv.get_data(), b'{"a":1,"b":2,"c":3}')
+            self.assertTrue(rv.encoded)
+            with self.assertRaises(RuntimeError):
+                rv['d'] = 4
+
+            # Eager
+            rv = JsonResponse([1], lazy=False)
+            self.assertTrue(rv.encoded)
+            with self.assertRaises(RuntimeError):
+                rv.set_json([2])
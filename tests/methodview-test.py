@@ -1,7 +1,8 @@
 import unittest
 from functools import wraps
 from flask import Flask
-from flask_jsontools import jsonapi, FlaskJsonClient
+from werkzeug.exceptions import NotFound
+from flask_jsontools import jsonapi, FlaskJsonClient, get_json_body
 from flask_jsontools import MethodView, methodview, RestfulView
 
 
@@ -131,6 +132,20 @@ class ViewsTest(unittest.TestCase):
         # Correctly wrapped with @wraps
         self.assertEqual(RestView.custom.__name__, 'custom')
 
+    def test_method_view_no_wrapper(self):
+        """ @methodview marks the function itself; shared functions are copied """
+        def f(self): pass
+        self.assertIs(methodview('GET')(f), f)
+        g = methodview('POST')(f)
+        self.assertIsNot(g, f)
+        self.assertEqual(f._methodview.methods, {'GET'})
+        self.assertEqual(g._methodview.methods, {'POST'})
+        self.assertFalse(hasattr(f._methodview, '__dict__'))  # __slots__
+
+        # One function used for two views
+        self.assertIsNot(RestfulView_Upsert.create, RestfulView_Upsert.update)
+        self.assertIsNone(getattr(RestfulView_Upsert.upsert, '_methodview', None))
+
     def test_method_view(self):
         """ Test MethodView(), low-level testing """
         self.assertTrue(CrudView.list._methodview.matches('GET', {'a'}))
@@ -185,3 +200,167 @@ class ViewsTest(unittest.TestCase):
         """ Test RestfulView with upsert """
         self._testRequest('POST', '/upsert/', 200, 'upsert(None)')
         self._testRequest('POST', '/upsert/1', 200, 'upsert(1)')
+
+
+class DispatchTest(unittest.TestCase):
+    def test_most_specific(self):
+        """ The most specific view wins, regardless of names """
+        class View(MethodView):
+            @methodview('GET')
+            def a_any(self, **kw): pass
+
+            @methodview('GET', ifset='id')
+            def b_item(self, **kw): pass
+
+            @methodview('GET', ifset=('id', 'sub'))
+            def c_subitem(self, **kw): pass
+
+            @methodview('GET', ifset='id', ifnset='sub')
+            def d_item_only(self, **kw): pass
+
+        view = View()
+        self.assertEqual(view._match_view('get', {}).__name__, 'a_any')
+        self.assertEqual(view._match_view('GET', {'id': None, 'other': 1}).__name__, 'a_any')
+        self.assertEqual(view._match_view('GET', {'id': 1}).__name__, 'd_item_only')
+        self.assertEqual(view._match_view('GET', {'id': 1, 'sub': 2}).__name__, 'c_subitem')
+        self.assertIsNone(view._match_view('POST', {}))
+
+        # Memoized by signature
+        self.assertEqual(set(View._dispatch['GET']._index), {frozenset(), frozenset(['id']), frozenset(['id', 'sub'])})
+
+    def test_ambiguous(self):
+        """ Ambiguous views are reported when the class is created """
+        def define_same_conditions():
+            class View(MethodView):
+                @methodview('GET', ifset='id')
+                def a(self, id): pass
+
+                @methodview('GET', ifset='id')
+                def b(self, id): pass
+        self.assertRaises(TypeError, define_same_conditions)
+
+        def define_incomparable():
+            class View(MethodView):
+                @methodview('GET', ifset='a')
+                def a(self, **kw): pass
+
+                @methodview('GET', ifset='b')
+                def b(self, **kw): pass
+            return View
+        self.assertRaises(TypeError, define_incomparable)
+
+        # Resolved by a more specific view
+        class View(MethodView):
+            @methodview('GET', ifset='a')
+            def a(self, **kw): pass
+
+            @methodview('GET', ifset='b')
+            def b(self, **kw): pass
+
+            @methodview('GET', ifset=('a', 'b'))
+            def ab(self, **kw): pass
+        self.assertEqual(View()._match_view('GET', {'a': 1, 'b': 1}).__name__, 'ab')
+
+
+class BatchTest(unittest.TestCase):
+    def setUp(self):
+        self.app = app = Flask(__name__)
+        app.test_client_class = FlaskJsonClient
+        app.debug = app.testing = True
+
+        self.items = items = {1: 'a', 2: 'b'}
+        self.calls = calls = []
+
+        class ItemView(RestfulView):
+            decorators = (jsonapi,)
+            primary_key = ('id',)
+            batch_route = '/batch'
+
+            def list(self):
+                return items
+
+            def create(self):
+                calls.append('create')
+                id = max(items) + 1
+                items[id] = get_json_body()
+                return {'id': id}, 201
+
+            def update(self, id):
+                calls.append('update')
+                if id not in items:
+                    raise NotFound('No item {}'.format(id))
+                items[id] = get_json_body()
+                return {'id': id}
+
+            def delete(self, id):
+                calls.append('delete')
+                return items.pop(id)
+
+        class BulkItemView(ItemView):
+            def create_many(self, datas):
+                calls.append('create_many')
+                ids = []
+                for data in datas:
+                    ids.append(max(items) + 1)
+                    items[ids[-1]] = data
+                return [({'id': id}, 201) for id in ids]
+
+            def delete_many(self, pks):
+                calls.append('delete_many')
+                return [items.pop(pk['id'], None) for pk in pks]
+
+        ItemView.route_as_view(app, 'items', ('/items/', '/items/<int:id>'))
+        BulkItemView.route_as_view(app, 'bulk', ('/bulk/', '/bulk/<int:id>'))
+
+    def batch(self, url, ops):
+        with self.app.test_client() as c:
+            return c.post(url, json=ops)
+
+    def test_fallback(self):
+        """ Batch operations fall back to single-item methods """
+        rv = self.batch('/items/batch', [
+            {'op': 'create', 'data': 'c'},
+            {'op': 'create', 'data': 'd'},
+            {'op': 'update', 'pk': 1, 'data': 'A'},
+            {'op': 'update', 'pk': {'id': 99}, 'data': 'Z'},
+            {'op': 'delete', 'pk': 2},
+        ])
+        self.assertEqual(rv.status_code, 200)
+        self.assertEqual(rv.get_json(), [
+            {'status': 201, 'data': {'id': 3}},
+            {'status': 201, 'data': {'id': 4}},
+            {'status': 200, 'data': {'id': 1}},
+            {'status': 404, 'error': 'No item 99'},
+            {'status': 200, 'data': 'b'},
+        ])
+        self.assertEqual(self.items, {1: 'A', 3: 'c', 4: 'd'})
+        self.assertEqual(self.calls, ['create', 'create', 'update', 'update', 'delete'])
+
+        # Regular routes still work
+        with self.app.test_client() as c:
+            self.assertEqual(c.get('/items/').get_json(), {'1': 'A', '3': 'c', '4': 'd'})
+            self.assertEqual(c.delete('/items/1').get_json(), 'A')
+            self.assertEqual(c.get('/items/batch').status_code, 405)
+
+    def test_bulk_hooks(self):
+        """ Consecutive operations go to <op>_many() hooks """
+        rv = self.batch('/bulk/batch', [
+            {'op': 'create', 'data': 'c'},
+            {'op': 'create', 'data': 'd'},
+            {'op': 'update', 'pk': 1, 'data': 'A'},
+            {'op': 'delete', 'pk': 2},
+            {'op': 'delete', 'pk': 3},
+            {'op': 'create', 'data': 'e'},
+        ])
+        self.assertEqual([r['status'] for r in rv.get_json()], [201, 201, 200, 200, 200, 201])
+        self.assertEqual(self.items, {1: 'A', 4: 'd', 5: 'e'})
+        self.assertEqual(self.calls, ['create_many', 'update', 'delete_many', 'create_many'])
+
+    def test_invalid(self):
+        """ Invalid batches are rejected as a whole """
+        for ops in ({'op': 'create'}, [{'op': 'nope'}], [{'op': 'update', 'data': 1}], [{'op': 'delete', 'pk': {'x': 1}}]):
+            self.assertEqual(self.batch('/items/batch', ops).status_code, 400, ops)
+        self.assertEqual(self.calls, [])
+
+        self.app.view_functions['items'].view_class.max_batch_size = 1
+        self.assertEqual(self.batch('/items/batch', [{'op': 'delete', 'pk': 1}] * 2).status_code, 413)
@@ -0,0 +1,154 @@
+import uuid
+import unittest
+import datetime
+from decimal import Decimal
+from flask import Flask
+from sqlalchemy import create_engine, event, Column, Integer, String, DateTime
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.declarative import declarative_base
+
+from flask_jsontools import jsonapi, FlaskJsonClient, DynamicJSONEncoder, JsonSerializableBase, RestfulView
+from flask_jsontools.pagination import encode_cursor, decode_cursor, keyset_page, iter_keyset
+
+
+Base = declarative_base(cls=(JsonSerializableBase,))
+
+
+class User(Base):
+    __tablename__ = 'users'
+    id = Column(Integer, primary_key=True)
+    name = Column(String)
+    age = Column(Integer)
+    created = Column(DateTime)
+
+
+class PaginationTest(unittest.TestCase):
+    def setUp(self):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        self.db = db = sessionmaker(bind=engine)()
+        db.add_all([User(id=i, name='user{}'.format(i), age=i % 3,
+                         created=datetime.datetime(2020, 1, 1) + datetime.timedelta(seconds=i // 3)) for i in range(1, 26)])
+        db.commit()
+
+        self.queries = queries = []
+        event.listen(engine, 'before_cursor_execute', lambda conn, cursor, statement, *args: queries.append(statement))
+
+        self.app = app = Flask(__name__)
+        app.debug = app.testing = True
+        app.test_client_class = FlaskJsonClient
+        app.json_encoder = DynamicJSONEncoder
+
+        class UserView(RestfulView):
+            decorators = (jsonapi,)
+            primary_key = ('id',)
+            page_size = 10
+            max_page_size = 20
+
+            def list(self):
+                return self.paginate(db.query(User))
+
+            def get(self, id):
+                return db.query(User).get(id)
+
+        class AgeView(UserView):
+            ordering = ('-age', 'id')
+
+        class ExportView(UserView):
+            def list(self):
+                return self.export(db.query(User))
+
+        UserView.route_as_view(app, 'users', ('/users/', '/users/<int:id>'))
+        AgeView.route_as_view(app, 'ages', ('/ages/', '/ages/<int:id>'))
+        ExportView.route_as_view(app, 'export', ('/export/', '/export/<int:id>'))
+
+    def test_cursor(self):
+        """ Cursors """
+        cursor = encode_cursor([1, 'a'])
+        self.assertRegex(cursor, r'^[\w-]+$')
+        self.assertEqual(decode_cursor(cursor), [1, 'a'])
+        for invalid in ('!', 'Zm9v', encode_cursor({'a': 1})):
+            with self.assertRaises(Exception) as e:
+                decode_cursor(invalid)
+            self.assertEqual(e.exception.code, 400)
+        with self.assertRaises(Exception):
+            decode_cursor(cursor, 1)
+
+        # Typed values
+        values = [datetime.datetime(2020, 1, 2, 3, 4, 5, 6), datetime.date(2020, 1, 2), datetime.time(3, 4),
+                  Decimal('1.50'), uuid.UUID(int=1), None]
+        self.assertEqual(decode_cursor(encode_cursor(values)), values)
+        with self.assertRaises(Exception) as e:
+            decode_cursor(encode_cursor([{'date': 'x'}]))
+        self.assertEqual(e.exception.code, 400)
+
+    def test_keyset_page(self):
+        """ keyset_page() and iter_keyset() """
+        query = self.db.query(User).order_by(User.name)  # ordering is replaced
+        items, cursor = keyset_page(query, 'id', limit=10)
+        self.assertEqual([u.id for u in items], list(range(1, 11)))
+        items, cursor = keyset_page(query, 'id', cursor, limit=10)
+        self.assertEqual([u.id for u in items], list(range(11, 21)))
+        items, cursor = keyset_page(query, 'id', cursor, limit=10)
+        self.assertEqual([u.id for u in items], list(range(21, 26)))
+        self.assertIsNone(cursor)
+
+        # Mixed directions
+        expected = sorted(range(1, 26), key=lambda i: (-(i % 3), i))
+        self.assertEqual([u.id for u in iter_keyset(query, ('-age', 'id'), chunk_size=4)], expected)
+
+        # Timestamps, with ties
+        expected = sorted(range(1, 26), key=lambda i: (i // 3, i))
+        self.assertEqual([u.id for u in iter_keyset(query, ('created', 'id'), chunk_size=1)], expected)
+        self.assertEqual([u.id for u in iter_keyset(query, ('-created', 'id'), chunk_size=2)],
+                         sorted(range(1, 26), key=lambda i: (-(i // 3), i)))
+
+        # Filtered
+        del self.queries[:]
+        self.assertEqual([u.id for u in iter_keyset(query.filter(User.age == 0), 'id', chunk_size=5)], [3, 6, 9, 12, 15, 18, 21, 24])
+        self.assertEqual(len(self.queries), 2)
+
+    def test_paginate(self):
+        """ RestfulView.paginate() """
+        with self.app.test_client() as c:
+            rv = c.get('/users/?x=1')
+            self.assertEqual([u['id'] for u in rv.get_json()], list(range(1, 11)))
+            cursor = rv.headers['X-Next-Cursor']
+            self.assertEqual(rv.headers['Link'], '<http://localhost/users/?x=1&cursor={}>; rel="next"'.format(cursor))
+
+            # Follow the link
+            ids = [u['id'] for u in rv.get_json()]
+            while 'Link' in rv.headers:
+                rv = c.get(rv.headers['Link'][1:].split('>')[0])
+                ids.extend(u['id'] for u in rv.get_json())
+            self.assertEqual(ids, list(range(1, 26)))
+            self.assertNotIn('X-Next-Cursor', rv.headers)
+
+            # Limit
+            self.assertEqual(len(c.get('/users/?limit=3').get_json()), 3)
+            self.assertEqual(len(c.get('/users/?limit=100').get_json()), 20)
+            self.assertEqual(c.get('/users/?limit=x').status_code, 400)
+            self.assertEqual(c.get('/users/?limit=0').status_code, 400)
+            self.assertEqual(c.get('/users/?cursor=invalid').status_code, 400)
+
+            # Declared ordering
+            rv = c.get('/ages/?limit=3')
+            self.assertEqual([(u['age'], u['id']) for u in rv.get_json()], [(2, 2), (2, 5), (2, 8)])
+            rv = c.get('/ages/?limit=3&cursor=' + rv.headers['X-Next-Cursor'])
+            self.assertEqual([(u['age'], u['id']) for u in rv.get_json()], [(2, 11), (2, 14), (2, 17)])
+
+            # Item routes are not affected
+            self.assertEqual(c.get('/users/5').get_json()['id'], 5)
+
+    def test_export(self):
+        """ RestfulView.export(): streamed """
+        with self.app.test_client() as c:
+            del self.queries[:]
+            rv = c.get('/export/')
+            self.assertEqual([u['id'] for u in rv.get_json()], list(range(1, 26)))
+            self.assertEqual(len(self.queries), 3)
+
+            rv = c.get('/export/?cursor=' + encode_cursor([20]))
+            self.assertEqual([u['id'] for u in rv.get_json()], list(range(21, 26)))
+
+            self.assertEqual(c.get('/export/?cursor=invalid').status_code, 400)
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+import io
+import json
+import unittest
+from flask import Flask
+from werkzeug.test import EnvironBuilder
+
+from flask_jsontools import jsonapi, FlaskJsonClient, MethodView, methodview, get_json_body, iter_json_body
+from flask_jsontools.parsing import _iter_json_array
+
+
+class RequestParsingTest(unittest.TestCase):
+    def setUp(self):
+        self.app = app = Flask(__name__)
+        app.test_client_class = FlaskJsonClient
+        app.debug = app.testing = True
+
+        self.calls = calls = []
+
+        @app.route('/echo', methods=['POST'])
+        @jsonapi
+        def echo():
+            calls.append('echo')
+            return {'body': get_json_body()}
+
+        @app.route('/import', methods=['POST'])
+        @jsonapi(max_body_size=1000)
+        def bulk_import():
+            calls.append('import')
+            return {'items': list(iter_json_body(chunk_size=3))}
+
+        class ItemsView(MethodView):
+            decorators = (jsonapi(max_body_size=100),)
+
+            @methodview('POST')
+            def post(self):
+                return {'n': sum(1 for item in iter_json_body())}
+
+        ItemsView.route_as_view(app, 'items', ('/items',))
+
+    def post(self, url, data, content_type='application/json', **kwargs):
+        with self.app.test_client() as c:
+            return c.post(url, data=data, content_type=content_type, **kwargs)
+
+    def test_get_json_body(self):
+        """ get_json_body() """
+        rv = self.post('/echo', json.dumps({'a': [1, u'ы']}))
+        self.assertEqual(rv.status_code, 200)
+        self.assertEqual(rv.get_json(), {'body': {'a': [1, u'ы']}})
+
+        # Not JSON
+        rv = self.post('/echo', 'a=1', content_type='application/x-www-form-urlencoded')
+        self.assertEqual(rv.get_json(), {'body': None})
+
+        # NDJSON
+        rv = self.post('/echo', '{"a":1}\n{"a":2}\n', content_type='application/x-ndjson')
+        self.assertEqual(rv.get_json(), {'body': [{'a': 1}, {'a': 2}]})
+
+        # Invalid
+        rv = self.post('/echo', '{"a":')
+        self.assertEqual(rv.status_code, 400)
+
+    def test_max_body_size(self):
+        """ Oversized bodies are rejected before the view is called """
+        self.app.config['JSONTOOLS_MAX_BODY_SIZE'] = 10
+        rv = self.post('/echo', json.dumps({'a': 'x' * 100}))
+        self.assertEqual(rv.status_code, 413)
+        self.assertEqual(self.calls, [])
+        rv = self.post('/echo', json.dumps({'a': 1}))
+        self.assertEqual(rv.status_code, 200)
+
+        # Per-view limit overrides the config
+        rv = self.post('/import', json.dumps(list(range(100))))
+        self.assertEqual(rv.status_code, 200)
+        rv = self.post('/import', json.dumps(list(range(1000))))
+        self.assertEqual(rv.status_code, 413)
+        self.assertEqual(self.calls, ['echo', 'import'])
+
+        # MethodView
+        self.assertEqual(self.post('/items', json.dumps([1, 2, 3])).get_json(), {'n': 3})
+        self.assertEqual(self.post('/items', json.dumps(list(range(100)))).status_code, 413)
+
+    def test_max_body_size_without_content_length(self):
+        """ Bodies without Content-Length are limited while they are read """
+        body = json.dumps(list(range(1000))).encode('ascii')
+        environ = EnvironBuilder('/import', method='POST', content_type='application/json', input_stream=io.BytesIO(body)).get_environ()
+        del environ['CONTENT_LENGTH']
+        environ['wsgi.input_terminated'] = True
+        with self.app.request_context(environ):
+            items = iter_json_body(max_size=1000)
+            with self.assertRaises(Exception) as ctx:
+                list(items)
+            self.assertEqual(ctx.exception.code, 413)
+
+    def test_iter_json_body(self):
+        """ iter_json_body() """
+        items = [1, 123456789, -1.5e10, u'ыыы', 'a"b\\c', None, True, False, [], {}, {'a': [1, {'b': 'c'}]}, [[1], [2]]]
+        rv = self.post('/import', json.dumps(items, ensure_ascii=False).encode('utf-8'))
+        self.assertEqual(rv.get_json(), {'items': items})
+        rv = self.post('/import', ' [ ] ')
+        self.assertEqual(rv.get_json(), {'items': []})
+
+        # NDJSON
+        rv = self.post('/import', '{"a":1}\n\n{"a":2}', content_type='application/x-ndjson')
+        self.assertEqual(rv.get_json(), {'items': [{'a': 1}, {'a': 2}]})
+
+        # Errors
+        for body in ('{"a":1}', '[1, 2', '[1,]', '[1 2]', '[1] 2', '[1, {"a":]', ''):
+            self.assertEqual(self.post('/import', body).status_code, 400, body)
+        self.assertEqual(self.post('/import', '[1]', content_type='text/plain').status_code, 415)
+
+    def test_incremental(self):
+        """ Items are yielded as soon as they arrive """
+        read = []
+
+        def chunks():
+            for chunk in (b'[{"a"', b':1},', b' 12', b'3, "\xd1', b'\x8b"', b']'):
+                read.append(chunk)
+                yield chunk
+
+        it = _iter_json_array(chunks())
+        self.assertEqual(next(it), {'a': 1})
+        self.assertEqual(len(read), 2)
+        self.assertEqual(next(it), 123)  # not 12
+        self.assertEqual(next(it), u'ы')
+        self.assertEqual(list(it), [])
@@ -0,0 +1,96 @@
+import unittest
+from flask import Flask, g
+
+from flask_jsontools import jsonapi, FlaskJsonClient, DynamicJSONEncoder, json_request_profiled
+
+
+class Point(object):
+    def __init__(self, x, y):
+        self.x, self.y = x, y
+
+    def __json__(self):
+        return [self.x, self.y]
+
+
+class ProfilingTest(unittest.TestCase):
+    def setUp(self):
+        self.app = app = Flask(__name__)
+        app.debug = app.testing = True
+        app.test_client_class = FlaskJsonClient
+        app.json_encoder = DynamicJSONEncoder
+        app.config['JSONTOOLS_PROFILE'] = True
+
+        @app.route('/points')
+        @jsonapi
+        def points():
+            return {'points': [Point(i, i) for i in range(10)], 'origin': Point(0, 0)}
+
+        @app.route('/stream')
+        @jsonapi
+        def stream():
+            return (Point(i, i) for i in range(10))
+
+        @app.route('/nested')
+        @jsonapi
+        def nested():
+            return points()
+
+        self.profiles = []
+        json_request_profiled.connect(self.on_profile, app)
+
+    def tearDown(self):
+        json_request_profiled.disconnect(self.on_profile, self.app)
+
+    def on_profile(self, app, profile):
+        self.profiles.append(profile)
+
+    def test_profile(self):
+        """ Phases, body size, __json__() calls """
+        with self.app.test_client() as c:
+            rv = c.get('/points')
+            self.assertEqual(rv.status_code, 200)
+            self.assertIsNone(g.jsontools_profile)  # finished
+        self.assertNotIn('Server-Timing', rv.headers)
+
+        profile, = self.profiles
+        self.assertEqual(dict(profile.json_calls), {'Point': 11})
+        self.assertEqual(profile.body_size, len(rv.get_data()))
+        self.assertGreater(profile.view_time, 0)
+        self.assertGreater(profile.encode_time, 0)
+        self.assertFalse(profile.streamed)
+        self.assertEqual(set(profile.to_dict()), {'view_time', 'preprocess_time', 'encode_time', 'body_size', 'json_calls', 'streamed'})
+
+    def test_nested(self):
+        """ Nested @jsonapi calls make one profile """
+        with self.app.test_client() as c:
+            rv = c.get('/nested')
+            self.assertEqual(rv['origin'], [0, 0])
+        profile, = self.profiles
+        self.assertEqual(profile.json_calls['Point'], 11)
+
+    def test_stream(self):
+        """ Streamed responses """
+        with self.app.test_client() as c:
+            rv = c.get('/stream')
+            self.assertEqual(rv.get_json(), [[i, i] for i in range(10)])
+        profile, = self.profiles
+        self.assertTrue(profile.streamed)
+        self.assertIsNone(profile.body_size)
+
+    def test_server_timing(self):
+        """ Server-Timing header """
+        self.app.config['JSONTOOLS_SERVER_TIMING'] = True
+        with self.app.test_client() as c:
+            rv = c.get('/points')
+        self.assertRegex(rv.headers['Server-Timing'], r'^view;dur=[\d.]+, preprocess;dur=[\d.]+, encode;dur=[\d.]+$')
+
+    def test_disabled(self):
+        """ Nothing is measured when disabled """
+        self.app.config['JSONTOOLS_PROFILE'] = False
+        self.app.config['JSONTOOLS_SERVER_TIMING'] = True
+        with self.app.test_client() as c:
+            rv = c.get('/points')
+            self.assertEqual(rv['origin'], [0, 0])
+            self.assertIsNone(g.get('jsontools_profile'))
+        self.assertNotIn('Server-Timing', rv.headers)
+        self.assertEqual(self.profiles, [])
@@ -0,0 +1,168 @@
+import unittest
+from flask import Flask
+from flask.testing import FlaskClient
+from sqlalchemy import create_engine, Column, Integer, String
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.declarative import declarative_base
+
+from flask_jsontools import jsonapi, FlaskJsonClient, JsonResponse, JsonStream, DynamicJSONEncoder, JsonSerializableBase
+from flask_jsontools import ResponseCache
+
+
+Base = declarative_base(cls=(JsonSerializableBase,))
+
+
+class User(Base):
+    __tablename__ = 'users'
+    id = Column(Integer, primary_key=True)
+    name = Column(String)
+
+
+class StreamingTest(unittest.TestCase):
+    def setUp(self):
+        # Database
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        self.db = db = sessionmaker(bind=engine)()
+        db.add_all([User(id=i, name='user-{}'.format(i)) for i in range(1, 251)])
+        db.commit()
+
+        # App
+        self.app = app = Flask(__name__)
+        app.json_encoder = DynamicJSONEncoder
+        app.test_client_class = FlaskJsonClient
+        app.debug = app.testing = True
+
+        self.consumed = consumed = []
+
+        @app.route('/numbers/<int:n>')
+        @jsonapi
+        def numbers(n):
+            def gen():
+                for i in range(n):
+                    consumed.append(i)
+                    yield {'n': i}
+            return gen()
+
+        @app.route('/users')
+        @jsonapi
+        def users():
+            return db.query(User).order_by(User.id)
+
+        @app.route('/list')
+        @jsonapi
+        def wrapped_list():
+            return JsonStream([1, 2, 3], chunk_size=2), 201
+
+        @app.route('/plain')
+        @jsonapi
+        def plain_list():
+            return [{'a': 1}, {'b': 2}]
+
+        @app.route('/iterator')
+        @jsonapi
+        def iterator():
+            return map(lambda i: i * 2, range(3))
+
+        self.cache = cache = ResponseCache()
+
+        @app.route('/cached')
+        @jsonapi(cache=cache)
+        def cached():
+            return [1, 2]
+
+    def test_generator(self):
+        with self.app.test_client() as c:
+            for n in (0, 1, 99, 100, 101, 250):
+                rv = c.get('/numbers/{}'.format(n))
+                self.assertEqual(rv.status_code, 200)
+                self.assertEqual(rv.get_json(), [{'n': i} for i in range(n)])
+
+    def test_lazy(self):
+        """ Items are encoded only when the response is iterated """
+        with self.app.test_request_context():
+            rv = self.app.view_functions['numbers'](n=250)
+            self.assertIsInstance(rv, JsonResponse)
+            self.assertIsInstance(rv.get_json(), JsonStream)
+            self.assertEqual(self.consumed, [])
+
+            chunks = iter(rv.response)
+            self.assertEqual(next(chunks), b'[')
+            next(chunks)
+            self.assertEqual(len(self.consumed), 100)
+
+    def test_query(self):
+        with self.app.test_client() as c:
+            rv = c.get('/users')
+            self.assertEqual(len(rv.get_json()), 250)
+            self.assertEqual(rv[0], {'id': 1, 'name': 'user-1'})
+
+    def test_marker(self):
+        with self.app.test_client() as c:
+            rv = c.get('/list')
+            self.assertEqual(rv.status_code, 201)
+            self.assertEqual(rv.get_json(), [1, 2, 3])
+
+    def test_ndjson(self):
+        with self.app.test_client() as c:
+            rv = c.get('/numbers/3', headers={'Accept': 'application/x-ndjson'})
+            self.assertEqual(rv.get_json(), [{'n': 0}, {'n': 1}, {'n': 2}])
+
+            # Raw response body
+            rv = FlaskClient(self.app, self.app.response_class).get('/numbers/3', headers={'Accept': 'application/x-ndjson'})
+            self.assertEqual(rv.headers['Content-Type'], 'application/x-ndjson')
+            self.assertEqual(rv.get_data(), b'{"n":0}\n{"n":1}\n{"n":2}\n')
+
+    def test_ndjson_negotiation(self):
+        """ Lists and iterators are NDJSON, when asked for """
+        raw = FlaskClient(self.app, self.app.response_class)
+        ndjson = {'Accept': 'application/x-ndjson'}
+
+        # Lists: not streamed
+        rv = raw.get('/plain', headers=ndjson)
+        self.assertEqual(rv.headers['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(rv.headers['Vary'], 'Accept')
+        self.assertEqual(rv.get_data(), b'{"a":1}\n{"b":2}\n')
+        self.assertFalse(rv.is_streamed)
+
+        rv = raw.get('/plain', headers={'Accept': 'application/json, application/x-ndjson;q=0.5'})
+        self.assertEqual(rv.get_data(), b'[{"a":1},{"b":2}]')
+
+        # Any iterator: streamed
+        rv = raw.get('/iterator', headers=ndjson)
+        self.assertEqual(rv.get_data(), b'0\n2\n4\n')
+        self.assertEqual(raw.get('/iterator').get_data(), b'[0,2,4]')
+
+        # Cached separately
+        self.assertEqual(raw.get('/cached').get_data(), b'[1,2]')
+        self.assertEqual(raw.get('/cached', headers=ndjson).get_data(), b'1\n2\n')
+        self.assertEqual(raw.get('/cached').get_data(), b'[1,2]')
+
+    def test_ndjson_lines(self):
+        """ NDJSON lines are flushed one by one """
+        with self.app.test_request_context(headers={'Accept': 'application/x-ndjson'}):
+            rv = self.app.view_functions['numbers'](n=3)
+            self.assertEqual(list(rv.response), [b'{"n":0}\n', b'{"n":1}\n', b'{"n":2}\n'])
+
+    def test_ndjson_lazy_client(self):
+        """ FlaskJsonClient decodes streamed NDJSON lazily """
+        with self.app.test_client() as c:
+            rv = c.get('/numbers/250', headers={'Accept': 'application/x-ndjson'})
+            items = rv.iter_json()
+            self.assertEqual(next(items), {'n': 0})
+            self.assertLess(len(self.consumed), 250)
+            self.assertEqual(list(items), [{'n': i} for i in range(1, 250)])
+
+            # Compressed
+            self.app.config['JSONTOOLS_COMPRESS'] = True
+            self.app.config['JSONTOOLS_COMPRESS_ENCODINGS'] = ['gzip']
+            rv = c.get('/numbers/250', headers={'Accept': 'application/x-ndjson', 'Accept-Encoding': 'gzip'})
+            self.assertNotIn('Content-Encoding', rv.headers)
+            self.assertEqual(list(rv.iter_json()), [{'n': i} for i in range(250)])
+
+            # get_json() still works
+            rv = c.get('/numbers/3', headers={'Accept': 'application/x-ndjson'})
+            self.assertEqual(rv.get_json(), [{'n': 0}, {'n': 1}, {'n': 2}])
+
+            # JSON responses
+            self.assertEqual(list(c.get('/plain').iter_json()), [{'a': 1}, {'b': 2}])